@@ -0,0 +1,18 @@
+""" SMART attribute of a storage device component """
+
+from ZenPacks.daviswr.SMART import schema
+
+
+class SmartAttribute(schema.SmartAttribute):
+    """ SMART attribute of a storage device component """
+
+    def getRRDTemplates(self):
+        """ Returns the SmartAttribute-Python template instead of
+        SmartAttribute if zSmartPythonCollector is set
+        """
+        unused = ('SmartAttribute'
+                  if getattr(self, 'zSmartPythonCollector', False)
+                  else 'SmartAttribute-Python')
+        return [template
+                for template in super(SmartAttribute, self).getRRDTemplates()
+                if template.id != unused]
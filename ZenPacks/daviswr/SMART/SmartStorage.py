@@ -0,0 +1,125 @@
+""" SMART-supporting storage device component """
+
+from ZenPacks.daviswr.SMART import schema
+from ZenPacks.daviswr.SMART.lib.command import (
+    batch_command,
+    single_command,
+    stagger_offset,
+    )
+
+
+class SmartStorage(schema.SmartStorage):
+    """ SMART-supporting storage device component """
+
+    def getRRDTemplates(self):
+        """ Returns the SMART-Python template instead of SMART if
+        zSmartPythonCollector is set
+        """
+        unused = ('SMART' if getattr(self, 'zSmartPythonCollector', False)
+                  else 'SMART-Python')
+        return [template
+                for template in super(SmartStorage, self).getRRDTemplates()
+                if template.id != unused]
+
+    def getSmartctlCommand(self):
+        """ Returns the command for the smartctl datasource """
+        return self.smartctl_command('smartctl')
+
+    def getStatusCommand(self):
+        """ Returns the command for the status datasource """
+        return self.smartctl_command('status')
+
+    def smart_logs(self):
+        """ Returns the names of the logs the disk supports, or None if it
+        hasn't been profiled by the modeler yet
+        """
+        if not getattr(self, 'Protocol', ''):
+            return None
+        return (getattr(self, 'SmartLogs', '') or '').split()
+
+    def nvme_cli(self):
+        """ Returns whether the disk is an NVMe controller collected with
+        nvme-cli, unless zSmartNvmeCli is unset
+        """
+        return bool(getattr(self, 'zSmartNvmeCli', True)
+                    and (self.BlockDevice or '').startswith('nvme'))
+
+    def stagger_offset(self):
+        """ Returns the seconds into each cycle zenpython starts the disk's
+        collection, spread over zSmartStaggerInterval, or 0 with batched
+        collection
+        """
+        if getattr(self, 'zSmartBatchCollection', False) or self.nvme_cli():
+            return 0
+        return stagger_offset(
+            self.SerialNumber or self.id,
+            int(getattr(self, 'zSmartStaggerInterval', 0) or 0),
+            )
+
+    def smartctl_command(self, tier):
+        """ Returns the command for a datasource's tier of smartctl output
+
+        With zSmartBatchCollection set, every component on the device gets
+        the identical command, so zencommand only runs it once per cycle
+        and hands the combined output to each component's parser.
+
+        Each disk is only asked for the logs its protocol and capabilities
+        support, see the modeler's profile.
+
+        zSmartReduceOutput filters out the lines the parsers don't read on
+        the target, and zSmartCompressOutput compresses batched output.
+
+        NVMe disks collected with nvme-cli share a command of their own,
+        batched whether or not zSmartBatchCollection is set, and are left
+        out of the other disks' batch.
+        """
+        low_priority = getattr(self, 'zSmartLowPriority', False)
+        standby_check = getattr(self, 'zSmartStandbyCheck', False)
+        reduce_output = getattr(self, 'zSmartReduceOutput', False)
+        # smartd keeps attributes, but not health, temperature or logs
+        smartd_dir = ''
+        if 'smartctl' == tier:
+            smartd_dir = getattr(self, 'zSmartdStatePath', '') or ''
+        smartd_age = int(getattr(self, 'zSmartdStateMaxAge', 3600) or 0)
+        nvme_cli = self.nvme_cli()
+        if nvme_cli:
+            # smartd doesn't keep NVMe SMART logs
+            smartd_dir = ''
+        if nvme_cli or getattr(self, 'zSmartBatchCollection', False):
+            disks = sorted(
+                [disk for disk in self.device().smartStorage()
+                 if disk.nvme_cli() == nvme_cli],
+                key=lambda x: x.id
+                )
+            return batch_command(
+                [(disk.DevicePath,
+                  disk.SmartctlPath,
+                  disk.PrivEscCmd,
+                  disk.SmartctlOptions,
+                  disk.SerialNumber or '',
+                  disk.smart_logs())
+                 for disk in disks],
+                int(getattr(self, 'zSmartConcurrency', 1) or 1),
+                low_priority,
+                tier,
+                standby_check,
+                smartd_dir,
+                smartd_age,
+                reduce_output,
+                getattr(self, 'zSmartCompressOutput', False),
+                nvme_cli,
+                )
+        return single_command(
+            self.DevicePath,
+            self.SmartctlPath,
+            self.PrivEscCmd,
+            self.SmartctlOptions,
+            low_priority,
+            tier,
+            standby_check,
+            self.SerialNumber or '',
+            smartd_dir,
+            smartd_age,
+            self.smart_logs(),
+            reduce_output,
+            )
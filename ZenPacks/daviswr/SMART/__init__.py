@@ -1,9 +1,32 @@
 import os
 from ZenPacks.zenoss.ZenPackLib import zenpacklib
 
+from Products.ZenUtils.Utils import monkeypatch
+
+from ZenPacks.daviswr.SMART.lib.util import fingerprint
+
 CFG = zenpacklib.load_yaml(
     [os.path.join(os.path.dirname(__file__), "zenpack.yaml")],
     verbose=False,
     level=30
     )
 schema = CFG.zenpack_module.schema
+
+
+@monkeypatch('Products.ZenModel.Device.Device')
+def getDaviswrSmartFingerprints(self):
+    """ Returns the fingerprint of each modeled SMART disk by ID,
+    which the modeler compares against to send only changed disks
+    """
+    return dict((disk.id, fingerprint(disk)) for disk in self.smartStorage())
+
+
+@monkeypatch('Products.ZenModel.Device.Device')
+def getDaviswrSmartAttributeIds(self):
+    """ Returns the IDs of each modeled SMART disk's attributes by disk ID,
+    so the modeler only sends attributes which were added or removed
+    """
+    return dict(
+        (disk.id, sorted(disk.smartAttributes.objectIds()))
+        for disk in self.smartStorage()
+        )
@@ -0,0 +1,292 @@
+#pylint: disable=invalid-name,too-few-public-methods
+""" PythonCollector datasource running smartctl over pooled SSH connections
+
+An alternative to the COMMAND datasources, used by the SMART-Python
+template when zSmartPythonCollector is set. Rather than zencommand opening
+an SSH session per component each cycle, zenpython keeps up to
+zSmartSshConnections connections to each device open and runs commands
+as channels over them, up to zSmartConcurrency at once.
+"""
+
+import logging
+import time
+
+from twisted.internet import defer, reactor, task
+
+from Products.ZenEvents import Event
+
+from ZenPacks.zenoss.PythonCollector.datasources.PythonDataSource import (
+    PythonDataSource,
+    PythonDataSourcePlugin,
+    )
+
+from ZenPacks.daviswr.SMART.lib.cost import disk_costs
+from ZenPacks.daviswr.SMART.lib.rollup import record, rollup
+from ZenPacks.daviswr.SMART.lib.ssh import SSHOptions, close_pool, device_pool
+from ZenPacks.daviswr.SMART.lib.trend import log_trends
+from ZenPacks.daviswr.SMART.parsers import attribute, smartctl, status
+
+log = logging.getLogger('zen.SMART')
+
+
+def command_tier(tier):
+    """ Returns the tier of smartctl output a datasource's tier is parsed
+    from, attributes being parsed from the disk's smartctl tier
+    """
+    return 'smartctl' if 'attributes' == tier else tier
+
+
+def first_disk(device):
+    """ Returns the device's first SMART disk by ID, whose commands its
+    SMARTDevice-Python datasources share, or None if it has none
+    """
+    disks = sorted(device.smartStorage(), key=lambda disk: disk.id)
+    return disks[0] if disks else None
+
+
+class SmartctlDataSource(PythonDataSource):
+    """ Runs a tier of smartctl output, see lib/command.py """
+
+    ZENPACKID = 'ZenPacks.daviswr.SMART'
+
+    sourcetypes = ('SMART smartctl',)
+    sourcetype = sourcetypes[0]
+
+    plugin_classname = (
+        'ZenPacks.daviswr.SMART.datasources.SmartctlDataSource.'
+        'SmartctlDataSourcePlugin'
+        )
+
+    tier = 'smartctl'
+
+    _properties = PythonDataSource._properties + (
+        {'id': 'tier', 'type': 'string', 'mode': 'w'},
+        )
+
+
+class SmartctlDataSourcePlugin(PythonDataSourcePlugin):
+    """ Collects a tier of smartctl output for each component """
+
+    proxy_attributes = (
+        'zCommandUsername',
+        'zCommandPassword',
+        'zCommandPort',
+        'zKeyPath',
+        'zCommandLoginTimeout',
+        'zCommandCommandTimeout',
+        'zSmartConcurrency',
+        'zSmartSshConnections',
+        'zSmartEventReassertInterval',
+        )
+
+    @classmethod
+    def config_key(cls, datasource, context):
+        """ Returns a key shared by the datasources of a device's disks and
+        their attributes polling the same tier, so each command only runs
+        once
+        """
+        return (
+            context.device().id,
+            datasource.getCycleTime(context),
+            datasource.plugin_classname,
+            command_tier(datasource.tier),
+            )
+
+    @classmethod
+    def params(cls, datasource, context):
+        """ Returns the tier, command and the disk's stagger offset, and
+        the disk's device path, protocol, whether it rotates and its NVMe
+        temperature limits, for the parser
+
+        The device's own datasources get the command of its first disk.
+        """
+        params = {'tier': datasource.tier}
+        if 'attributes' == datasource.tier:
+            disk = context.smartStorage()
+            params['attribute'] = getattr(context, 'AttributeId', '')
+            params['disk'] = disk.id
+        else:
+            disk = context
+        commands = (disk if hasattr(disk, 'smartctl_command')
+                    else first_disk(context))
+        params['command'] = (
+            commands.smartctl_command(command_tier(datasource.tier))
+            if commands else ''
+            )
+        params['hard_disk'] = 'rpm' in str(getattr(disk, 'RotationRate', ''))
+        params['path'] = getattr(disk, 'DevicePath', '')
+        params['protocol'] = getattr(disk, 'Protocol', '')
+        params['temp_limits'] = status.temp_limits(disk)
+        params['offset'] = (disk.stagger_offset()
+                            if hasattr(disk, 'stagger_offset') else 0)
+        return params
+
+    @staticmethod
+    def task_key(config):
+        """ Returns the config key of the task, one of those sharing the
+        device's pool
+        """
+        return tuple(config.datasources[0].config_key)
+
+    @staticmethod
+    def ssh_options(config):
+        """ Returns the device's SSH settings """
+        ds0 = config.datasources[0]
+        return SSHOptions(
+            config.manageIp,
+            port=getattr(ds0, 'zCommandPort', 22),
+            username=getattr(ds0, 'zCommandUsername', ''),
+            password=getattr(ds0, 'zCommandPassword', ''),
+            key_path=getattr(ds0, 'zKeyPath', ''),
+            login_timeout=getattr(ds0, 'zCommandLoginTimeout', 10),
+            command_timeout=getattr(ds0, 'zCommandCommandTimeout', 15),
+            concurrency=getattr(ds0, 'zSmartConcurrency', 1),
+            connections=getattr(ds0, 'zSmartSshConnections', 1),
+            )
+
+    def collect(self, config):
+        """ Returns a Deferred firing with (succeeded, output or failure)
+        by command
+
+        With zSmartBatchCollection set, every component has the same
+        command, which is only run once. Otherwise each disk's command
+        starts after its stagger offset, with no channel open meanwhile.
+        """
+        pool = device_pool(
+            config.id,
+            self.ssh_options(config),
+            self.task_key(config),
+            )
+        commands = list()
+        offsets = dict()
+        for ds in config.datasources:
+            command = ds.params['command']
+            if not command:
+                continue
+            if command not in commands:
+                commands.append(command)
+            offsets[command] = max(
+                offsets.get(command, 0),
+                ds.params.get('offset', 0),
+                )
+
+        d = defer.DeferredList(
+            [task.deferLater(reactor, offsets[command], pool.run, command)
+             if offsets[command] else pool.run(command)
+             for command in commands],
+            consumeErrors=True,
+            )
+        d.addCallback(lambda results: dict(zip(commands, results)))
+        return d
+
+    def onSuccess(self, result, config):
+        """ Returns values and events parsed from each command's output """
+        data = self.new_data()
+        failures = list()
+        # Decoded once, so batched output is split and parsed once
+        outputs = dict()
+        for command, (succeeded, output) in result.items():
+            if not succeeded:
+                failures.append(output)
+                continue
+            output = output[0]
+            if isinstance(output, bytes):
+                output = output.decode('utf-8', 'replace')
+            outputs[command] = output
+
+        # The device's rollup of its disks, see SMARTDevice
+        rollups = list()
+        for ds in config.datasources:
+            output = outputs.get(ds.params['command'])
+            if output is None:
+                continue
+            if not ds.component:
+                rollups.append(ds)
+                continue
+
+            started = time.time()
+            if 'attributes' == ds.params['tier']:
+                values = attribute.attribute_values(
+                    output,
+                    ds.params.get('disk', ''),
+                    ds.params.get('attribute', ''),
+                    ds.params.get('path', ''),
+                    )
+            else:
+                output = smartctl.batch_output(
+                    output,
+                    ds.component,
+                    ds.params.get('path', ''),
+                    )
+                if not output:
+                    continue
+                if 'status' == ds.params['tier']:
+                    values, events = status.parse(
+                        output,
+                        config.id,
+                        ds.component,
+                        int(getattr(ds, 'zSmartEventReassertInterval', 0)
+                            or 0),
+                        ds.params.get('protocol', ''),
+                        ds.params.get('temp_limits'),
+                        )
+                    data['events'].extend(events)
+                else:
+                    values, events = smartctl.parse(
+                        output,
+                        config.id,
+                        ds.component,
+                        ds.params.get('hard_disk', False),
+                        ds.params.get('protocol', ''),
+                        )
+                    if values:
+                        values.update(log_trends(
+                            config.id,
+                            ds.component,
+                            values,
+                            ))
+                    data['events'].extend(events)
+                values.update(disk_costs(output, started, len(events)))
+                record(config.id, ds.params['tier'], ds.component, values)
+            for point in ds.points:
+                if point.id in values:
+                    data['values'][ds.component][point.id] = values[point.id]
+
+        for ds in rollups:
+            totals = rollup(
+                config.id,
+                ds.params['tier'],
+                2 * int(getattr(ds, 'cycletime', 0) or 0),
+                )
+            for point in ds.points:
+                if point.id in totals:
+                    data['values'][None][point.id] = totals[point.id]
+
+        tier = command_tier(config.datasources[0].params['tier'])
+        event = {
+            'device': config.id,
+            'severity': Event.Clear,
+            'eventKey': 'SMART {0}'.format(tier),
+            'eventClass': '/Cmd/Fail',
+            'summary': 'SMART {0} collection succeeded'.format(tier),
+            }
+        if failures:
+            log.warning(
+                '%s: SMART %s collection failed: %s',
+                config.id,
+                tier,
+                failures[0].getErrorMessage(),
+                )
+            event['severity'] = Event.Error
+            event['summary'] = 'SMART {0} collection failed: {1}'.format(
+                tier,
+                failures[0].getErrorMessage(),
+                )
+        data['events'].append(event)
+        return data
+
+    def cleanup(self, config):
+        """ Closes the device's connections, once no other tier's task
+        shares them
+        """
+        close_pool(config.id, self.task_key(config))
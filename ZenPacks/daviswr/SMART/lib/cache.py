@@ -0,0 +1,44 @@
+#pylint: disable=invalid-name
+""" Per-component state kept by collector daemons between cycles """
+
+import time
+
+from collections import OrderedDict
+
+
+class ComponentCache(object):
+    """ Bounded store of per-component state
+
+    Entries are kept in order of last use, so those of components which are
+    no longer collected, such as removed disks, are dropped once they expire
+    or the cache is full.
+    """
+
+    def __init__(self, max_size=100000, max_age=3600):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, device, component, now=None):
+        """ Returns the state dict for a component, creating it if needed """
+        now = now or time.time()
+        key = (device, component)
+        entry = self.entries.pop(key, None)
+        state = entry[1] if entry else dict()
+        self.entries[key] = (now, state)
+        self.expire(now)
+        return state
+
+    def expire(self, now=None):
+        """ Drops least recently used entries that are too old or too many """
+        now = now or time.time()
+        while self.entries:
+            key = next(iter(self.entries))
+            if (len(self.entries) > self.max_size
+                    or now - self.entries[key][0] > self.max_age):
+                del self.entries[key]
+            else:
+                break
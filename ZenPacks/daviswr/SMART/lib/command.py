@@ -0,0 +1,421 @@
+#pylint: disable=invalid-name
+""" Builds remote smartctl commands for the monitoring template """
+
+import zlib
+
+# Separates each disk's output in batched commands,
+# same as the modeler's output
+DELIMITER = '--------'
+PATH_PREFIX = 'Device Path: '
+# Precedes the content of a smartd state or attribute log file
+SMARTD_PREFIX = 'smartd File: '
+# Follows each disk's output with the milliseconds its command took
+TIME_PREFIX = 'smartctl Time: '
+# Precedes batched output compressed with gzip, base64 encoded
+COMPRESSED_HEADER = 'smartctl Output: gzip'
+
+SMART_OPTS = '--badsum=ignore --nocheck=standby'
+# smartctl arguments and logs for each datasource of the template
+TIERS = {
+    # Every minute: health, temperature and attribute thresholds
+    # Temperature Statistics page for disks without SCT
+    'status': ('--info --health --attributes', [
+        '--log=scttempsts',
+        '--log=devstat,5',
+        ]),
+    # Less often: slowly changing attributes, statistics and PHY events
+    'smartctl': ('--info --attributes', [
+        '--log=devstat',
+        '--log=ssd',
+        '--log=sataphy',
+        '--log=sasphy',
+        # A sector each on ATA disks, see the parser's log_events
+        '--log=error',
+        '--log=selftest',
+        ]),
+    }
+
+# Lowest CPU and best-effort I/O priority, ahead of any privilege
+# escalation command so sudoers entries still match smartctl
+LOW_PRIORITY = [
+    'smart_nice="nice -n 19"',
+    'if command -v ionice >/dev/null 2>&1; '
+    'then smart_nice="$smart_nice ionice -c 2 -n 7"; fi',
+    ]
+
+# Checks the power mode of an ATA disk without waking it, printing
+# smartctl's standby message and succeeding if it's asleep. Fails if
+# hdparm isn't available, so smartctl is run instead.
+STANDBY_CHECK = ' '.join([
+    'smart_standby() {',
+    'command -v hdparm >/dev/null 2>&1 || return 1;',
+    'case "$(eval $1 hdparm -C $2 2>/dev/null)" in',
+    '*standby*) echo "Device is in STANDBY mode, exit(2)";;',
+    '*sleeping*) echo "Device is in SLEEP mode, exit(2)";;',
+    '*) return 1;;',
+    'esac;',
+    '}',
+    ])
+
+# Outputs the newest of a disk's smartd state file and the last line of
+# its attribute log, named for its model and serial, if modified within
+# $smart_smartd_age seconds. Fails if there's none, so smartctl is run
+# instead. The argument is a glob of the serial number.
+SMARTD_STATE = ' '.join([
+    'smart_smartd() {',
+    'smart_file=""; smart_mtime=0;',
+    'for smart_f in $smart_smartd_dir/smartd.*-$1.*.state',
+    '$smart_smartd_dir/attrlog.*-$1.*.csv; do',
+    'if [[ -r $smart_f ]]; then',
+    'smart_m=$(stat -c %Y "$smart_f" 2>/dev/null',
+    '|| stat -f %m "$smart_f" 2>/dev/null);',
+    'if [[ ${smart_m:-0} -gt $smart_mtime ]]; then',
+    'smart_file=$smart_f; smart_mtime=$smart_m;',
+    'fi;',
+    'fi;',
+    'done;',
+    'if [[ -z $smart_file',
+    '|| $(($(date +%s) - smart_mtime)) -gt $smart_smartd_age ]]; then',
+    'return 1;',
+    'fi;',
+    'echo "{0}$smart_file";'.format(SMARTD_PREFIX),
+    'if [[ $smart_file == *.csv ]]; then tail -n 1 "$smart_file";',
+    'else cat "$smart_file"; fi;',
+    '}',
+    ])
+
+# Finds nvme-cli, which may be outside a non-interactive session's PATH
+NVME_PATH = ('smart_nvme=$(PATH=$PATH:/usr/local/sbin:/usr/sbin:/sbin '
+             'command -v nvme 2>/dev/null)')
+
+# Outputs an NVMe controller's SMART/Health Information log as JSON with
+# nvme-cli, in place of smartctl's process and text for each NVMe disk.
+# Fails if nvme-cli isn't available or can't read the log, such as when
+# sudoers only allows smartctl, so smartctl is run instead. The arguments
+# are the privilege escalation command and the controller's device node.
+NVME_LOG = ' '.join([
+    'smart_nvme_log() {',
+    '[[ -n $smart_nvme ]] || return 1;',
+    'eval $smart_nice $1 $smart_nvme smart-log $2 -o json 2>/dev/null;',
+    '}',
+    ])
+
+# Sets $smart_t to the current time in milliseconds, from bash 5's
+# $EPOCHREALTIME, GNU date's nanoseconds or whole seconds otherwise
+CLOCK = ' '.join([
+    'smart_now() {',
+    'if [[ -n $EPOCHREALTIME ]]; then',
+    'smart_t=${EPOCHREALTIME/[.,]/}; smart_t=$((10#$smart_t / 1000));',
+    'else',
+    'smart_t=$(date +%s%N 2>/dev/null);',
+    'if [[ -z $smart_t || $smart_t == *[!0-9]* ]]; then',
+    'smart_t=$(($(date +%s) * 1000));',
+    'else smart_t=$((smart_t / 1000000)); fi;',
+    'fi;',
+    '}',
+    ])
+
+# Counts background jobs and waits once $smart_max are running.
+# Shells without "wait -n" wait for the whole group instead.
+THROTTLE = ' '.join([
+    'smart_throttle() {',
+    'smart_jobs=$((smart_jobs + 1));',
+    'if [[ $smart_jobs -ge $smart_max ]]; then',
+    'if wait -n 2>/dev/null; then smart_jobs=$((smart_jobs - 1));',
+    'else wait; smart_jobs=0; fi;',
+    'fi;',
+    '}',
+    ])
+
+# Tables of text output the parsers read, each ending at a blank line,
+# see table_headers in parsers/smartctl.py
+REDUCE_TABLES = (
+    'ID# ATTRIBUTE_NAME',
+    'Device Statistics \\(',
+    'SATA Phy Event Counters',
+    'Protocol Specific port log page for SAS',
+    'Num  Test_Description',
+    )
+
+# Passes on only the lines of smartctl's text output the parsers read:
+# colon-delimited info, their tables, and lines they search all of the
+# output for. That drops the banner, the SCT temperature history and
+# the error log's command histories, among others. smartd's files and
+# JSON output are passed on whole, up to the next delimiter.
+REDUCE = ' '.join([
+    "smart_reduce() { awk '",
+    'raw { print; if ($0 == "' + DELIMITER + '") raw = 0; next };',
+    '/^' + SMARTD_PREFIX + '/ || /^[{]/ { raw = 1; print; next };',
+    'table { if ($0 ~ /^[[:space:]]*$/) { if (table == 1) print; table = 0 }',
+    'else if (table == 1) print; next };',
+    '/^(' + '|'.join(REDUCE_TABLES) + ')/ { table = 1; print; next };',
+    '/^Index    Estimated Time/ { table = 2; next };',
+    '/: | = |^No Errors Logged|Device is in |'
+    'Device supports SMART and is Enabled|SMART\\/Health Information|'
+    '^' + DELIMITER + '$/ { print }',
+    "'; }",
+    ])
+
+# Compresses batched output, if gzip and base64 are available
+COMPRESS = ' '.join([
+    'smart_compress() {',
+    'if command -v gzip >/dev/null 2>&1',
+    '&& command -v base64 >/dev/null 2>&1; then',
+    'echo "{0}"; gzip -c | base64;'.format(COMPRESSED_HEADER),
+    'else cat; fi;',
+    '}',
+    ])
+
+
+def log_name(option):
+    """ Returns the name of a log from its smartctl option """
+    return option.split('=', 1)[1].split(',', 1)[0]
+
+
+def disk_logs(tier, supported):
+    """ Returns the tier's log options of those a disk supports, by name
+    as modeled in SmartLogs
+    """
+    return ' '.join(option for option in TIERS[tier][1]
+                    if log_name(option) in supported)
+
+
+def stagger_offset(serial, interval):
+    """ Returns a disk's offset in seconds into the interval over which
+    its device's disks start collection, hashed from its serial number
+    so each disk keeps the same offset and they're spread evenly
+    """
+    if not interval or not serial:
+        return 0
+    fraction = (zlib.crc32(serial.encode('utf-8')) & 0xffffffff) / 2.0 ** 32
+    return round(fraction * interval, 1)
+
+
+def smartd_glob(serial):
+    """ Returns a glob matching the serial number in smartd's file names,
+    which replace some characters with underscores
+    """
+    return ''.join(char if char.isalnum() else '?' for char in serial)
+
+
+def command_header(low_priority=False, tier='smartctl',
+                   standby_check=False, smartd_dir='', smartd_age=3600,
+                   reduce_output=False, compress=False, nvme_cli=False):
+    """ Returns shell variable assignments and functions common to all
+    commands
+    """
+    args, logs = TIERS[tier]
+    lines = [
+        '$ZENOTHING',
+        'smart_opts="{0}"'.format(SMART_OPTS),
+        'smart_logs="{0}"'.format(' '.join(logs)),
+        'smart_args="{0} $smart_logs $smart_opts"'.format(args),
+        # Without logs, for disks requesting only those they support
+        'smart_base="{0} $smart_opts"'.format(args),
+        CLOCK,
+        ]
+    if low_priority:
+        lines.extend(LOW_PRIORITY)
+    if standby_check:
+        lines.append(STANDBY_CHECK)
+    if smartd_dir:
+        lines.extend([
+            'smart_smartd_dir="{0}"'.format(smartd_dir.rstrip('/')),
+            'smart_smartd_age={0}'.format(int(smartd_age)),
+            SMARTD_STATE,
+            ])
+    if nvme_cli:
+        lines.extend([NVME_PATH, NVME_LOG])
+    if reduce_output:
+        lines.append(REDUCE)
+    if compress:
+        lines.append(COMPRESS)
+    return lines
+
+
+def filtered(lines, reduce_output=False, compress=False):
+    """ Returns command lines with their output piped through REDUCE
+    and COMPRESS, if set
+    """
+    filters = [name for name, enabled in (
+        ('smart_reduce', reduce_output),
+        ('smart_compress', compress),
+        ) if enabled]
+    if not filters:
+        return lines
+    return ['{'] + lines + ['}} | {0}'.format(' | '.join(filters))]
+
+
+def disk_command(dev_path, smartctl_path='smartctl', priv_esc='',
+                 smartctl_opts='', low_priority=False, standby_check=False,
+                 smartd_serial='', logs=None, nvme_cli=False):
+    """ Returns a smartctl invocation for a single disk
+
+    With logs, the disk's log options from disk_logs, only those are
+    requested rather than all of the tier's.
+
+    With standby_check, hdparm checks the power mode of disks with a plain
+    device path first, and smartctl is only run if the disk is awake.
+
+    With smartd_serial, the disk's smartd state is output instead if
+    it's recent enough, see command_header.
+
+    With nvme_cli, the NVMe disk's SMART log is read with nvme-cli
+    instead, if available, see NVME_LOG.
+
+    The command is timed, its exit status kept in $smart_rc.
+    """
+    terms = [
+        'eval',
+        '$smart_nice' if low_priority else '',
+        priv_esc,
+        smartctl_path,
+        '$smart_args' if logs is None else '$smart_base',
+        logs or '',
+        smartctl_opts,
+        dev_path,
+        ]
+    command = ' '.join(term for term in terms if term)
+    if standby_check and dev_path.startswith('/dev/') and ' ' not in dev_path:
+        command = 'smart_standby "{0}" {1} || {2}'.format(
+            priv_esc,
+            dev_path,
+            command,
+            )
+    if smartd_serial:
+        command = 'smart_smartd {0} || {1}'.format(
+            smartd_glob(smartd_serial),
+            command,
+            )
+    if nvme_cli:
+        command = 'smart_nvme_log "{0}" {1} || {2}'.format(
+            priv_esc,
+            dev_path.split(' ', 1)[0],
+            command,
+            )
+    return ' '.join([
+        'smart_now; smart_start=$smart_t;',
+        '{0}; smart_rc=$?;'.format(command),
+        'smart_now;',
+        'echo "{0}$((smart_t - smart_start)) ms"'.format(TIME_PREFIX),
+        ])
+
+
+def single_command(dev_path, smartctl_path='smartctl', priv_esc='',
+                   smartctl_opts='', low_priority=False, tier='smartctl',
+                   standby_check=False, serial='', smartd_dir='',
+                   smartd_age=3600, logs=None, reduce_output=False):
+    """ Returns the command to collect a single disk
+
+    With smartd_dir, the directory of smartd's state files, the disk's
+    state is read instead of running smartctl if it was written within
+    smartd_age seconds.
+
+    logs are the names of the logs the disk supports, or None if unknown
+    to request all of the tier's.
+
+    With reduce_output, only the lines the parsers read are output.
+    """
+    lines = command_header(
+        low_priority,
+        tier,
+        standby_check,
+        smartd_dir,
+        smartd_age,
+        reduce_output,
+        )
+    lines.extend(filtered([
+        disk_command(
+            dev_path,
+            smartctl_path,
+            priv_esc,
+            smartctl_opts,
+            low_priority,
+            standby_check,
+            serial if smartd_dir else '',
+            None if logs is None else disk_logs(tier, logs),
+            ),
+        # Exits with smartctl's status rather than that of its timing
+        '(exit $smart_rc)',
+        ], reduce_output))
+    if reduce_output:
+        # Rather than that of the filter
+        lines.append('(exit ${PIPESTATUS[0]})')
+    return '\n'.join(lines)
+
+
+def batch_command(disks, concurrency=1, low_priority=False,
+                  tier='smartctl', standby_check=False, smartd_dir='',
+                  smartd_age=3600, reduce_output=False, compress=False,
+                  nvme_cli=False):
+    """ Returns the command to collect several disks in one session
+
+    disks is an iterable of
+    (DevicePath, SmartctlPath, PrivEscCmd, SmartctlOptions, SerialNumber)
+    tuples, optionally followed by the logs the disk supports as in
+    single_command.
+    Each disk's output is preceded by its device path and followed by a
+    delimiter line, in the same manner as the modeler's output.
+
+    With a concurrency above 1, up to that many disks are queried at once,
+    each into its own temporary file, which are output in order afterward.
+
+    tier is the datasource whose arguments are used, from TIERS.
+    smartd_dir, smartd_age and reduce_output are as in single_command.
+    With compress, the whole output is compressed if the target can,
+    following COMPRESSED_HEADER.
+    With nvme_cli, the disks are NVMe controllers whose SMART logs are
+    read with nvme-cli where it's available, and smartctl otherwise.
+    """
+    header = command_header(
+        low_priority,
+        tier,
+        standby_check,
+        smartd_dir,
+        smartd_age,
+        reduce_output,
+        compress,
+        nvme_cli,
+        )
+    lines = list()
+    parallel = concurrency > 1
+    if parallel:
+        lines.extend([
+            'smart_tmp=$(mktemp -d 2>/dev/null || mktemp -d -t zenoss_smart)',
+            'smart_max={0}'.format(int(concurrency)),
+            'smart_jobs=0',
+            THROTTLE,
+            ])
+    for index, disk in enumerate(disks):
+        dev_path, smartctl_path, priv_esc, smartctl_opts, serial = disk[:5]
+        logs = disk[5] if len(disk) > 5 else None
+        job = [
+            'echo "{0}{1}"'.format(PATH_PREFIX, dev_path),
+            disk_command(
+                dev_path,
+                smartctl_path,
+                priv_esc,
+                smartctl_opts,
+                low_priority,
+                standby_check,
+                serial if smartd_dir else '',
+                None if logs is None else disk_logs(tier, logs),
+                nvme_cli,
+                ),
+            'echo "{0}"'.format(DELIMITER),
+            ]
+        if parallel:
+            lines.append('{{ {0}; }} > "$smart_tmp/{1:04d}" &'.format(
+                '; '.join(job),
+                index
+                ))
+            lines.append('smart_throttle')
+        else:
+            lines.extend(job)
+    if parallel:
+        lines.extend([
+            'wait',
+            'cat "$smart_tmp"/* 2>/dev/null',
+            'rm -rf "$smart_tmp"',
+            ])
+    return '\n'.join(header + filtered(lines, reduce_output, compress))
@@ -0,0 +1,43 @@
+#pylint: disable=invalid-name
+""" Cost of collecting each disk, reported as datapoints of its own
+
+Each disk's command times smartctl on the target, see lib/command.py,
+and the parsers add the size of its output, the time they took to parse
+it and the number of events sent. The device's rollup is in lib/rollup.py.
+"""
+
+import re
+import time
+
+from ZenPacks.daviswr.SMART.lib.command import TIME_PREFIX
+
+# Example: smartctl Time: 1234 ms
+time_re = re.compile(r'^{0}(\d+) ms'.format(re.escape(TIME_PREFIX)),
+                     re.MULTILINE)
+
+# Datapoints of each disk's collection cost
+COST_DATAPOINTS = ('command_time', 'output_bytes', 'parse_time', 'events')
+
+
+def command_time(output):
+    """ Returns the milliseconds smartctl took on the target for a disk,
+    or None if its output wasn't timed
+    """
+    match = time_re.search(output)
+    return int(match.group(1)) if match else None
+
+
+def disk_costs(output, started, events=0, now=None):
+    """ Returns the cost datapoints of a disk's output, parsed since
+    started, a time.time()
+    """
+    now = now or time.time()
+    costs = {
+        'output_bytes': len(output),
+        'parse_time': round((now - started) * 1000, 3),
+        'events': events,
+        }
+    elapsed = command_time(output)
+    if elapsed is not None:
+        costs['command_time'] = elapsed
+    return costs
@@ -0,0 +1,299 @@
+#pylint: disable=invalid-name
+""" Sources of the parser's datapoints, in order of precedence
+
+Each row of a table names one or more datapoints and the sources their
+value may come from, and the first source present in a disk's output
+wins. Tables are compiled once, at import, into plans of lookup
+functions, so parsing a disk only runs the lookups. Supporting another
+vendor's attribute or log entry is a matter of adding a source to its row.
+"""
+
+from collections import namedtuple
+
+# A SMART attribute, with normalized value and threshold scaled to 100
+Attribute = namedtuple('Attribute', 'name value threshold type raw')
+
+# What a disk's datapoints are looked up in: info, Attributes by ID,
+# Device Statistics, whether it rotates and temperature() of the parser
+Sources = namedtuple('Sources', 'info attrs stats hard_disk temp')
+
+## Kinds of source
+# Normalized or raw value of an attribute, by ID
+ATTR_VALUE = 'attr_value'
+ATTR_RAW = 'attr_raw'
+# Device Statistics entry, by description
+STAT = 'stat'
+# Info entry, by key
+INFO = 'info'
+# Current temperature from temperature(), no key
+TEMPERATURE = 'temperature'
+# Sum of sources, all of which must be present
+SUM = 'sum'
+# Sum of whichever sources are present, or 0
+TOTAL = 'total'
+# First source divided by the second
+RATIO = 'ratio'
+# 100 less a percentage used
+REMAINING = 'remaining'
+
+## Conditions on a source, as an optional third item
+HARD_DISK = 'hard_disk'
+SSD = 'ssd'
+# The attribute's name mentions temperature
+TEMPERATURE_NAME = 'temperature_name'
+
+# Datapoints of the status datasource
+STATUS_DATAPOINTS = (
+    (('temperature_celsius',), (
+        (ATTR_RAW, '194'),
+        (ATTR_RAW, '190'),
+        # Some hard drives may use 231 for Temperature
+        (ATTR_RAW, '231', HARD_DISK),
+        (ATTR_RAW, '189', TEMPERATURE_NAME),
+        (TEMPERATURE, None),
+        )),
+    )
+
+# Datapoints of the smartctl datasource, besides phy_events and
+# overall_health
+#
+# Why not Raw_Read_Error_Rate?
+# From https://wiki.unraid.net/Understanding_SMART_Reports -
+# "Only Seagates report the raw value, which yes, does appear to be the
+# number of raw read errors, but should be ignored, completely. All
+# other drives have raw read errors too, but do not report them,
+# leaving this value as zero only."
+LOG_DATAPOINTS = (
+    # "raw" is stored as a gauge, "sectors" as derive/counter
+    (('reallocated_sectors', 'reallocated_raw'), (
+        (ATTR_RAW, '5'),
+        (STAT, 'Number of Reallocated Logical Sectors'),
+        (INFO, 'ElementsInGrownDefectList'),
+        )),
+    # "raw" is stored as a gauge, just "offline" as derive/counter
+    (('reallocated_offline', 'reallocated_offline_raw'), (
+        (ATTR_RAW, '198'),
+        )),
+    (('pending_sectors',), (
+        (ATTR_RAW, '197'),
+        (STAT, 'Number of Realloc. Candidate Logical Sectors'),
+        )),
+    (('blocks_read',), (
+        (STAT, 'Logical Sectors Read'),
+        (INFO, 'DataUnitsRead'),
+        (INFO, 'BlocksSentToInitiator'),
+        (INFO, 'BlocksReadProcessed'),
+        )),
+    (('blocks_written',), (
+        (STAT, 'Logical Sectors Written'),
+        (INFO, 'DataUnitsWritten'),
+        (INFO, 'BlocksReceivedFromInitiator'),
+        (INFO, 'BlocksWrittenProcessed'),
+        )),
+    (('commands',), (
+        (SUM, (
+            (STAT, 'Number of Read Commands'),
+            (STAT, 'Number of Write Commands'),
+            )),
+        (SUM, (
+            (INFO, 'HostReadCommands'),
+            (INFO, 'HostWriteCommands'),
+            )),
+        (SUM, (
+            (INFO, 'NumberOfReadAndWriteCommandsWhoseSize<=SegmentSize'),
+            (INFO, 'NumberOfReadAndWriteCommandsWhoseSize>SegmentSize'),
+            )),
+        )),
+    (('errors',), (
+        (TOTAL, (
+            (STAT, 'Number of Reported Uncorrectable Errors'),
+            (STAT, 'Number of Interface CRC Errors'),
+            (INFO, 'MediaAndDataIntegrityErrors'),
+            (INFO, 'NonMediumErrorCount'),
+            )),
+        )),
+    (('error_log_entries',), (
+        (INFO, 'ErrorInformationLogEntries'),
+        (INFO, 'AtaErrorCount'),
+        )),
+    (('last_selftest_status',), (
+        (INFO, 'LastSelfTestStatus'),
+        )),
+    # Raw Read Error Rate normalized
+    (('read_error_health',), (
+        (ATTR_VALUE, '1'),
+        )),
+    # Reallocated Sector Ct normalized
+    (('reallocated_health',), (
+        (ATTR_VALUE, '5'),
+        )),
+    (('lifetime_health',), (
+        (ATTR_VALUE, '9'),    # Power On Hours
+        (ATTR_VALUE, '193'),  # Load Cycle Count
+        (ATTR_VALUE, '225'),  # Load/Unload Cycle Count
+        (ATTR_VALUE, '12'),   # Power Cycle Count
+        (RATIO, (
+            (INFO, 'AccumulatedLoadUnloadCycles'),
+            (INFO, 'SpecifiedLoadUnloadCountOverDeviceLifetime'),
+            )),
+        (RATIO, (
+            (INFO, 'AccumulatedStartStopCycles'),
+            (INFO, 'SpecifiedCycleCountOverDeviceLifetime'),
+            )),
+        )),
+    # https://www.hdsentinel.com/ssd_case_health_decrease_wearout.php
+    (('ssd_health',), (
+        (ATTR_VALUE, '169'),  # Remaining Life Percentage
+        (ATTR_VALUE, '202'),  # Percent Lifetime Remain / Data Address Mark Errors  # noqa
+        (ATTR_VALUE, '173'),  # SSD Wear Leveling Count / Media Wearout Indicator  # noqa
+        (ATTR_VALUE, '177'),  # Wear Leveling Count
+        (ATTR_VALUE, '231', SSD),  # SSD Life Left
+        (REMAINING, (STAT, 'Percentage Used Endurance Indicator')),
+        (REMAINING, (INFO, 'PercentageUsed')),
+        )),
+    )
+
+# Returned by lookups whose source isn't present
+MISSING = object()
+
+
+def attr_lookup(index, attr_id, condition):
+    """ Returns a lookup of a field of an attribute """
+    def lookup(sources):
+        attr = sources.attrs.get(attr_id)
+        if attr is None:
+            return MISSING
+        if TEMPERATURE_NAME == condition and 'Temperature' not in attr.name:
+            return MISSING
+        return attr[index]
+    return lookup
+
+
+def key_lookup(field, key):
+    """ Returns a lookup of an entry of info or Device Statistics """
+    def lookup(sources):
+        return getattr(sources, field).get(key, MISSING)
+    return lookup
+
+
+def temperature_lookup(sources):
+    """ Looks up the current temperature """
+    return sources.temp[1] if sources.temp else MISSING
+
+
+def sum_lookup(lookups, required):
+    """ Returns a lookup of the sum of other lookups """
+    def lookup(sources):
+        total = 0
+        for sub in lookups:
+            value = sub(sources)
+            if value is MISSING:
+                if required:
+                    return MISSING
+                continue
+            total += value
+        return total
+    return lookup
+
+
+def ratio_lookup(used, total):
+    """ Returns a lookup of one lookup divided by another """
+    def lookup(sources):
+        divisor = total(sources)
+        if divisor is MISSING or not divisor:
+            return MISSING
+        dividend = used(sources)
+        if dividend is MISSING:
+            return MISSING
+        return dividend / float(divisor)
+    return lookup
+
+
+def remaining_lookup(used):
+    """ Returns a lookup of 100 less another lookup """
+    def lookup(sources):
+        value = used(sources)
+        return MISSING if value is MISSING else 100 - value
+    return lookup
+
+
+def disk_lookup(lookup, hard_disk):
+    """ Returns a lookup only made for hard disks, or only for SSDs """
+    def conditional(sources):
+        if sources.hard_disk != hard_disk:
+            return MISSING
+        return lookup(sources)
+    return conditional
+
+
+def compile_source(source):
+    """ Returns a lookup function for a source of a table """
+    kind, key = source[:2]
+    condition = source[2] if len(source) > 2 else None
+
+    if ATTR_VALUE == kind:
+        lookup = attr_lookup(Attribute._fields.index('value'), key, condition)
+    elif ATTR_RAW == kind:
+        lookup = attr_lookup(Attribute._fields.index('raw'), key, condition)
+    elif STAT == kind:
+        lookup = key_lookup('stats', key)
+    elif INFO == kind:
+        lookup = key_lookup('info', key)
+    elif TEMPERATURE == kind:
+        lookup = temperature_lookup
+    elif kind in (SUM, TOTAL):
+        lookup = sum_lookup(
+            tuple(compile_source(sub) for sub in key),
+            SUM == kind,
+            )
+    elif RATIO == kind:
+        lookup = ratio_lookup(*[compile_source(sub) for sub in key])
+    elif REMAINING == kind:
+        lookup = remaining_lookup(compile_source(key))
+    else:
+        raise ValueError('Unknown datapoint source: {0}'.format(kind))
+
+    if condition in (HARD_DISK, SSD):
+        lookup = disk_lookup(lookup, HARD_DISK == condition)
+    return lookup
+
+
+def compile_plan(table):
+    """ Returns a table as a tuple of datapoints and their lookups """
+    return tuple(
+        (tuple(points), tuple(compile_source(source) for source in sources))
+        for points, sources in table
+        )
+
+
+def evaluate(plan, sources):
+    """ Returns the values of a plan's datapoints present in sources """
+    values = dict()
+    for points, lookups in plan:
+        for lookup in lookups:
+            value = lookup(sources)
+            if value is not MISSING:
+                for point in points:
+                    values[point] = value
+                break
+    return values
+
+
+def table_attrs(table, points):
+    """ Returns IDs of attributes the given datapoints may come from """
+    return frozenset(
+        source[1]
+        for row_points, sources in table
+        if set(row_points) & set(points)
+        for source in sources
+        if source[0] in (ATTR_VALUE, ATTR_RAW)
+        )
+
+
+STATUS_PLAN = compile_plan(STATUS_DATAPOINTS)
+LOG_PLAN = compile_plan(LOG_DATAPOINTS)
+
+# Attributes left out of overall_health, being counted by other
+# health datapoints
+LIFETIME_ATTRS = table_attrs(LOG_DATAPOINTS, ('lifetime_health',))
+SSD_HEALTH_ATTRS = table_attrs(LOG_DATAPOINTS, ('ssd_health',))
@@ -0,0 +1,86 @@
+#pylint: disable=invalid-name
+""" Device-level datapoints rolled up from the latest values of its disks
+
+The parsers record each disk's values as they're collected, and the
+device's own datasources report the rollup of those of the same tier,
+see the SMARTDevice template, so dashboards needn't read every disk's
+RRD files to find the worst one.
+"""
+
+import time
+
+from ZenPacks.daviswr.SMART.lib.cache import ComponentCache
+from ZenPacks.daviswr.SMART.lib.util import HEALTH_FAILED
+
+## Kinds of rollup
+# Sum of the disks' values, 0 without any
+SUM = 'sum'
+# Lowest or highest of the disks' values, left out without any
+MIN = 'min'
+MAX = 'max'
+# Number of disks with a value, 0 without any
+FAILED = 'failed'
+# Number of disks
+COUNT = 'count'
+
+# Device datapoints, the disk datapoint each is rolled up from, and how
+ROLLUP_DATAPOINTS = (
+    ('disks', None, COUNT),
+    # Cost of collection, see lib/cost.py
+    ('command_time', 'command_time', SUM),
+    ('slowest_command_time', 'command_time', MAX),
+    ('output_bytes', 'output_bytes', SUM),
+    ('parse_time', 'parse_time', SUM),
+    ('events', 'events', SUM),
+    # Health
+    ('failed_health_checks', 'health_check', FAILED),
+    ('max_temperature_celsius', 'temperature_celsius', MAX),
+    ('worst_overall_health', 'overall_health', MIN),
+    ('total_reallocated_sectors', 'reallocated_raw', SUM),
+    ('total_pending_sectors', 'pending_sectors', SUM),
+    )
+
+# Latest values of each disk by component ID, per device and tier
+rollup_cache = ComponentCache()
+
+
+def record(device, tier, component, values, now=None):
+    """ Keeps a disk's latest values for the device's rollup
+
+    Values the disk didn't report this time, such as while in standby,
+    keep their last ones.
+    """
+    now = now or time.time()
+    disks = rollup_cache.get(device, tier, now)
+    latest = disks[component][1] if component in disks else dict()
+    latest.update(values)
+    disks[component] = (now, latest)
+
+
+def rollup(device, tier, max_age=0, now=None):
+    """ Returns the device datapoints rolled up from its disks' latest
+    values for a tier
+
+    Disks not recorded within max_age seconds, those no longer collected,
+    are dropped, if max_age is set.
+    """
+    now = now or time.time()
+    disks = rollup_cache.get(device, tier, now)
+    for component in list(disks):
+        if max_age and now - disks[component][0] > max_age:
+            del disks[component]
+    latest = [values for _, values in disks.values()]
+
+    totals = dict()
+    for point, disk_point, kind in ROLLUP_DATAPOINTS:
+        found = [values[disk_point] for values in latest
+                 if disk_point in values]
+        if COUNT == kind:
+            totals[point] = len(latest)
+        elif SUM == kind:
+            totals[point] = sum(found)
+        elif FAILED == kind:
+            totals[point] = found.count(HEALTH_FAILED)
+        elif found:
+            totals[point] = min(found) if MIN == kind else max(found)
+    return totals
@@ -0,0 +1,371 @@
+#pylint: disable=invalid-name,too-many-arguments,too-many-instance-attributes
+""" Long-lived SSH connections for the SMART Python datasource
+
+Each device gets a DevicePool of up to a given number of connections,
+which commands are run over as separate channels. A semaphore limits how
+many commands run on a device at once, and each command is spread to the
+least busy connection, opening another while all are busy and the pool
+isn't full.
+
+Like zencommand, host keys are not verified.
+"""
+
+import logging
+import os
+import struct
+
+from twisted.conch.ssh import channel, common, connection, keys, transport
+from twisted.conch.ssh import userauth
+from twisted.internet import defer, error, protocol, reactor
+
+log = logging.getLogger('zen.SMART.ssh')
+
+
+class SSHOptions(object):
+    """ Connection and command settings of a device """
+
+    def __init__(self, host, port=22, username='', password='', key_path='',
+                 login_timeout=10, command_timeout=15, concurrency=1,
+                 connections=1):
+        self.host = host
+        self.port = int(port or 22)
+        self.username = username or ''
+        self.password = password or ''
+        self.key_path = key_path or ''
+        self.login_timeout = float(login_timeout or 10)
+        self.command_timeout = float(command_timeout or 15)
+        self.concurrency = max(1, int(concurrency or 1))
+        self.connections = max(1, int(connections or 1))
+
+    def connection_key(self):
+        """ Returns settings which need new connections when changed """
+        return (self.host, self.port, self.username, self.password,
+                self.key_path)
+
+
+def to_bytes(value):
+    """ Returns a str as bytes, for conch """
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
+
+
+class CommandChannel(channel.SSHChannel):
+    """ Runs a command and collects its output and exit code """
+
+    name = b'session'
+
+    def __init__(self, command, *args, **kwargs):
+        channel.SSHChannel.__init__(self, *args, **kwargs)
+        self.command = to_bytes(command)
+        self.output = list()
+        self.exit_code = None
+        self.opened = False
+        self.finished = defer.Deferred()
+
+    def channelOpen(self, specificData):
+        self.opened = True
+        d = self.conn.sendRequest(
+            self,
+            b'exec',
+            common.NS(self.command),
+            wantReply=True
+            )
+        d.addErrback(self.fail)
+
+    def openFailed(self, reason):
+        self.fail(reason)
+
+    def dataReceived(self, data):
+        self.output.append(data)
+
+    def request_exit_status(self, data):
+        """ Records the command's exit code """
+        self.exit_code = struct.unpack('>L', data)[0]
+
+    def closed(self):
+        if not self.finished.called:
+            self.finished.callback((b''.join(self.output), self.exit_code))
+
+    def fail(self, reason):
+        """ Fails the command and closes the channel """
+        if not self.finished.called:
+            self.finished.errback(reason)
+        if self.opened:
+            self.loseConnection()
+
+    def timeout(self):
+        """ Fails the command for taking too long """
+        self.fail(defer.TimeoutError(
+            'Command timed out: {0}'.format(self.command[:80])
+            ))
+
+
+class ClientConnection(connection.SSHConnection):
+    """ SSH connection service, ready to open channels once started """
+
+    def __init__(self, client):
+        connection.SSHConnection.__init__(self)
+        self.client = client
+
+    def serviceStarted(self):
+        connection.SSHConnection.serviceStarted(self)
+        self.client.connected(self)
+
+
+class ClientUserAuth(userauth.SSHUserAuthClient):
+    """ Authenticates with a key, if any, then the password """
+
+    def __init__(self, client, instance):
+        userauth.SSHUserAuthClient.__init__(
+            self,
+            to_bytes(client.options.username),
+            instance
+            )
+        self.client = client
+        self.key = client.private_key()
+        self.key_offered = False
+        self.password_sent = False
+
+    def getPublicKey(self):
+        if self.key is None or self.key_offered:
+            return None
+        self.key_offered = True
+        return self.key.public()
+
+    def getPrivateKey(self):
+        return defer.succeed(self.key)
+
+    def getPassword(self, prompt=None):
+        if not self.client.options.password or self.password_sent:
+            return None
+        self.password_sent = True
+        return defer.succeed(to_bytes(self.client.options.password))
+
+    def getGenericAnswers(self, name, instruction, prompts):
+        password = to_bytes(self.client.options.password)
+        return defer.succeed([password for _ in prompts])
+
+
+class ClientTransport(transport.SSHClientTransport):
+    """ SSH client transport of an SSHClient """
+
+    def verifyHostKey(self, pubKey, fingerprint):
+        return defer.succeed(True)
+
+    def connectionSecure(self):
+        self.requestService(ClientUserAuth(
+            self.factory,
+            ClientConnection(self.factory)
+            ))
+
+    def connectionLost(self, reason):
+        transport.SSHClientTransport.connectionLost(self, reason)
+        self.factory.disconnected(reason)
+
+
+class SSHClient(protocol.ClientFactory):
+    """ A single SSH connection, running commands as channels """
+
+    protocol = ClientTransport
+
+    def __init__(self, options):
+        self.options = options
+        self.connection = None
+        self.failure = None
+        self.active = 0
+        self.waiting = list()
+        self.login_timer = None
+        self.connector = None
+
+    def connect(self):
+        """ Starts connecting, see ready() """
+        self.connector = reactor.connectTCP(
+            self.options.host,
+            self.options.port,
+            self,
+            timeout=self.options.login_timeout,
+            )
+        self.login_timer = reactor.callLater(
+            self.options.login_timeout,
+            self.login_timeout,
+            )
+        return self
+
+    def private_key(self):
+        """ Returns the private key at zKeyPath, or None """
+        path = os.path.expanduser(self.options.key_path)
+        if not self.options.key_path or not os.path.isfile(path):
+            return None
+        try:
+            try:
+                return keys.Key.fromFile(path)
+            except keys.EncryptedKeyError:
+                return keys.Key.fromFile(
+                    path,
+                    passphrase=to_bytes(self.options.password)
+                    )
+        except (IOError, keys.BadKeyError, keys.EncryptedKeyError) as err:
+            log.warning('Unable to use key %s: %s', path, err)
+            return None
+
+    def ready(self):
+        """ Returns a Deferred firing with this client once connected """
+        if self.connection is not None:
+            return defer.succeed(self)
+        if self.failure is not None:
+            return defer.fail(self.failure)
+        d = defer.Deferred()
+        self.waiting.append(d)
+        return d
+
+    @property
+    def usable(self):
+        """ Whether the connection is open or still being made """
+        return self.failure is None
+
+    def connected(self, conn):
+        """ Called by the connection service once authenticated """
+        self.cancel_login_timer()
+        self.connection = conn
+        waiting, self.waiting = self.waiting, list()
+        for d in waiting:
+            d.callback(self)
+
+    def disconnected(self, reason):
+        """ Called when the connection is lost or can't be made """
+        self.cancel_login_timer()
+        self.connection = None
+        if self.failure is None:
+            self.failure = reason
+        waiting, self.waiting = self.waiting, list()
+        for d in waiting:
+            d.errback(reason)
+
+    def clientConnectionFailed(self, connector, reason):
+        self.disconnected(reason)
+
+    def login_timeout(self):
+        """ Gives up on a connection not authenticated in time """
+        self.login_timer = None
+        if self.connection is None:
+            self.disconnected(error.TimeoutError(
+                'SSH login to {0} timed out'.format(self.options.host)
+                ))
+            self.close()
+
+    def cancel_login_timer(self):
+        """ Stops the login timeout """
+        if self.login_timer is not None and self.login_timer.active():
+            self.login_timer.cancel()
+        self.login_timer = None
+
+    def run(self, command, timeout):
+        """ Returns a Deferred firing with the output and exit code """
+        chan = CommandChannel(command, conn=self.connection)
+        self.active += 1
+        timer = reactor.callLater(timeout, chan.timeout)
+
+        def finished(result):
+            """ Stops the timeout and frees the channel """
+            self.active -= 1
+            if timer.active():
+                timer.cancel()
+            return result
+
+        chan.finished.addBoth(finished)
+        self.connection.openChannel(chan)
+        return chan.finished
+
+    def close(self):
+        """ Closes the connection """
+        if self.connection is not None:
+            self.connection.transport.loseConnection()
+        elif self.connector is not None:
+            self.connector.disconnect()
+
+
+class DevicePool(object):
+    """ Up to options.connections SSH connections to a device, running up
+    to options.concurrency commands at once
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.clients = list()
+        self.semaphore = defer.DeferredSemaphore(options.concurrency)
+        # Keys of the collection tasks sharing the pool
+        self.users = set()
+
+    def update(self, options):
+        """ Applies changed settings, closing connections if needed """
+        if options.connection_key() != self.options.connection_key():
+            self.close()
+        if options.concurrency != self.options.concurrency:
+            self.semaphore = defer.DeferredSemaphore(options.concurrency)
+        self.options = options
+
+    def client(self):
+        """ Returns a Deferred firing with the client to run a command on """
+        self.clients = [client for client in self.clients if client.usable]
+        idle = [client for client in self.clients if not client.active]
+        if idle:
+            client = idle[0]
+        elif len(self.clients) < self.options.connections:
+            client = SSHClient(self.options).connect()
+            self.clients.append(client)
+        else:
+            client = min(self.clients, key=lambda x: x.active)
+        return client.ready()
+
+    def run(self, command):
+        """ Returns a Deferred firing with a command's output and exit code
+        once a slot is free on the device
+        """
+        return self.semaphore.run(self._run, command)
+
+    def _run(self, command):
+        """ Runs a command on the least busy connection """
+        d = self.client()
+        d.addCallback(lambda client: client.run(
+            command,
+            self.options.command_timeout
+            ))
+        return d
+
+    def close(self):
+        """ Closes all connections """
+        for client in self.clients:
+            client.close()
+        self.clients = list()
+
+
+# Device pools by device ID, shared by all datasources of the daemon
+pools = dict()
+
+
+def device_pool(device_id, options, user=None):
+    """ Returns the device's pool, updated with current settings, adding
+    the user, such as a task's config key, to those sharing it
+    """
+    pool = pools.get(device_id)
+    if pool is None:
+        pool = pools[device_id] = DevicePool(options)
+    else:
+        pool.update(options)
+    if user is not None:
+        pool.users.add(user)
+    return pool
+
+
+def close_pool(device_id, user=None):
+    """ Removes the user from those sharing a device's pool, closing and
+    forgetting the pool once none remain, or at once without a user
+    """
+    pool = pools.get(device_id)
+    if pool is None:
+        return
+    pool.users.discard(user)
+    if user is None or not pool.users:
+        del pools[device_id]
+        pool.close()
@@ -0,0 +1,117 @@
+#pylint: disable=invalid-name
+""" Streaming statistics of each disk's datapoints, for failure prediction
+
+Rates are exponentially weighted moving averages, updated from the change
+since the disk was last collected, so only its last values and averages
+are kept rather than history read back from RRD files. They're kept in
+the collector daemon's memory, so start over once after it restarts.
+"""
+
+import math
+import operator
+import time
+
+from ZenPacks.daviswr.SMART.lib.cache import ComponentCache
+
+DAY = 86400.0
+
+# Datapoints whose rate of increase per day is averaged, the datapoint
+# of each rate, and the time constant of its average in days.
+# ssd_health counts down, so its rate is of decrease.
+RATES = (
+    ('reallocated_raw', 'reallocation_rate', 1, 7),
+    ('pending_sectors', 'pending_rate', 1, 7),
+    ('errors', 'error_rate', 1, 7),
+    ('ssd_health', 'wear_rate', -1, 90),
+    )
+
+# Days over which temperature excursions are counted, decaying
+EXCURSION_DAYS = 7
+# Limit for disks which don't report their own, the typical maximum
+# operating temperature of a hard drive
+DEFAULT_TEMP_LIMIT = 55
+
+# Longest time to wearout reported, in days
+MAX_WEAROUT_DAYS = 36500
+
+# Each condition adding to failure_risk_score, out of 100, weighted by
+# 'Failure Trends in a Large Disk Drive Population' by Pinheiro, Weber,
+# and Barroso, quoted in the Reallocation threshold
+RISK = (
+    # 14 and 21 times more likely to fail within 60 days
+    ('reallocated_raw', operator.gt, 0, 25),
+    ('reallocated_offline_raw', operator.gt, 0, 25),
+    # 16 times, for probational counts
+    ('pending_sectors', operator.gt, 0, 15),
+    # Still reallocating
+    ('reallocation_rate', operator.gt, 0, 15),
+    ('error_rate', operator.gt, 0, 5),
+    ('temperature_excursions', operator.ge, 1, 5),
+    ('days_to_wearout', operator.lt, 90, 10),
+    )
+
+# Last values and averages of each disk
+trend_cache = ComponentCache(max_age=30 * DAY)
+
+
+def ewma(average, rate, elapsed, days):
+    """ Returns an average updated with a rate over elapsed seconds """
+    weight = 1 - math.exp(-elapsed / (days * DAY))
+    return average + weight * (rate - average)
+
+
+def log_trends(device, component, values, now=None):
+    """ Returns the averaged rates, days to wearout and failure risk score
+    of a disk, from the smartctl datasource's values
+
+    Rates start with the disk's second collection.
+    """
+    now = now or time.time()
+    state = trend_cache.get(device, component, now)
+    trends = dict()
+
+    for point, rate_point, sign, days in RATES:
+        if point not in values:
+            continue
+        last = state.get(point)
+        if last is not None and now > last[1]:
+            elapsed = now - last[1]
+            change = max(0, sign * (values[point] - last[0]))
+            average = ewma(last[2], change * DAY / elapsed, elapsed, days)
+            trends[rate_point] = round(average, 6)
+        else:
+            average = last[2] if last else 0.0
+        state[point] = (values[point], now, average)
+
+    wear_rate = trends.get('wear_rate', 0)
+    if wear_rate > 0:
+        trends['days_to_wearout'] = min(
+            round(values['ssd_health'] / wear_rate, 1),
+            MAX_WEAROUT_DAYS,
+            )
+
+    known = dict(values)
+    known.update(trends)
+    known['temperature_excursions'] = state.get('temperature', (0,))[0]
+    trends['failure_risk_score'] = sum(
+        weight
+        for point, compare, limit, weight in RISK
+        if point in known and compare(known[point], limit)
+        )
+    return trends
+
+
+def temperature_trends(device, component, current, limit=None, now=None):
+    """ Returns the number of times a disk rose above its temperature limit,
+    decaying over EXCURSION_DAYS
+    """
+    now = now or time.time()
+    if not limit or limit >= 255:
+        limit = DEFAULT_TEMP_LIMIT
+    state = trend_cache.get(device, component, now)
+    excursions, last, hot = state.get('temperature', (0, now, False))
+    excursions *= math.exp(-max(0, now - last) / (EXCURSION_DAYS * DAY))
+    if current > limit and not hot:
+        excursions += 1
+    state['temperature'] = (excursions, now, current > limit)
+    return {'temperature_excursions': round(excursions, 3)}
@@ -1,12 +1,38 @@
 #pylint: disable=invalid-name
 """ Shared data for modeler & parser """
 
+import hashlib
+import json
+import zlib
+
 HEALTH_FAILED = 1
 HEALTH_PASSED = 0
 HEALTH_UNKNOWN = 2
 SMART_DISABLED = 1
 SMART_ENABLED = 0
 SMART_UNKNOWN = 2
+POWER_ACTIVE = 0
+POWER_IDLE = 1
+POWER_STANDBY = 2
+POWER_SLEEP = 3
+# ATA self-test execution status, the high nibble of a self-test log
+# entry's status byte
+SELFTEST_PASSED = 0
+SELFTEST_IN_PROGRESS = 15
+
+# Self-test status by the start of smartctl's description of it
+selftest_status = (
+    ('Completed without error', SELFTEST_PASSED),
+    ('Aborted by host', 1),
+    ('Interrupted', 2),
+    ('Fatal or unknown error', 3),
+    ('Completed: unknown failure', 4),
+    ('Completed: electrical failure', 5),
+    ('Completed: servo/seek failure', 6),
+    ('Completed: read failure', 7),
+    ('Completed: handling damage', 8),
+    ('Self-test routine in progress', SELFTEST_IN_PROGRESS),
+    )
 
 # https://en.wikipedia.org/wiki/S.M.A.R.T.
 attr_override = {
@@ -68,6 +94,27 @@ attr_override = {
     '248': 'FTL Program Page Count',
     }
 
+# Modeled properties which identify a disk or affect its collection.
+# The modeler only sends disks whose fingerprint of these has changed.
+fingerprint_props = (
+    'SerialNumber',
+    'FirmwareVersion',
+    'UserCapacity',
+    'LogicalSector',
+    'PhysicalSector',
+    'DevicePath',
+    'BlockDevice',
+    'PrivEscCmd',
+    'SmartctlPath',
+    'SmartctlOptions',
+    'Protocol',
+    'SmartLogs',
+    'Wwn',
+    'AlternatePaths',
+    'WarningTemperature',
+    'CriticalTemperature',
+    )
+
 # *Not* exhaustive...
 vendor_dict = {
     'CT': 'Crucial',
@@ -85,3 +132,48 @@ vendor_dict = {
     'WDC': 'Western Digital',
     'XP': 'Samsung',
     }
+
+
+def load_json(output):
+    """ Returns smartctl's --json output as a dict, if present """
+    # Batched or modeler output may have text lines before the JSON
+    start = 0 if output.startswith('{') else output.find('\n{') + 1
+    end = output.rfind('}') + 1
+    if (start or output.startswith('{')) and end > start:
+        try:
+            return json.loads(output[start:end])
+        except ValueError:
+            pass
+    return dict()
+
+
+def fingerprint(obj):
+    """ Returns a hash of a component's or ObjectMap's fingerprint_props """
+    values = list()
+    for prop in fingerprint_props:
+        value = getattr(obj, prop, None)
+        values.append('' if value is None else '{0}'.format(value))
+    return hashlib.sha1('\n'.join(values).encode('utf-8')).hexdigest()
+
+
+def attribute_allowlist(value):
+    """ Returns the set of SMART attribute IDs in zSmartAttributeIds,
+    given as lines or separated by spaces or commas
+    """
+    if not value:
+        return frozenset()
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    ids = set()
+    for line in value:
+        for attr_id in str(line).replace(',', ' ').split():
+            if attr_id.isdigit():
+                ids.add(attr_id.lstrip('0') or '0')
+    return frozenset(ids)
+
+
+def multipath_head(wwn, heads):
+    """ Returns which of a multipath setup's heads polls a disk shared by
+    them, the same on each head given the disk's WWN
+    """
+    return (zlib.crc32(wwn.encode('utf-8')) & 0xffffffff) % heads
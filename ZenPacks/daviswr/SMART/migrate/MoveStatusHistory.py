@@ -0,0 +1,46 @@
+#pylint: disable=invalid-name
+""" Moves the history of datapoints collected by the status datasource
+since it was split from smartctl
+"""
+
+import logging
+import os
+
+from Products.ZenModel.migrate.Migrate import Version
+from Products.ZenModel.ZenPack import ZenPackMigration
+
+log = logging.getLogger('zen.migrate')
+
+# Datapoints which moved from the smartctl datasource to status
+MOVED_DATAPOINTS = ('health_check', 'smart_enabled', 'temperature_celsius')
+
+
+def rename_rrds(path):
+    """ Renames the smartctl RRD files of moved datapoints in a component's
+    performance directory to their status names, returning how many were
+    """
+    renamed = 0
+    for point in MOVED_DATAPOINTS:
+        old = os.path.join(path, 'smartctl_{0}.rrd'.format(point))
+        new = os.path.join(path, 'status_{0}.rrd'.format(point))
+        # Once status has its own file, the old one is left alone
+        if os.path.exists(old) and not os.path.exists(new):
+            os.rename(old, new)
+            renamed += 1
+    return renamed
+
+
+class MoveStatusHistory(ZenPackMigration):
+    """ Renames each SMART disk's RRD files of the health check, SMART
+    enabled and temperature datapoints so their history carries over
+    """
+
+    version = Version(0, 9, 0)
+
+    def migrate(self, pack):
+        """ Renames the RRD files of every device's SMART disks """
+        renamed = 0
+        for device in pack.dmd.Devices.getSubDevicesGen():
+            for disk in device.smartStorage():
+                renamed += rename_rrds(disk.fullRRDPath())
+        log.info('Renamed %s SMART disk RRD files', renamed)
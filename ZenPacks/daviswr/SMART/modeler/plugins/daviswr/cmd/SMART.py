@@ -2,11 +2,52 @@
 """ Models SMART-supporting storage devices via SSH """
 
 import re
+import time
 
 from Products.DataCollector.plugins.CollectorPlugin import CommandPlugin
-from Products.DataCollector.plugins.DataMaps import MultiArgs, ObjectMap
+from Products.DataCollector.plugins.DataMaps import (
+    MultiArgs,
+    ObjectMap,
+    RelationshipMap,
+    )
 
-from ZenPacks.daviswr.SMART.lib.util import vendor_dict
+from ZenPacks.daviswr.SMART.lib.util import (
+    attribute_allowlist,
+    fingerprint,
+    load_json,
+    multipath_head,
+    vendor_dict,
+    )
+from ZenPacks.daviswr.SMART.parsers.smartctl import attributes, sections
+
+# Time of the last full RelationshipMap sent per device
+last_resync = dict()
+
+# Controller to probe for disks, a device path and type without the slot
+# Example: /dev/bus/0 -d megaraid
+controller_re = re.compile(r'^/dev/[\w/.-]+ -d [a-z0-9]+$')
+
+# Example:					Self-test supported.
+selftest_re = re.compile(r'^\s+Self-test supported', re.MULTILINE)
+
+# Keys of the text output's logical unit identifiers, the same on every
+# path to a disk, preferred first
+# Example: LU WWN Device Id: 5 0014ee 265155ff0
+wwn_keys = ('LuWwnDeviceId', 'LogicalUnitId', 'Namespace1IeeeEui64')
+
+
+# NVMe composite temperature thresholds, by the text output's keys, kept
+# for collection with nvme-cli, whose SMART log doesn't have them
+# Example: Warning  Comp. Temp. Threshold:     85 Celsius
+temp_keys = (
+    ('WarningComp.Temp.Threshold', 'WarningTemperature'),
+    ('CriticalComp.Temp.Threshold', 'CriticalTemperature'),
+    )
+
+
+def normalize_wwn(value):
+    """ Returns a WWN or EUI-64 as lowercase hex digits alone """
+    return re.sub(r'^0x|[^0-9a-f]', '', '{0}'.format(value).lower())
 
 
 class SMART(CommandPlugin):
@@ -14,11 +55,23 @@ class SMART(CommandPlugin):
 
     relname = 'smartStorage'
     modname = 'ZenPacks.daviswr.SMART.SmartStorage'
+    attr_relname = 'smartAttributes'
+    attr_modname = 'ZenPacks.daviswr.SMART.SmartAttribute'
 
     deviceProperties = CommandPlugin.deviceProperties + (
+        'zSmartAttributeIds',
+        'zSmartConcurrency',
+        'zSmartControllerProbeSlots',
+        'zSmartControllers',
         'zSmartDiskMapMatch',
         'zSmartIgnoreModels',
         'zSmartIgnoreUnsupported',
+        'zSmartLowPriority',
+        'zSmartModelResyncInterval',
+        'zSmartMultipathHead',
+        'zSmartMultipathHeads',
+        'getDaviswrSmartAttributeIds',
+        'getDaviswrSmartFingerprints',
         )
 
     # On macOS, a 'smartctl --scan' result looks like
@@ -26,6 +79,14 @@ class SMART(CommandPlugin):
     # AppleAHCI/PRT2@2/IOAHCIDevice@0/AppleAHCIDiskDriver/
     # IOAHCIBlockStorageDevice
     # On Linux, 'smartctl --scan' may not show NVMe devices
+    # Once a disk reports Permission denied, privilege escalation is used for
+    # it and every disk after it. The first disk is modeled before running
+    # any others concurrently so they know whether it's needed.
+    # --capabilities provides Auto Offline Data Collection for (S)ATA disks
+    # --attributes is only added if zSmartAttributeIds is set
+    # Disks behind RAID controllers and HBAs, those in zSmartControllers
+    # and 3ware or cciss device nodes on Linux, are probed by slot number,
+    # smart_slots at once, until a batch of slots has no disks
     command_raw = r"""$ZENOTHING;
         PATH=/sbin:/usr/sbin:$PATH;
         IFS=$'\n';
@@ -35,6 +96,10 @@ class SMART(CommandPlugin):
             smart_path=$(whereis smartctl | cut -d' ' -f2);
         fi;
         smart_opts="--badsum=ignore --nocheck=standby";
+        if $smart_path -j --version >/dev/null 2>&1;
+        then
+            smart_json="--json=c";
+        fi;
         if [[ $(uname -s) == Darwin ]];
         then
             scan_cmd="/usr/sbin/diskutil list | grep physical | cut -d' ' -f1";
@@ -49,36 +114,182 @@ class SMART(CommandPlugin):
             scan_cmd="$scan_cmd | grep -e 'nvme[[:digit:]]\$'";
             scan_cmd="$scan_cmd | sed 's~\$~ -d auto~g'";
         fi;
+        probe_cmd="true";
+        if [[ $(uname -s) == Linux ]];
+        then
+            probe_cmd="ls /dev/twa? /dev/twe? /dev/twl? 2>/dev/null";
+            probe_cmd="$probe_cmd | sed 's~\$~ -d 3ware~g'";
+            probe_cmd="$probe_cmd ; ls /dev/cciss/c?d0 2>/dev/null";
+            probe_cmd="$probe_cmd | sed 's~\$~ -d cciss~g'";
+        fi;
         scan_cmd="$scan_cmd ; cat ~/zenoss_smart.txt 2>/dev/null";
-        scan_cmd="$scan_cmd | grep -v '[\|\&\`\;\<\>\=\|\$\@\.\^\*\?\(\)\+\!]'"
-        health_cmd="$smart_path --health $smart_opts";
-        for device in $(eval $scan_cmd);
+        scan_cmd="$scan_cmd | grep -v '[\|\&\`\;\<\>\=\|\$\@\.";
+        scan_cmd="$scan_cmd\^\*\?\(\)\+\!]'";
+        if [[ $smart_low == 1 ]];
+        then
+            smart_nice="nice -n 19";
+            if command -v ionice >/dev/null 2>&1;
+            then
+                smart_nice="$smart_nice ionice -c 2 -n 7";
+            fi;
+        fi;
+        for priv_cmd in dzdo doas pfexec sudo;
         do
-            device=$(echo $device | sed 's~-d ~--device ~g');
-            info_cmd="$smart_path --info --get=all --capabilities $smart_opts";
-            permission=$(eval $health_cmd $device | tail -1);
-            if [[ $permission == *Permission\ denied ]];
+            if [[ -e $(command -v $priv_cmd) ]];
             then
-                for priv_cmd in dzdo doas pfexec sudo;
-                do
-                    if [[ -e $(command -v $priv_cmd) ]];
-                    then
-                        break;
-                    fi;
-                done;
-                info_cmd="$priv_cmd $info_cmd";
+                break;
+            fi;
+        done;
+        info_cmd="$smart_path --info --get=all --capabilities";
+        info_cmd="$info_cmd $smart_opts $smart_json";
+        if [[ $smart_attrs == 1 ]];
+        then
+            info_cmd="$info_cmd --attributes";
+        fi;
+        smart_priv="";
+        smart_model() {
+            device=${1//-d /--device };
+            info=$(eval $smart_nice $smart_priv $info_cmd $device);
+            if [[ -z $smart_priv && $info == *Permission\ denied* ]];
+            then
+                smart_priv=$priv_cmd;
+                info=$(eval $smart_nice $smart_priv $info_cmd $device);
             fi;
-            if [[ $permission != *Operation\ not\ supported\ by\ device ]];
+            if [[ $info != *Operation\ not\ supported\ by\ device* ]];
             then
                 echo "Device Path: $device";
-                echo "Priv Esc Cmd: $priv_cmd";
+                echo "Priv Esc Cmd: $smart_priv";
                 echo "smartctl Path: $smart_path";
-                eval $info_cmd $device;
+                echo "smartctl Options: $smart_json";
+                echo "$info";
                 echo "--------";
             fi;
-        done"""
+        };
+        smart_throttle() {
+            smart_jobs=$((smart_jobs + 1));
+            if [[ $smart_jobs -ge $smart_max ]];
+            then
+                if wait -n 2>/dev/null;
+                then
+                    smart_jobs=$((smart_jobs - 1));
+                else
+                    wait;
+                    smart_jobs=0;
+                fi;
+            fi;
+        };
+        smart_probe() {
+            probe_dev=${1%% -d *};
+            probe_type=${1##* -d };
+            probe_slot=0;
+            probe_found=1;
+            while [[ $probe_found == 1 && $probe_slot -lt 256 ]];
+            do
+                probe_found=0;
+                probe_end=$((probe_slot + ${smart_slots:-8}));
+                while [[ $probe_slot -lt $probe_end ]];
+                do
+                    printf -v probe_file "$probe_tmp/%04d" $probe_slot;
+                    probe_arg="$probe_dev -d $probe_type,$probe_slot";
+                    if [[ $probe_slot -eq 0 ]];
+                    then
+                        smart_model "$probe_arg" > "$probe_file";
+                    else
+                        smart_model "$probe_arg" > "$probe_file" &
+                    fi;
+                    probe_slot=$((probe_slot + 1));
+                done;
+                wait;
+                for probe_file in "$probe_tmp"/*;
+                do
+                    if grep -qi 'serial.number' "$probe_file";
+                    then
+                        probe_found=1;
+                        cat "$probe_file";
+                    fi;
+                    rm -f "$probe_file";
+                done;
+            done;
+        };
+        if [[ ${smart_max:-1} -gt 1 ]];
+        then
+            smart_tmp=$(mktemp -d 2>/dev/null || mktemp -d -t zenoss_smart);
+        fi;
+        smart_count=0;
+        smart_jobs=0;
+        for device in $(eval $scan_cmd);
+        do
+            smart_count=$((smart_count + 1));
+            if [[ -d $smart_tmp ]];
+            then
+                printf -v smart_file "$smart_tmp/%04d" $smart_count;
+                if [[ $smart_count -eq 1 ]];
+                then
+                    smart_model $device > "$smart_file";
+                else
+                    smart_model $device > "$smart_file" &
+                    smart_throttle;
+                fi;
+            else
+                smart_model $device;
+            fi;
+        done;
+        wait;
+        if [[ -d $smart_tmp ]];
+        then
+            cat "$smart_tmp"/* 2>/dev/null;
+            rm -rf "$smart_tmp";
+        fi;
+        probe_tmp=$(mktemp -d 2>/dev/null || mktemp -d -t zenoss_smart);
+        for controller in $smart_controllers $(eval $probe_cmd);
+        do
+            smart_probe "$controller";
+        done;
+        rm -rf "$probe_tmp";"""
     command = ' '.join(command_raw.replace('  ', '').splitlines())
 
+    def device_command(self, device, log):
+        """ Returns the command with concurrency, priority, whether
+        attributes are modeled and the controllers probed set from the
+        device's zProperties
+        """
+        allowlist = attribute_allowlist(
+            getattr(device, 'zSmartAttributeIds', None)
+            )
+        controllers = list()
+        for line in getattr(device, 'zSmartControllers', None) or list():
+            line = line.strip()
+            if controller_re.match(line):
+                controllers.append(line)
+            elif line:
+                log.warning(
+                    '%s: %s in zSmartControllers is not a device path and '
+                    'type, such as /dev/bus/0 -d megaraid',
+                    device.id,
+                    line
+                    )
+        settings = (
+            "smart_max={0}; smart_low={1}; smart_attrs={2}; "
+            "smart_slots={3}; smart_controllers=$'{4}';"
+            ).format(
+                int(getattr(device, 'zSmartConcurrency', 1) or 1),
+                1 if getattr(device, 'zSmartLowPriority', False) else 0,
+                1 if allowlist else 0,
+                max(1, int(
+                    getattr(device, 'zSmartControllerProbeSlots', 8) or 8
+                    )),
+                '\\n'.join(controllers),
+                )
+        return '{0} {1}'.format(settings, SMART.command)
+
+    def condition(self, device, log):
+        """ Runs the command built for the device by device_command.
+        The collector reads command from the plugin instance it creates
+        for each device once condition has returned.
+        """
+        self.command = self.device_command(device, log)
+        return True
+
     def process(self, device, results, log):
         """ Generates RelationshipMaps from Command output """
 
@@ -104,12 +315,32 @@ class SMART(CommandPlugin):
         else:
             log.debug('%s: zSmartIgnoreModels not set', device.id)
 
+        allowlist = attribute_allowlist(
+            getattr(device, 'zSmartAttributeIds', None)
+            )
+        if allowlist:
+            log.debug(
+                '%s: zSmartAttributeIds set to %s',
+                device.id,
+                ', '.join(sorted(allowlist, key=int))
+                )
+
         skip_unsupport = getattr(device, 'zSmartIgnoreUnsupported', True)
         if skip_unsupport:
             log.debug('%s: zSmartIgnoreUnsupported set', device.id)
         else:
             log.debug('%s: zSmartIgnoreUnsupported not set', device.id)
 
+        heads = max(1, int(getattr(device, 'zSmartMultipathHeads', 1) or 1))
+        head = int(getattr(device, 'zSmartMultipathHead', 0) or 0) % heads
+        if heads > 1:
+            log.debug(
+                '%s: polling multipath disks as head %s of %s',
+                device.id,
+                head,
+                heads
+                )
+
         # Example:     512 bytes logical, 4096 bytes physical
         sector_re = r'(\d+) bytes logical, (\d+) bytes physical'
 
@@ -155,9 +386,24 @@ class SMART(CommandPlugin):
         indexed = dict()
         block = dict()
         dedupe = list()
+        # Attribute rows of each disk by serial number
+        attr_rows = dict()
 
         for dev in devices:
             dev_map = dict()
+            unsupported = ('Unavailable - device lacks SMART capability' in dev
+                           or 'Operation not supported by device' in dev)
+
+            rows = sections(dev)[1] if allowlist else list()
+
+            # smartctl 7+ JSON output, after the text header lines
+            data = load_json(dev)
+            if data:
+                dev_map.update(self.json_properties(data))
+                smart_support = data.get('smart_support', dict())
+                if not smart_support.get('available', True):
+                    unsupported = True
+                dev = dev.split('\n{', 1)[0]
 
             for line in dev.splitlines():
                 if ': ' in line and 'capability' not in line:
@@ -200,11 +446,37 @@ class SMART(CommandPlugin):
                         # This comes from a datapoint rather
                         # than modeled attribute
                         continue
+                    elif key_raw.startswith('SMART Attributes'):
+                        # Header of the --attributes table
+                        continue
                     dev_map[key] = value
 
+            dev_map.update(self.profile(dev, data, dev_map))
+            # The JSON output lacks the vendor-specific pages SAS disks
+            # count blocks and commands in, so they're monitored by text
+            if 'SCSI' == dev_map.get('Protocol'):
+                dev_map['SmartctlOptions'] = ''
+
+            if 'Wwn' not in dev_map:
+                for key in wwn_keys:
+                    if dev_map.get(key):
+                        dev_map['Wwn'] = normalize_wwn(dev_map[key])
+                        break
+            # Some USB bridges report an all-zero WWN for every disk
+            if not dev_map.get('Wwn', '').strip('0'):
+                dev_map['Wwn'] = ''
+            # Always set, 0 when unknown as in zenpack.yaml, so a stored
+            # disk's fingerprint matches its map's
+            for key, prop in temp_keys:
+                match = re.match(r'\d+', str(dev_map.get(key, '')))
+                if prop not in dev_map:
+                    dev_map[prop] = int(match.group()) if match else 0
+
             if (dev_map.get('DevicePath', None)
                     and dev_map.get('SerialNumber', None)):
                 dev_path = dev_map['DevicePath']
+                if rows:
+                    attr_rows[dev_map['SerialNumber']] = rows
                 # Model fixup for SCSI devices
                 if dev_map.get('Vendor', None) and dev_map.get('Product', None):
                     if not dev_map['Product'].startswith(dev_map['Vendor']):
@@ -231,9 +503,7 @@ class SMART(CommandPlugin):
                         )
                     continue
                 # zSmartIgnoreUnsupported
-                elif (('Unavailable - device lacks SMART capability' in dev
-                        or 'Operation not supported by device' in dev)
-                        and skip_unsupport):
+                elif unsupported and skip_unsupport:
                     log.info(
                         '%s: %s does not support SMART, ignoring',
                         device.id,
@@ -241,38 +511,62 @@ class SMART(CommandPlugin):
                         )
                     continue
                 else:
+                    key = dev_map['Wwn'] or dev_map['SerialNumber']
                     if '-d' in dev_path and dev_path.endswith('auto'):
                         block_dev = dev_path.split(' ', 1)[0]
                         dev_map['BlockDevice'] = block_dev.replace('/dev/', '')
-                        block[dev_map['SerialNumber']] = dev_map
+                        block.setdefault(key, list()).append(dev_map)
                     # Indexed drive on a controller/HBA/DAS/etc
                     else:
-                        indexed[dev_map['SerialNumber']] = dev_map
+                        indexed.setdefault(key, list()).append(dev_map)
             else:
                 # Lacks Device Path or Serial Number
                 continue
 
-        # Deduplicate serials
-        for serial in indexed:
-            if serial in block:
-                # All other properties should be the same
-                indexed[serial]['BlockDevice'] = block[serial]['BlockDevice']
-                del block[serial]
+        # Deduplicate disks reached by more than one path, such as both a
+        # controller slot and a block device, or each port of a dual-ported
+        # SAS disk, by WWN or else serial number. Controller paths are
+        # preferred, then the shortest and lowest, and the rest recorded.
+        def path_order(dev_map):
+            """ Sorts paths to a disk, preferred first """
+            return (len(dev_map['DevicePath']), dev_map['DevicePath'])
+
+        keys = list(indexed) + [key for key in block if key not in indexed]
+        for key in keys:
+            blocks = sorted(block.get(key, list()), key=path_order)
+            paths = sorted(indexed.get(key, list()), key=path_order) + blocks
+            dev_map = paths[0]
+            # All other properties should be the same
+            if blocks:
+                dev_map['BlockDevice'] = blocks[0]['BlockDevice']
             else:
-                block_dev = indexed[serial]['DevicePath'].split(' ', 1)[0]
-                indexed[serial]['BlockDevice'] = block_dev.replace('/dev/', '')
-            dedupe.append(indexed[serial])
-        for serial in block:
-            if serial not in indexed:
-                dedupe.append(block[serial])
+                block_dev = dev_map['DevicePath'].split(' ', 1)[0]
+                dev_map['BlockDevice'] = block_dev.replace('/dev/', '')
+            dev_map['AlternatePaths'] = ', '.join(
+                sorted(other['DevicePath'] for other in paths[1:])
+                )
+            # Disks on more than one device node are shared by every head
+            # of a multipath setup, and polled by only one of them
+            nodes = set(other['DevicePath'].split(' ', 1)[0]
+                        for other in paths)
+            if (heads > 1 and len(nodes) > 1 and dev_map['Wwn']
+                    and multipath_head(dev_map['Wwn'], heads) != head):
+                log.info(
+                    '%s: %s polled by another multipath head, ignoring',
+                    device.id,
+                    dev_map['DevicePath']
+                    )
+                continue
+            dedupe.append(dev_map)
 
+        attr_maps = dict()
         for dev_map in dedupe:
             title = dev_map['DevicePath'].replace('--device', '-d')
             title = title.replace(' -d auto', '')
             title = title.replace(' -d cciss', '')
             title = title.replace(' -d nvme', '')
             if ',' in title:
-                title = title[:-2]
+                title = title.rsplit(',', 1)[0]
             dev_map['title'] = title
             dev_map['id'] = self.prepId(dev_map['SerialNumber'])
             # NVMe form-factor
@@ -289,6 +583,11 @@ class SMART(CommandPlugin):
             if 'LogicalSector' not in dev_map:
                 dev_map['LogicalSector'] = 512
             om = ObjectMap(modname=self.modname, data=dev_map)
+            attr_maps[om.id] = self.attribute_map(
+                om.id,
+                attr_rows.get(dev_map['SerialNumber'], list()),
+                allowlist,
+                )
             model = dev_map.get('DeviceModel', '').replace('_', ' ')
             if model:
                 if ' ' in model:
@@ -311,4 +610,239 @@ class SMART(CommandPlugin):
             rm.append(om)
 
         log.debug('%s RelMap:\n%s', self.name(), str(rm))
-        return rm
+        return self.changed_maps(device, rm, log, attr_maps=attr_maps)
+
+    def attribute_map(self, disk_id, rows, allowlist):
+        """ Returns a RelationshipMap of a disk's attributes in the
+        allowlist, of those it reports
+        """
+        attr_rm = RelationshipMap(
+            relname=self.attr_relname,
+            compname='{0}/{1}'.format(self.relname, disk_id),
+            modname=self.attr_modname,
+            )
+        parsed = attributes([row for row in rows if row[0] in allowlist])
+        for attr_id in sorted(parsed, key=int):
+            attr = parsed[attr_id]
+            attr_rm.append(ObjectMap(modname=self.attr_modname, data={
+                'id': self.prepId('{0}_{1}'.format(disk_id, attr_id)),
+                'title': attr.name,
+                'AttributeId': attr_id,
+                'AttributeType': attr.type,
+                }))
+        return attr_rm
+
+    def changed_maps(self, device, rm, log, now=None, attr_maps=None):
+        """ Returns ObjectMaps of only the disks whose fingerprint differs
+        from the modeled component's, or the full RelationshipMap if disks
+        were added or removed, or zSmartModelResyncInterval hours have
+        passed since it was last sent
+
+        Along with them go the RelationshipMaps of disks' attributes, if
+        any were added or removed, or if sending all disks and a disk has
+        or had any.
+        """
+        now = now or time.time()
+        stored = getattr(device, 'getDaviswrSmartFingerprints', None)
+        interval = float(
+            getattr(device, 'zSmartModelResyncInterval', 24) or 0
+            ) * 3600
+        if (stored is None
+                or not interval
+                or now - last_resync.get(device.id, 0) >= interval):
+            log.debug('%s: Sending all disks', device.id)
+            last_resync[device.id] = now
+            return self.with_attributes(device, rm, attr_maps, True)
+
+        if set(om.id for om in rm) != set(stored):
+            log.info('%s: Disks added or removed, sending all', device.id)
+            last_resync[device.id] = now
+            return self.with_attributes(device, rm, attr_maps, True)
+
+        changed = list()
+        for om in rm:
+            if fingerprint(om) != stored[om.id]:
+                om.compname = '{0}/{1}'.format(self.relname, om.id)
+                changed.append(om)
+        log.info(
+            '%s: %s of %s disks changed',
+            device.id,
+            len(changed),
+            len(stored)
+            )
+        return self.with_attributes(device, changed, attr_maps, False)
+
+    @staticmethod
+    def with_attributes(device, maps, attr_maps, resync):
+        """ Returns disk maps followed by the attribute RelationshipMaps to
+        send, or only the disk maps if there are none
+        """
+        stored = getattr(device, 'getDaviswrSmartAttributeIds', None) or dict()
+        attr_rms = list()
+        for disk_id in sorted(attr_maps or dict()):
+            attr_rm = attr_maps[disk_id]
+            ids = sorted(attr.id for attr in attr_rm)
+            old_ids = stored.get(disk_id, list())
+            if (ids or old_ids) and (resync or ids != sorted(old_ids)):
+                attr_rms.append(attr_rm)
+        if not attr_rms:
+            return maps
+        return ([maps] if hasattr(maps, 'relname') else list(maps)) + attr_rms
+
+    @staticmethod
+    def profile(dev, data, dev_map):
+        """ Returns the disk's protocol and the logs requested from it
+        during collection, those its protocol and capabilities support
+
+        Capabilities smartctl doesn't report are assumed supported.
+        """
+        if data:
+            protocol = data.get('device', dict()).get('protocol', '')
+            smart_data = data.get('ata_smart_data', dict())
+            gp_logging = smart_data.get('capabilities', dict()).get(
+                'gp_logging_supported',
+                True
+                )
+            sct = data.get('ata_sct_capabilities', dict())
+            sct_status = bool(sct['value'] & 1) if 'value' in sct else True
+            capabilities = smart_data.get('capabilities', dict())
+            error_log = capabilities.get('error_logging_supported', True)
+            self_tests = capabilities.get('self_tests_supported', True)
+        else:
+            if 'NvmeVersion' in dev_map or 'TotalNvmCapacity' in dev_map:
+                protocol = 'NVMe'
+            elif 'AtaVersion' in dev_map or 'SataVersion' in dev_map:
+                protocol = 'ATA'
+            elif 'Vendor' in dev_map or 'TransportProtocol' in dev_map:
+                protocol = 'SCSI'
+            else:
+                protocol = ''
+            gp_logging = ('Error logging capability' not in dev
+                          or 'General Purpose Logging supported' in dev)
+            sct_status = ('SCT capabilities' not in dev
+                          or 'SCT Status supported' in dev)
+            error_log = ('Error logging capability' not in dev
+                         or 'Error logging supported' in dev)
+            # Not "No Self-test supported"
+            self_tests = ('Offline data collection capabilities' not in dev
+                          or bool(selftest_re.search(dev)))
+
+        solid_state = 'Solid State' in str(dev_map.get('RotationRate', ''))
+        logs = list()
+        if 'ATA' == protocol:
+            if sct_status:
+                logs.append('scttempsts')
+            if gp_logging:
+                logs.append('devstat')
+                if solid_state:
+                    logs.append('ssd')
+            if 'SataVersion' in dev_map:
+                logs.append('sataphy')
+            if error_log:
+                logs.append('error')
+            if self_tests:
+                logs.append('selftest')
+        elif 'SCSI' == protocol:
+            if solid_state:
+                logs.append('ssd')
+            if dev_map.get('TransportType', 'SAS').startswith('SAS'):
+                logs.append('sasphy')
+
+        return {'Protocol': protocol, 'SmartLogs': ' '.join(logs)}
+
+    def json_properties(self, data):
+        """ Returns modeled properties from smartctl's JSON output,
+        named the same as from the text output
+        """
+        dev_map = dict()
+
+        # (S)ATA & NVMe
+        if 'model_name' in data:
+            dev_map['DeviceModel'] = data['model_name']
+        # SCSI, model is fixed up from these
+        if 'scsi_vendor' in data:
+            dev_map['Vendor'] = data['scsi_vendor']
+        if 'scsi_product' in data:
+            dev_map['Product'] = data['scsi_product']
+            dev_map.setdefault('DeviceModel', data['scsi_product'])
+        if 'scsi_revision' in data:
+            dev_map['Revision'] = data['scsi_revision']
+
+        if 'serial_number' in data:
+            dev_map['SerialNumber'] = data['serial_number']
+        # Identifiers of the logical unit, as in normalize_wwn
+        wwn = data.get('wwn', dict())
+        if set(('naa', 'oui', 'id')) <= set(wwn):
+            dev_map['Wwn'] = '{0:x}{1:06x}{2:09x}'.format(
+                wwn['naa'],
+                wwn['oui'],
+                wwn['id']
+                )
+        elif 'logical_unit_id' in data:
+            dev_map['Wwn'] = normalize_wwn(data['logical_unit_id'])
+        else:
+            for namespace in data.get('nvme_namespaces', list()):
+                eui = namespace.get('eui64', dict())
+                if 'oui' in eui and 'ext_id' in eui:
+                    dev_map['Wwn'] = '{0:06x}{1:010x}'.format(
+                        eui['oui'],
+                        eui['ext_id']
+                        )
+                    break
+        if 'firmware_version' in data:
+            dev_map['FirmwareVersion'] = data['firmware_version']
+
+        thresholds = data.get('nvme_composite_temperature_threshold', dict())
+        if 'warning' in thresholds:
+            dev_map['WarningTemperature'] = thresholds['warning']
+        if 'critical' in thresholds:
+            dev_map['CriticalTemperature'] = thresholds['critical']
+
+        if 'bytes' in data.get('user_capacity', dict()):
+            dev_map['UserCapacity'] = data['user_capacity']['bytes']
+        elif 'nvme_total_capacity' in data:
+            dev_map['UserCapacity'] = data['nvme_total_capacity']
+        if 'logical_block_size' in data:
+            dev_map['LogicalSector'] = data['logical_block_size']
+        if 'physical_block_size' in data:
+            dev_map['PhysicalSector'] = data['physical_block_size']
+
+        if 'rotation_rate' in data:
+            dev_map['RotationRate'] = (
+                '{0} rpm'.format(data['rotation_rate'])
+                if data['rotation_rate']
+                else 'Solid State Device'
+                )
+        if 'name' in data.get('form_factor', dict()):
+            dev_map['FormFactor'] = data['form_factor']['name']
+
+        if 'string' in data.get('ata_version', dict()):
+            dev_map['AtaVersion'] = data['ata_version']['string']
+        if 'string' in data.get('sata_version', dict()):
+            # Example: SATA 3.1, 6.0 Gb/s (current: 3.0 Gb/s)
+            sata = data['sata_version']['string']
+            speed = data.get('interface_speed', dict())
+            if 'string' in speed.get('max', dict()):
+                sata = '{0}, {1}'.format(sata, speed['max']['string'])
+            if 'string' in speed.get('current', dict()):
+                sata = '{0} (current: {1})'.format(
+                    sata,
+                    speed['current']['string']
+                    )
+            dev_map['SataVersion'] = sata
+            dev_map['TransportType'] = sata
+        elif 'name' in data.get('scsi_transport_protocol', dict()):
+            dev_map['TransportType'] = data['scsi_transport_protocol']['name']
+
+        # Auto Offline Data Collection is the status' high bit
+        offline = data.get('ata_smart_data', dict()).get(
+            'offline_data_collection',
+            dict()
+            )
+        if 'value' in offline.get('status', dict()):
+            dev_map['AutoOfflineDataCollection'] = (
+                'Enabled' if offline['status']['value'] & 0x80
+                else 'Disabled'
+                )
+
+        return dev_map
@@ -0,0 +1,93 @@
+#pylint: disable=line-too-long,no-init,invalid-name,too-few-public-methods
+""" Parses the values of each SMART attribute from smartctl """
+
+from Products.ZenRRD.CommandParser import CommandParser
+
+from ZenPacks.daviswr.SMART.lib.command import SMARTD_PREFIX
+from ZenPacks.daviswr.SMART.parsers.smartctl import (
+    add_values,
+    attribute_cache,
+    batch_output,
+    sections,
+    smartd_rows,
+    standby_re,
+    )
+
+# Every attribute component of a disk gets the output of the same
+# command, so it's only parsed once for all of them
+values_cache = {'output': None, 'values': dict()}
+
+
+def parse(output):
+    """ Returns the normalized, worst, threshold and raw values of each
+    attribute reported in a disk's smartctl output, by attribute ID
+
+    Values are as smartctl reports them, not scaled to 100. Those not
+    reported, such as the worst and threshold values smartd doesn't keep,
+    are left out.
+    """
+    if values_cache['output'] is output or values_cache['output'] == output:
+        return values_cache['values']
+
+    if standby_re.search(output):
+        rows = list()
+    elif SMARTD_PREFIX in output:
+        rows = smartd_rows(output)
+    else:
+        rows = sections(output)[1]
+
+    by_id = dict()
+    for attr_id, _, value, worst, threshold, _, raw in rows:
+        values = {'value': int(value), 'raw': int(raw)}
+        if worst is not None:
+            values['worst'] = int(worst)
+        if threshold is not None:
+            values['threshold'] = int(threshold)
+        by_id[attr_id] = values
+
+    values_cache['output'] = output
+    values_cache['values'] = by_id
+    return by_id
+
+
+def attribute_values(output, disk, attr_id, path=''):
+    """ Returns an attribute's values from its disk's output, which may be
+    a batch
+    """
+    output = batch_output(output, disk, path)
+    if not output:
+        return dict()
+    return parse(output).get(attr_id, dict())
+
+
+class attribute(CommandParser):
+    """ Parses the values of a SMART attribute from smartctl """
+
+    def dataForParser(self, context, datapoint):
+        """ Returns the attribute's ID and its disk's ID and device path """
+        disk = context.smartStorage()
+        return {
+            'attribute': getattr(context, 'AttributeId', ''),
+            'disk': disk.id,
+            'path': getattr(disk, 'DevicePath', ''),
+            }
+
+    def processResults(self, cmd, result):
+        """ Returns metrics from the latest output of the attribute's disk
+
+        The command does nothing, the disk's smartctl parser records its
+        output. zencommand may run this parser before the disk's of the
+        same cycle, so values can be a cycle behind.
+        """
+        if not cmd.points:
+            return
+        data = cmd.points[0].data
+        output = attribute_cache.get(
+            cmd.deviceConfig.device,
+            data.get('disk', ''),
+            ).get('output')
+        if output:
+            add_values(cmd, result, parse(output).get(
+                data.get('attribute', ''),
+                dict(),
+                ))
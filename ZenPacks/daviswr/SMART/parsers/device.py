@@ -0,0 +1,32 @@
+#pylint: disable=line-too-long,no-init,invalid-name,too-few-public-methods
+""" Reports device datapoints rolled up from its disks """
+
+from Products.ZenRRD.CommandParser import CommandParser
+
+from ZenPacks.daviswr.SMART.lib.rollup import rollup
+from ZenPacks.daviswr.SMART.parsers.smartctl import add_values
+
+
+class device(CommandParser):
+    """ Reports device datapoints rolled up from the latest values of its
+    disks for a tier, from the status and smartctl parsers
+
+    The datasource's command does nothing, its output isn't read.
+    zencommand may parse it before the disks' output of the same cycle,
+    in which case the rollup is of their values from the cycle before.
+    """
+
+    def dataForParser(self, context, datapoint):
+        """ Returns the tier, the ID of the datapoint's datasource """
+        return {'tier': datapoint.datasource().id}
+
+    def processResults(self, cmd, result):
+        """ Returns the device's rollup """
+        if not cmd.points:
+            return
+        # Disks not collected for two cycles are left out
+        add_values(cmd, result, rollup(
+            cmd.deviceConfig.device,
+            cmd.points[0].data.get('tier', ''),
+            2 * int(getattr(cmd, 'cycleTime', 0) or 0),
+            ))
@@ -1,431 +1,1059 @@
 #pylint: disable=line-too-long,no-init,invalid-name,too-few-public-methods
 """ Parses performance data from smartctl """
 
+import base64
 import re
+import time
+import zlib
 
 from Products.ZenEvents import Event
 from Products.ZenRRD.CommandParser import CommandParser
 from Products.ZenUtils.Utils import prepId
 
+from ZenPacks.daviswr.SMART.lib.cache import ComponentCache
+from ZenPacks.daviswr.SMART.lib.command import (
+    COMPRESSED_HEADER,
+    DELIMITER,
+    PATH_PREFIX,
+    SMARTD_PREFIX,
+    )
+from ZenPacks.daviswr.SMART.lib.cost import disk_costs
+from ZenPacks.daviswr.SMART.lib.datapoints import (
+    LIFETIME_ATTRS,
+    LOG_PLAN,
+    SSD_HEALTH_ATTRS,
+    STATUS_PLAN,
+    Attribute,
+    Sources,
+    evaluate,
+    )
+from ZenPacks.daviswr.SMART.lib.rollup import record
+from ZenPacks.daviswr.SMART.lib.trend import log_trends
 from ZenPacks.daviswr.SMART.lib.util import (
     HEALTH_FAILED,
     HEALTH_PASSED,
     HEALTH_UNKNOWN,
+    POWER_ACTIVE,
+    POWER_IDLE,
+    POWER_SLEEP,
+    POWER_STANDBY,
+    SELFTEST_IN_PROGRESS,
+    SELFTEST_PASSED,
     SMART_DISABLED,
     SMART_ENABLED,
     SMART_UNKNOWN,
     attr_override,
+    load_json,
+    selftest_status,
     )
 
+# Example: Serial Number:    WD-WCC7K3KCRH5F
+serial_re = re.compile(r'^Serial [Nn]umber:\s+(\S+)', re.MULTILINE)
 
-class smartctl(CommandParser):
-    """ Parses performance data from smartctl """
+# Delimiter lines of batched output. Error log command histories have
+# runs of dashes as long within their lines.
+delimiter_re = re.compile(
+    r'^{0}$'.format(re.escape(DELIMITER)),
+    re.MULTILINE
+    )
 
-    def processResults(self, cmd, result):
-        """ Returns metrics from command output """
-
-        ## Colon-delimited values (Info, Health, SCT, etc)
-        info = dict()
-        for line in cmd.result.output.splitlines():
-            line = line.replace(' = ', ': ')
-            if ': ' in line and 'capability' not in line:
-                key_raw, value_raw = line.replace(' is', '').split(':', 1)
-                key = ''
-                for term in key_raw.strip().replace('-', ' ').split(' '):
-                    key += term.title()
-                value = value_raw.strip().replace('%', '')
-                if 'bytes' in value or value[0].isdigit():
-                    try:
-                        value = value.split(' ')[0].replace(',', '')
-                        value = float(value) if '.' in value else int(value)
-                    except ValueError:
-                        if 'Min/Max' not in key_raw:
-                            continue
-                elif 'SMART support' == key_raw:
-                    value = (SMART_ENABLED if 'Enabled' in value
-                             else SMART_DISABLED)
-                elif key_raw.startswith('SMART overall-health'):
-                    value = (HEALTH_PASSED if 'PASSED' in value
-                             else HEALTH_FAILED)
-                elif 'SMART Health Status' == key_raw:
-                    value = (HEALTH_PASSED if 'OK' in value
-                             else HEALTH_FAILED)
-                info[key] = value
-
-        component = prepId(info.get('SerialNumber', ''))
-        hard_disk = (isinstance(info.get('RotationRate', ''), int)
-                     or 'disk' == info.get('DeviceType', ''))
-
-        # Temperature Threshold
-        # SCSI
-        if 'CurrentDriveTemperature' in info:
-            temp_event = True
-            event_key = 'CurrentDriveTemperature'
-            current = info[event_key]
-            critical = info.get('DriveTripTemperature', 255)
-            warning = 255
-        # NVMe
-        elif 'Temperature' in info:
-            temp_event = True
-            event_key = 'Temperature'
-            current = info[event_key]
-            critical = info.get('CriticalComp.Temp.Threshold', 255)
-            warning = info.get('WarningComp.Temp.Threshold', 255)
-        # (S)ATA
-        elif 'CurrentTemperature' in info:
-            temp_event = True
-            event_key = 'CurrentTemperature'
-            current = info[event_key]
-            crit_str = info.get('Min/MaxTemperatureLimit', '0/255 Fake')
-            warn_str = info.get('Min/MaxRecommendedTemperature', '0/255 Fake')
-            temp_re = r'\d+/(\d+)'
-            match = re.search(temp_re, crit_str)
-            critical = match.groups()[0] if match else 255
-            match = re.search(temp_re, warn_str)
-            warning = match.groups()[0] if match else 255
-        else:
-            temp_event = False
-
-        ## Attributes
-        attrs = dict()
-
-        # Example:
-        # ID# ATTRIBUTE_NAME          FLAG     VALUE WORST THRESH TYPE      UPDATED  WHEN_FAILED RAW_VALUE  # noqa
-        #   1 Raw_Read_Error_Rate     0x000a   098   098   000    Old_age   Always       -       0  # noqa
-        #   5 Reallocated_Sector_Ct   0x0013   100   100   050    Pre-fail  Always       -       0  # noqa
-        #  12 Power_Cycle_Count       0x0012   100   100   000    Old_age   Always       -       6860  # noqa
-        # 194 Temperature_Celsius     0x0023   077   062   030    Pre-fail  Always       -       23 (Min/Max 10/38)  # noqa
-        attr_re = r'(\d+) (\S+)\s+0x\w{4}   (\d+)   \d+   (\d+)    (\S+)\s+\w+\s+\S+\s+(\d+)'  # noqa
-
-        matches = re.findall(attr_re, cmd.result.output)
-        for match in matches:
-            attr_id, name, value, threshold, attr_type, raw = match
-            name = name.replace('_', ' ')
-            if name.startswith('Unknown') and name.endswith('Attribute'):
-                name = attr_override.get(name, '{0} {1}'.format(name, attr_id))
-            value = int(value)
-            threshold = int(threshold)
-            attr_type = attr_type.replace('_', ' ').lower()
-            raw = int(raw)  # RegEx should only match the digits
-            if value > 100:
-                # Kingston SSDs scale some noramlized values to 120
-                if value <= 120:
-                    scale = 1.2
-                # WD drives scale some normalized values to 200
-                elif value <= 200:
-                    scale = 2.0
-                # 0-253 are possible values
-                # https://kb.vmware.com/s/article/2040405
-                # Observed on some Samsung SSDs
-                elif value <= 253:
-                    scale = 2.53
-                elif value > 253:
-                    scale = value/100.0
-                value = value/scale
-                threshold = value/scale
-            attrs[attr_id] = {
-                'name': name,
-                'value': value,
-                'threshold': threshold,
-                'type': attr_type,
-                'raw': raw,
-                }
-
-            # Health threshold events
-            if threshold > 0 and value <= threshold:
-                attr_severity = Event.Error
-                attr_status = 'below'
-            else:
-                attr_severity = Event.Clear
-                attr_status = 'above'
-            result.events.append({
-                'device': cmd.deviceConfig.device,
-                'component': component,
-                'severity': attr_severity,
-                'eventKey': name.replace(' ', ''),
-                'eventClass': '/HW/Store',
-                'summary': '{0} {1} health {2} threshold: {3}%'.format(
-                    name,
-                    attr_type,
-                    attr_status,
-                    value,
-                    ),
-                })
+# Example: Device Path: /dev/sda -d sat
+path_re = re.compile(
+    r'^{0}(.+)$'.format(re.escape(PATH_PREFIX)),
+    re.MULTILINE
+    )
 
-        ## Device Stats
-        stats = dict()
-        # Example:
-        # Page  Offset Size        Value Flags Description
-        # 0x03  0x020  4               0  ---  Number of Reallocated Logical Sectors  # noqa
-        # 0x05  0x008  1              30  ---  Current Temperature
-        # 0x07  0x008  1              30  ---  Percentage Used Endurance Indicator  # noqa
-        stat_re = r'0x\w{2}  0x\w{3}  \d\s+(\d+)  \S{3}  (\w.*)'
-        matches = re.findall(stat_re, cmd.result.output)
-        for match in matches:
-            value, name = match
-            stats[name] = int(value)
-
-        # Temperature threshold if not available in the info dict
-        if 'Current Temperature' in stats and not temp_event:
-            temp_event = True
-            current = stats['Current Temperature']
-            event_key = 'CurrentTemperature'
-            critical = stats.get(
-                'Specified Maximum Operating Temperature',
-                255
-                )
-            warning = 255
-
-        ## Phy Events
-        phy_events = 0
-        # Example:
-        # ID      Size     Value  Description
-        # 0x0008  2            0  Device-to-host non-data FIS retries
-        # 0x0009  2            3  Transition from drive PhyRdy to drive PhyNRdy
-        # 0x000a  2            4  Device-to-host register FISes sent due to a COMRESET  # noqa
-        sata_phy_re = r'0x\w{4}  \d\s+(\d+)  (\w.*)'
-        # Example:
-        #     Phy event descriptors:
-        #      Invalid word count: 0
-        #      Running disparity error count: 0
-        #      Loss of dword synchronization count: 2
-        #      Phy reset problem count: 2
-        sas_phy_re = r'     \w.*?: (\d+)'
-        matches = (re.findall(sata_phy_re, cmd.result.output)
-                   or re.findall(sas_phy_re, cmd.result.output))
-        for match in matches:
-            if len(match) == 2:
-                value, name = match
-                if name != 'Vendor specific':
-                    phy_events += int(value)
-            else:
-                phy_events += int(match)
+# smartd state file
+# Example: ata-smart-attribute.0.val = 200
+smartd_attr_re = re.compile(
+    r'^ata-smart-attribute\.(\d+)\.(id|val|raw) = (\d+)',
+    re.MULTILINE
+    )
 
-        ## Generate Threshold Events
+# smartd attribute log line, after the date and time
+# Example: 	1;200;0;	3;175;6233;
+attrlog_re = re.compile(r'\t(\d+);(\d+);(\d+);')
 
-        # NVMe available spare capacity
-        if 'AvailableSpare' in info:
-            nvme_current = info['AvailableSpare']
-            if nvme_current <= info.get('AvailableSpareThreshold', -1):
-                severity = Event.Error
-                status = 'below'
+# smartctl --nocheck exiting without waking the disk, also in JSON messages
+# Example: Device is in STANDBY mode, exit(2)
+standby_re = re.compile(r'Device is in (\w+) mode')
+
+## Text output tables
+ATTRS, STATS, SATA_PHY, SAS_PHY, SCT_HISTORY, SELFTEST = range(6)
+
+# Lines starting each table, which ends at the next blank line
+table_headers = (
+    ('ID# ATTRIBUTE_NAME', ATTRS),
+    ('Device Statistics (', STATS),
+    ('SATA Phy Event Counters', SATA_PHY),
+    ('Protocol Specific port log page for SAS', SAS_PHY),
+    ('Index    Estimated Time', SCT_HISTORY),
+    ('Num  Test_Description', SELFTEST),
+    )
+header_starts = frozenset(header[0] for header, _ in table_headers)
+
+# Tables each protocol's output may have, as modeled, see the modeler's
+# profile, and the first characters of their headers. Disks not yet
+# profiled are checked for all of them.
+protocol_tables = {
+    'ATA': (ATTRS, STATS, SATA_PHY, SCT_HISTORY, SELFTEST),
+    'SCSI': (SAS_PHY,),
+    'NVMe': (),
+    }
+protocol_headers = dict(
+    (protocol, (
+        tuple(row for row in table_headers if row[1] in tables),
+        frozenset(row[0][0] for row in table_headers if row[1] in tables),
+        ))
+    for protocol, tables in protocol_tables.items()
+    )
+
+# Example:
+# ID# ATTRIBUTE_NAME          FLAG     VALUE WORST THRESH TYPE      UPDATED  WHEN_FAILED RAW_VALUE  # noqa
+#   1 Raw_Read_Error_Rate     0x000a   098   098   000    Old_age   Always       -       0  # noqa
+#   5 Reallocated_Sector_Ct   0x0013   100   100   050    Pre-fail  Always       -       0  # noqa
+#  12 Power_Cycle_Count       0x0012   100   100   000    Old_age   Always       -       6860  # noqa
+# 194 Temperature_Celsius     0x0023   077   062   030    Pre-fail  Always       -       23 (Min/Max 10/38)  # noqa
+attr_re = re.compile(r'\s*(\d+) (\S+)\s+0x\w{4}   (\d+)   (\d+)   (\d+)    (\S+)\s+\w+\s+\S+\s+(\d+)')  # noqa
+
+# Example:
+# Page  Offset Size        Value Flags Description
+# 0x03  0x020  4               0  ---  Number of Reallocated Logical Sectors  # noqa
+# 0x05  0x008  1              30  ---  Current Temperature
+# 0x07  0x008  1              30  ---  Percentage Used Endurance Indicator  # noqa
+stat_re = re.compile(r'0x\w{2}  0x\w{3}  \d\s+(\d+)  \S{3}  (\w.*)')
+
+# Example:
+# ID      Size     Value  Description
+# 0x0008  2            0  Device-to-host non-data FIS retries
+# 0x0009  2            3  Transition from drive PhyRdy to drive PhyNRdy
+# 0x000a  2            4  Device-to-host register FISes sent due to a COMRESET  # noqa
+sata_phy_re = re.compile(r'0x\w{4}  \d\s+(\d+)  (\w.*)')
+
+# Example:
+#     Phy event descriptors:
+#      Invalid word count: 0
+#      Running disparity error count: 0
+#      Loss of dword synchronization count: 2
+#      Phy reset problem count: 2
+sas_phy_re = re.compile(r'     \w.*?: (\d+)')
+
+# Example:
+# Num  Test_Description    Status                  Remaining  LifeTime(hours)  LBA_of_first_error  # noqa
+# # 1  Extended offline    Completed: read failure       90%     21440         268435455  # noqa
+# # 2  Short offline       Completed without error       00%     21000         -  # noqa
+selftest_re = re.compile(r'#\s*\d+\s+(\S.*?)\s{2,}(\S.*?)\s+\d+%\s+(\d+)')
+
+# Each ATA error log entry, as far as the description of the error
+# Example:
+# Error 2 occurred at disk power-on lifetime: 21437 hours (893 days + 5 hours)  # noqa
+# ...
+#   40 51 00 ff ff ff 0f  Error: UNC at LBA = 0x0fffffff = 268435455  # noqa
+error_re = re.compile(
+    r'^Error (\d+) (?:\[\d+\] )?occurred at disk power-on lifetime: (\d+) hours.*?Error: ([^\n]*)',  # noqa
+    re.MULTILINE | re.DOTALL
+    )
+
+# Example: -41/85 Celsius
+temp_re = re.compile(r'\d+/(\d+)')
+
+# Example: "serial_number":"WD-WCC7K3KCRH5F"
+json_serial_re = re.compile(r'"serial_number":\s*"([^"]+)"')
+
+# JSON may only have the leading digits of some raw values,
+# like the text output's RegEx
+raw_re = re.compile(r'\d+')
+
+# NVMe SMART/Health Information log, JSON to text keys
+nvme_keys = {
+    'available_spare': 'AvailableSpare',
+    'available_spare_threshold': 'AvailableSpareThreshold',
+    'percentage_used': 'PercentageUsed',
+    'data_units_read': 'DataUnitsRead',
+    'data_units_written': 'DataUnitsWritten',
+    'host_reads': 'HostReadCommands',
+    'host_writes': 'HostWriteCommands',
+    'media_errors': 'MediaAndDataIntegrityErrors',
+    'num_err_log_entries': 'ErrorInformationLogEntries',
+    }
+
+# nvme-cli's SMART/Health Information log, JSON to smartctl's text keys
+nvme_cli_keys = {
+    'avail_spare': 'AvailableSpare',
+    'spare_thresh': 'AvailableSpareThreshold',
+    'percent_used': 'PercentageUsed',
+    'data_units_read': 'DataUnitsRead',
+    'data_units_written': 'DataUnitsWritten',
+    'host_read_commands': 'HostReadCommands',
+    'host_write_commands': 'HostWriteCommands',
+    'media_errors': 'MediaAndDataIntegrityErrors',
+    'num_err_log_entries': 'ErrorInformationLogEntries',
+    }
+
+# NVMe critical warning bits failing smartctl's health check: spare below
+# threshold, temperature, reliability, read-only and volatile backup
+NVME_CRITICAL_WARNINGS = 0x1f
+
+# SAS PHY event descriptors counted by the text output
+sas_phy_keys = [
+    'invalid_dwords',
+    'running_disparity_errors',
+    'loss_of_dword_sync',
+    'reset_problem',
+    ]
+
+# SCSI error counter log directions and the info keys of the blocks
+# processed in each
+scsi_processed_keys = (
+    ('read', 'BlocksReadProcessed'),
+    ('write', 'BlocksWrittenProcessed'),
+    )
+
+# zencommand runs a batched command once per device and hands the same
+# output to each component's parser, so only split it once
+batch_cache = {'output': None, 'disks': dict()}
+
+# Last severity and time sent per eventKey of each component, so only
+# changes are sent rather than every component's clears every cycle
+event_cache = ComponentCache()
+
+# Last error log count and newest self-test log entry of each component,
+# kept for a day so a longer smartctl cycle time doesn't forget them
+log_cache = ComponentCache(max_age=86400)
+
+# Latest output of each disk with attribute components, which their
+# parser reads rather than zencommand running the disk's command again
+# for each of them
+attribute_cache = ComponentCache(max_age=86400)
+
+
+def decompress(output):
+    """ Returns batched command output, decoded if compressed
+
+    Output cut short, such as by a timeout, is decoded as far as it goes.
+    """
+    output = output.lstrip()
+    if not output.startswith(COMPRESSED_HEADER):
+        return output
+    encoded = ''.join(output[len(COMPRESSED_HEADER):].split())
+    try:
+        data = base64.b64decode(encoded[:len(encoded) // 4 * 4])
+        data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data)
+    except (TypeError, ValueError, zlib.error):
+        return ''
+    return data.decode('utf-8', 'replace')
+
+
+def split_batch(output):
+    """ Returns batched command output split by component ID, or by
+    device path for disks without a serial number in their output,
+    such as those in standby
+    """
+    if (batch_cache['output'] is not output
+            and batch_cache['output'] != output):
+        disks = dict()
+        for chunk in delimiter_re.split(decompress(output)):
+            match = (serial_re.search(chunk)
+                     or json_serial_re.search(chunk))
+            if match:
+                disks[prepId(match.groups()[0])] = chunk
+                continue
+            match = path_re.search(chunk)
+            if match:
+                disks[match.groups()[0].strip()] = chunk
+        batch_cache['output'] = output
+        batch_cache['disks'] = disks
+    return batch_cache['disks']
+
+
+def parse_info(line, info):
+    """ Adds a colon-delimited value (Info, Health, SCT, etc) to info """
+    if line.startswith('No Errors Logged'):
+        info['AtaErrorCount'] = 0
+        return
+    if ' = ' in line:
+        line = line.replace(' = ', ': ')
+    if ': ' in line and 'capability' not in line:
+        key_raw, value_raw = line.replace(' is', '').split(':', 1)
+        key = ''
+        for term in key_raw.strip().replace('-', ' ').split(' '):
+            key += term.title()
+        value = value_raw.strip().replace('%', '')
+        if not value:
+            return
+        # Serial numbers may start with, or be entirely, digits
+        if 'SerialNumber' != key and ('bytes' in value or value[0].isdigit()):
+            try:
+                value = value.split(' ')[0].replace(',', '')
+                value = float(value) if '.' in value else int(value)
+            except ValueError:
+                if 'Min/Max' not in key_raw:
+                    return
+        elif 'SMART support' == key_raw:
+            value = (SMART_ENABLED if 'Enabled' in value
+                     else SMART_DISABLED)
+        elif key_raw.startswith('SMART overall-health'):
+            value = (HEALTH_PASSED if 'PASSED' in value
+                     else HEALTH_FAILED)
+        elif 'SMART Health Status' == key_raw:
+            value = (HEALTH_PASSED if 'OK' in value
+                     else HEALTH_FAILED)
+        info[key] = value
+
+
+def selftest_code(status):
+    """ Returns the self-test status code of smartctl's description """
+    for description, code in selftest_status:
+        if status.startswith(description):
+            return code
+    return 3
+
+
+def add_selftests(info, tests):
+    """ Adds the self-test log's (description, status code, status,
+    lifetime hours) entries, newest first, and the newest's status to info
+    """
+    if tests:
+        info['SelfTestLog'] = tests
+        info['LastSelfTestStatus'] = tests[0][1]
+
+
+def text_sections(output, protocol=''):
+    """ Returns info, attribute rows, device statistics and PHY event
+    total from smartctl's text output
+
+    Lines are handled in a single pass. Table headers switch to that
+    table's handler until the blank line ending the table, and all other
+    lines are treated as colon-delimited info. Only headers of the
+    protocol's tables are looked for, if it's known.
+    """
+    headers, starts = protocol_headers.get(
+        protocol,
+        (table_headers, header_starts)
+        )
+    info = dict()
+    attrs = list()
+    stats = dict()
+    sata_phy_events = 0
+    sas_phy_events = 0
+    tests = list()
+    section = None
+
+    for line in output.splitlines():
+        if section is None:
+            if line[:1] in starts:
+                for header, table in headers:
+                    if line.startswith(header):
+                        section = table
+                        break
+                else:
+                    parse_info(line, info)
             else:
-                severity = Event.Clear
-                status = 'above'
-            result.events.append({
-                'device': cmd.deviceConfig.device,
-                'component': component,
-                'severity': severity,
-                'eventKey': 'NvmeAvailableSpare',
-                'eventClass': '/HW/Store',
-                'summary': 'NVMe available spare {0} threshold: {1}%'.format(
+                parse_info(line, info)
+            continue
+        elif not line.strip():
+            section = None
+            continue
+
+        if ATTRS == section:
+            match = attr_re.match(line)
+            if match:
+                attrs.append(match.groups())
+        elif STATS == section:
+            match = stat_re.match(line)
+            if match:
+                value, name = match.groups()
+                stats[name] = int(value)
+        elif SATA_PHY == section:
+            match = sata_phy_re.match(line)
+            if match:
+                value, name = match.groups()
+                if name != 'Vendor specific':
+                    sata_phy_events += int(value)
+        elif SAS_PHY == section:
+            match = sas_phy_re.match(line)
+            if match:
+                sas_phy_events += int(match.groups()[0])
+        elif SELFTEST == section:
+            match = selftest_re.match(line)
+            if match:
+                description, status, hours = match.groups()
+                tests.append((
+                    description,
+                    selftest_code(status),
                     status,
-                    nvme_current
-                    ),
-                })
+                    int(hours),
+                    ))
 
-        # Temperature
-        if temp_event:
-            if current >= critical:
-                severity = Event.Error
-                status = 'above'
-            elif current >= warning:
-                severity = Event.Warning
-                status = 'above'
-            else:
+    # SATA counters take precedence
+    phy_events = sata_phy_events or sas_phy_events
+    add_selftests(info, tests)
+
+    return info, attrs, stats, phy_events
+
+
+def json_sections(data):
+    """ Returns info, attribute rows, device statistics and PHY event
+    total from smartctl's JSON output, keyed the same as the text output
+    """
+
+    ## Info, Health, SCT, etc
+    info = dict()
+    if 'serial_number' in data:
+        info['SerialNumber'] = data['serial_number']
+    if 'rotation_rate' in data:
+        info['RotationRate'] = data['rotation_rate'] or 'Solid State Device'
+    if 'name' in data.get('device_type', dict()):
+        info['DeviceType'] = data['device_type']['name']
+
+    if 'smart_support' in data:
+        info['SmartSupport'] = (
+            SMART_ENABLED if data['smart_support'].get('enabled')
+            else SMART_DISABLED
+            )
+    elif 'nvme_smart_health_information_log' in data:
+        info['SmartSupport'] = SMART_ENABLED
+    if 'passed' in data.get('smart_status', dict()):
+        info['SmartOverallHealthSelfAssessmentTestResult'] = (
+            HEALTH_PASSED if data['smart_status']['passed']
+            else HEALTH_FAILED
+            )
+
+    # SCSI
+    if 'SCSI' == data.get('device', dict()).get('protocol'):
+        temperature = data.get('temperature', dict())
+        if 'current' in temperature:
+            info['CurrentDriveTemperature'] = temperature['current']
+        if 'drive_trip' in temperature:
+            info['DriveTripTemperature'] = temperature['drive_trip']
+        if 'scsi_grown_defect_list' in data:
+            info['ElementsInGrownDefectList'] = data['scsi_grown_defect_list']
+        non_medium = data.get('scsi_nonmedium_error', dict())
+        if 'count' in non_medium:
+            info['NonMediumErrorCount'] = non_medium['count']
+        cycles = data.get('scsi_start_stop_cycle_counter', dict())
+        for key in cycles:
+            info[''.join(term.title() for term in key.split('_'))] = (
+                cycles[key]
+                )
+        # The vendor-specific cache counters of the text output aren't
+        # in the JSON output, the error counter log's totals are
+        block_size = data.get('logical_block_size') or 512
+        counters = data.get('scsi_error_counter_log', dict())
+        for direction, key in scsi_processed_keys:
+            processed = counters.get(direction, dict()).get(
+                'gigabytes_processed'
+                )
+            if processed is not None:
+                info[key] = int(float(processed) * 10 ** 9 / block_size)
+
+    # NVMe
+    nvme_log = data.get('nvme_smart_health_information_log', dict())
+    if 'temperature' in nvme_log:
+        info['Temperature'] = nvme_log['temperature']
+        thresholds = data.get('nvme_composite_temperature_threshold', dict())
+        if 'warning' in thresholds:
+            info['WarningComp.Temp.Threshold'] = thresholds['warning']
+        if 'critical' in thresholds:
+            info['CriticalComp.Temp.Threshold'] = thresholds['critical']
+    for key in nvme_keys:
+        if key in nvme_log:
+            info[nvme_keys[key]] = nvme_log[key]
+
+    # (S)ATA SCT Status
+    sct_temp = data.get('ata_sct_status', dict()).get('temperature', dict())
+    if 'current' in sct_temp:
+        info['CurrentTemperature'] = sct_temp['current']
+        if 'limit_max' in sct_temp:
+            info['Min/MaxTemperatureLimit'] = '{0}/{1}'.format(
+                sct_temp.get('limit_min', 0),
+                sct_temp['limit_max'],
+                )
+        if 'op_limit_max' in sct_temp:
+            info['Min/MaxRecommendedTemperature'] = '{0}/{1}'.format(
+                sct_temp.get('op_limit_min', 0),
+                sct_temp['op_limit_max'],
+                )
+
+    # (S)ATA error and self-test logs
+    errors = data.get('ata_smart_error_log', dict()).get('summary', dict())
+    if 'count' in errors:
+        info['AtaErrorCount'] = errors['count']
+    tests = data.get('ata_smart_self_test_log', dict()).get(
+        'standard',
+        dict()
+        ).get('table', list())
+    add_selftests(info, [
+        (test.get('type', dict()).get('string', ''),
+         test.get('status', dict()).get('value', 0) >> 4,
+         test.get('status', dict()).get('string', ''),
+         test.get('lifetime_hours', 0))
+        for test in tests
+        ])
+
+    ## Attributes
+    attrs = list()
+    table = data.get('ata_smart_attributes', dict()).get('table', list())
+    for attr in table:
+        match = raw_re.match(attr.get('raw', dict()).get('string', ''))
+        if match:
+            attrs.append((
+                str(attr['id']),
+                attr['name'],
+                attr['value'],
+                attr.get('worst'),
+                attr['thresh'],
+                ('Pre-fail' if attr.get('flags', dict()).get('prefailure')
+                 else 'Old_age'),
+                match.group(),
+                ))
+
+    ## Device Stats
+    stats = dict()
+    pages = data.get('ata_device_statistics', dict()).get('pages', list())
+    for page in pages:
+        for stat in page.get('table', list()):
+            if 'value' in stat:
+                stats[stat['name']] = stat['value']
+
+    ## Phy Events
+    phy_events = 0
+    table = data.get('sata_phy_event_counters', dict()).get('table', list())
+    for event in table:
+        if event.get('name') != 'Vendor specific':
+            phy_events += event.get('value', 0)
+    if not table:
+        for key in data:
+            if not key.startswith('scsi_sas_port_'):
+                continue
+            for phy in data[key].values():
+                if isinstance(phy, dict):
+                    for event in sas_phy_keys:
+                        phy_events += phy.get(event, 0)
+
+    return info, attrs, stats, phy_events
+
+
+def nvme_number(value):
+    """ Returns a number from nvme-cli's JSON, which has 128-bit counters
+    as numbers or strings depending on its version, or None
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def nvme_cli_sections(data):
+    """ Returns info, attribute rows, device statistics and PHY event
+    total from nvme-cli's SMART/Health Information log JSON, keyed the
+    same as smartctl's text output
+
+    The log doesn't have the composite temperature thresholds, which are
+    modeled instead.
+    """
+    info = dict()
+    info['SmartSupport'] = SMART_ENABLED
+    # The controller answered, as with smartctl's NVMe output
+    info['PowerMode'] = 'ACTIVE'
+
+    warning = data.get('critical_warning', 0)
+    # nvme-cli 2's verbose output breaks it down
+    if isinstance(warning, dict):
+        warning = warning.get('value', 0)
+    info['SmartOverallHealthSelfAssessmentTestResult'] = (
+        HEALTH_FAILED if (nvme_number(warning) or 0) & NVME_CRITICAL_WARNINGS
+        else HEALTH_PASSED
+        )
+    # Kelvin
+    kelvin = nvme_number(data.get('temperature'))
+    if kelvin:
+        info['Temperature'] = kelvin - 273
+    for key in nvme_cli_keys:
+        value = nvme_number(data.get(key))
+        if value is not None:
+            info[nvme_cli_keys[key]] = value
+
+    return info, list(), dict(), 0
+
+
+def changed_events(device, component, events, reassert=0, now=None):
+    """ Returns events whose severity differs from the last one sent
+
+    Events unchanged for more than reassert seconds are sent again,
+    if reassert is set.
+    """
+    now = now or time.time()
+    sent = event_cache.get(device, component, now)
+    changed = list()
+    for event in events:
+        last = sent.get(event['eventKey'])
+        if (last is None
+                or last[0] != event['severity']
+                or (reassert > 0 and now - last[1] >= reassert)):
+            sent[event['eventKey']] = (event['severity'], now)
+            changed.append(event)
+    return changed
+
+
+def batch_output(output, component, path=''):
+    """ Returns the component's output, from the batch if collected as one
+    """
+    # Batched output for all disks on the device
+    if output.lstrip().startswith((PATH_PREFIX, COMPRESSED_HEADER)):
+        disks = split_batch(output)
+        output = disks.get(component) or disks.get(path, '')
+    return output
+
+
+def component_output(cmd):
+    """ Returns the command output for the command's component """
+    path = ''
+    if cmd.points:
+        path = cmd.points[0].data.get('path', '')
+    return batch_output(cmd.result.output, cmd.component, path)
+
+
+def smartd_rows(output):
+    """ Returns attribute rows from a smartd state file or attribute log
+    line, in the form of text_sections' with names from attr_override
+
+    smartd doesn't keep worst values, thresholds or types.
+    """
+    slots = dict()
+    for index, key, value in smartd_attr_re.findall(output):
+        slots.setdefault(int(index), dict())[key] = value
+    rows = [(slot['id'], slot['val'], slot['raw'])
+            for _, slot in sorted(slots.items())
+            if len(slot) == 3]
+    if not rows:
+        rows = attrlog_re.findall(output)
+    return [(attr_id,
+             attr_override.get(attr_id, 'Unknown Attribute'),
+             value,
+             None,
+             None,
+             'Old_age',
+             raw)
+            for attr_id, value, raw in rows
+            if attr_id != '0']
+
+
+def sections(output, protocol=''):
+    """ Returns info, attribute rows, device statistics and PHY event
+    total from smartctl's JSON or text output, or nvme-cli's JSON
+    """
+    data = load_json(output)
+    if data:
+        if 'smartctl' not in data and 'avail_spare' in data:
+            return nvme_cli_sections(data)
+        return json_sections(data)
+    return text_sections(output, protocol)
+
+
+def power_state(output, info):
+    """ Returns the disk's power state, if it responded, and whether
+    smartctl exited without querying it
+    """
+    match = standby_re.search(output)
+    if match:
+        mode = match.groups()[0].upper()
+        standby = True
+    else:
+        # Example: Power mode is:    ACTIVE or IDLE
+        mode = str(info.get('PowerMode', '')).upper()
+        standby = False
+        if not mode and 'SerialNumber' not in info:
+            return None, False
+
+    if mode.startswith('SLEEP'):
+        state = POWER_SLEEP
+    elif mode.startswith('STANDBY'):
+        state = POWER_STANDBY
+    elif mode.startswith('IDLE'):
+        state = POWER_IDLE
+    else:
+        state = POWER_ACTIVE
+    return state, standby
+
+
+def is_hard_disk(info):
+    """ Returns whether info describes a rotating disk """
+    return (isinstance(info.get('RotationRate', ''), int)
+            or 'disk' == info.get('DeviceType', ''))
+
+
+def attr_name(attr_id, name):
+    """ Returns an attribute's name from smartctl, with spaces """
+    name = name.replace('_', ' ')
+    if name.startswith('Unknown') and name.endswith('Attribute'):
+        name = attr_override.get(name, '{0} {1}'.format(name, attr_id))
+    return name
+
+
+def attributes(attr_rows):
+    """ Returns attributes by ID with normalized values scaled to 100 """
+    attrs = dict()
+    for match in attr_rows:
+        attr_id, name, value, _, threshold, attr_type, raw = match
+        name = attr_name(attr_id, name)
+        value = int(value)
+        threshold = int(threshold or 0)
+        attr_type = attr_type.replace('_', ' ').lower()
+        raw = int(raw)  # RegEx should only match the digits
+        if value > 100:
+            # Kingston SSDs scale some noramlized values to 120
+            if value <= 120:
+                scale = 1.2
+            # WD drives scale some normalized values to 200
+            elif value <= 200:
+                scale = 2.0
+            # 0-253 are possible values
+            # https://kb.vmware.com/s/article/2040405
+            # Observed on some Samsung SSDs
+            elif value <= 253:
+                scale = 2.53
+            elif value > 253:
+                scale = value/100.0
+            value = value/scale
+            threshold = value/scale
+        attrs[attr_id] = Attribute(name, value, threshold, attr_type, raw)
+    return attrs
+
+
+def temperature(info, stats):
+    """ Returns the event key, current, critical and warning temperatures,
+    or None if unavailable
+    """
+    # SCSI
+    if 'CurrentDriveTemperature' in info:
+        event_key = 'CurrentDriveTemperature'
+        critical = info.get('DriveTripTemperature', 255)
+        warning = 255
+    # NVMe
+    elif 'Temperature' in info:
+        event_key = 'Temperature'
+        critical = info.get('CriticalComp.Temp.Threshold', 255)
+        warning = info.get('WarningComp.Temp.Threshold', 255)
+    # (S)ATA
+    elif 'CurrentTemperature' in info:
+        event_key = 'CurrentTemperature'
+        crit_str = info.get('Min/MaxTemperatureLimit', '0/255 Fake')
+        warn_str = info.get('Min/MaxRecommendedTemperature', '0/255 Fake')
+        match = temp_re.search(crit_str)
+        critical = int(match.groups()[0]) if match else 255
+        match = temp_re.search(warn_str)
+        warning = int(match.groups()[0]) if match else 255
+    # Not available in the info dict
+    elif 'Current Temperature' in stats:
+        return (
+            'CurrentTemperature',
+            stats['Current Temperature'],
+            stats.get('Specified Maximum Operating Temperature', 255),
+            255,
+            )
+    else:
+        return None
+    return event_key, info[event_key], critical, warning
+
+
+def status_events(device, component, info, attrs, temp):
+    """ Returns attribute, NVMe spare and temperature threshold events """
+    events = list()
+
+    # Health threshold events
+    for attr_id in sorted(attrs, key=int):
+        attr = attrs[attr_id]
+        if attr.threshold > 0 and attr.value <= attr.threshold:
+            attr_severity = Event.Error
+            attr_status = 'below'
+        else:
+            attr_severity = Event.Clear
+            attr_status = 'above'
+        events.append({
+            'device': device,
+            'component': component,
+            'severity': attr_severity,
+            'eventKey': attr.name.replace(' ', ''),
+            'eventClass': '/HW/Store',
+            'summary': '{0} {1} health {2} threshold: {3}%'.format(
+                attr.name,
+                attr.type,
+                attr_status,
+                attr.value,
+                ),
+            })
+
+    # NVMe available spare capacity
+    if 'AvailableSpare' in info:
+        nvme_current = info['AvailableSpare']
+        if nvme_current <= info.get('AvailableSpareThreshold', -1):
+            severity = Event.Error
+            status = 'below'
+        else:
+            severity = Event.Clear
+            status = 'above'
+        events.append({
+            'device': device,
+            'component': component,
+            'severity': severity,
+            'eventKey': 'NvmeAvailableSpare',
+            'eventClass': '/HW/Store',
+            'summary': 'NVMe available spare {0} threshold: {1}%'.format(
+                status,
+                nvme_current
+                ),
+            })
+
+    # Temperature
+    if temp:
+        event_key, current, critical, warning = temp
+        if current >= critical:
+            severity = Event.Error
+            status = 'above'
+        elif current >= warning:
+            severity = Event.Warning
+            status = 'above'
+        else:
+            severity = Event.Clear
+            status = 'below'
+        events.append({
+            'device': device,
+            'component': component,
+            'severity': severity,
+            'eventKey': event_key,
+            'eventClass': '/HW/Store',
+            'summary': 'Temperature {0} threshold: {1} degrees'.format(
+                status,
+                current
+                ),
+            })
+
+    return events
+
+
+def status_values(output, info, attrs, temp):
+    """ Returns SMART enabled, health check and temperature values """
+    values = dict()
+    values['smart_enabled'] = info.get(
+        'SmartSupport',
+        (SMART_ENABLED
+         if 'Device supports SMART and is Enabled' in output
+         or 'SMART/Health Information' in output
+         else SMART_UNKNOWN)
+        )
+    values['health_check'] = info.get(
+        'SmartOverallHealthSelfAssessmentTestResult',
+        info.get('SmartHealthStatus', HEALTH_UNKNOWN)
+        )
+
+    values.update(evaluate(
+        STATUS_PLAN,
+        Sources(info, attrs, dict(), is_hard_disk(info), temp),
+        ))
+    return values
+
+
+def log_values(info, attrs, stats, phy_events):
+    """ Returns values of slowly changing attributes, device statistics
+    and PHY events
+    """
+    values = evaluate(
+        LOG_PLAN,
+        Sources(info, attrs, stats, is_hard_disk(info), None),
+        )
+    values['phy_events'] = phy_events
+
+    lowest = 100
+    for attr_id, attr in attrs.items():
+        if ('Temperature' not in attr.name
+                and not (0 == attr.value and 0 == attr.threshold)
+                and attr_id not in LIFETIME_ATTRS
+                and attr_id not in SSD_HEALTH_ATTRS
+                and attr.value < lowest):
+            lowest = attr.value
+
+    values['overall_health'] = lowest
+
+    return values
+
+
+def error_entries(output):
+    """ Returns the number, lifetime hours and description of each
+    entry of the ATA error log
+    """
+    data = load_json(output)
+    if data:
+        table = data.get('ata_smart_error_log', dict()).get(
+            'summary',
+            dict()
+            ).get('table', list())
+        return [(entry.get('error_number', 0),
+                 entry.get('lifetime_hours', 0),
+                 entry.get('error_description', ''))
+                for entry in table]
+    return [(int(number), int(hours), description.strip())
+            for number, hours, description in error_re.findall(output)]
+
+
+def log_events(device, component, output, info):
+    """ Returns events for the error and self-test log entries added
+    since the disk was last collected
+
+    Only the logs' counters are checked each cycle, the error log count
+    and newest self-test, and the error log's entries are only parsed
+    once its count moves. The first collection after the collector
+    starts only notes them.
+    """
+    state = log_cache.get(device, component)
+    events = list()
+
+    # NVMe's count comes with its SMART/Health Information log
+    count = info.get('ErrorInformationLogEntries', info.get('AtaErrorCount'))
+    last = state.get('errors')
+    if count is not None:
+        state['errors'] = count
+    if count is not None and last is not None and count > last:
+        summary = '{0} new error log {1}, {2} in total'.format(
+            count - last,
+            'entry' if 1 == count - last else 'entries',
+            count,
+            )
+        if 'ErrorInformationLogEntries' not in info:
+            entries = [entry for entry in error_entries(output)
+                       if entry[0] > last]
+            if entries:
+                _, hours, description = max(entries)
+                summary = '{0}, most recent at {1} hours: {2}'.format(
+                    summary,
+                    hours,
+                    description,
+                    )
+        events.append({
+            'device': device,
+            'component': component,
+            'severity': Event.Warning,
+            'eventKey': 'SmartErrorLog',
+            'eventClass': '/HW/Store',
+            'summary': summary,
+            })
+
+    tests = info.get('SelfTestLog', list())
+    seen = state.get('selftest')
+    if tests:
+        state['selftest'] = tests[0]
+    if tests and seen is not None and tests[0] != seen:
+        added = [test for test in
+                 (tests[:tests.index(seen)] if seen in tests else tests)
+                 if test[1] != SELFTEST_IN_PROGRESS]
+        if added:
+            description, code, status, hours = added[0]
+            if SELFTEST_PASSED == code:
                 severity = Event.Clear
-                status = 'below'
-            result.events.append({
-                'device': cmd.deviceConfig.device,
+            elif code in (1, 2):
+                severity = Event.Info
+            else:
+                severity = Event.Error
+            events.append({
+                'device': device,
                 'component': component,
                 'severity': severity,
-                'eventKey': event_key,
+                'eventKey': 'SmartSelfTest',
                 'eventClass': '/HW/Store',
-                'summary': 'Temperature {0} threshold: {1} degrees'.format(
+                'summary': '{0} self-test: {1} at {2} hours'.format(
+                    description,
                     status,
-                    current
+                    hours,
                     ),
                 })
 
-        ## Assemble datapoint values
+    return events
 
-        values = dict()
-        values['smart_enabled'] = info.get(
-            'SmartSupport',
-            (SMART_ENABLED
-             if 'Device supports SMART and is Enabled' in cmd.result.output
-             or 'SMART/Health Information' in cmd.result.output
-             else SMART_UNKNOWN)
-            )
-        values['health_check'] = info.get(
-            'SmartOverallHealthSelfAssessmentTestResult',
-            info.get('SmartHealthStatus', HEALTH_UNKNOWN)
+
+def parse(output, device='', component='', hard_disk=False, protocol=''):
+    """ Returns slowly changing values from a disk's smartctl output,
+    or none if the disk is in standby, and events for new entries of its
+    error and self-test logs
+
+    Values from smartd's files are only those of attributes, so hard_disk
+    stands in for the rotation rate in smartctl's output. The modeled
+    protocol narrows the tables looked for in text output.
+    """
+    if standby_re.search(output):
+        return dict(), list()
+    if SMARTD_PREFIX in output:
+        values = log_values(
+            {'DeviceType': 'disk'} if hard_disk else dict(),
+            attributes(smartd_rows(output)),
+            dict(),
+            0,
             )
-        values['phy_events'] = phy_events
-
-        # Raw attribute values
-
-        # Why not Raw_Read_Error_Rate?
-        # From https://wiki.unraid.net/Understanding_SMART_Reports -
-        # "Only Seagates report the raw value, which yes, does appear to be the
-        # number of raw read errors, but should be ignored, completely. All
-        # other drives have raw read errors too, but do not report them,
-        # leaving this value as zero only."
-
-        # Reallocated Sectors
-        if '5' in attrs:
-            values['reallocated_sectors'] = attrs['5']['raw']
-        elif 'Number of Reallocated Logical Sectors' in stats:
-            value = stats['Number of Reallocated Logical Sectors']
-            values['reallocated_sectors'] = value
-        elif 'ElementsInGrownDefectList' in info:
-            value = info['ElementsInGrownDefectList']
-            values['reallocated_sectors'] = value
-
-        if 'reallocated_sectors' in values:
-            # "raw" is stored as a gauge, "sectors" as derive/counter
-            values['reallocated_raw'] = values['reallocated_sectors']
-
-        if '198' in attrs:
-            # "raw" is stored as a gauge, just "offline" as derive/counter
-            values['reallocated_offline'] = attrs['198']['raw']
-            values['reallocated_offline_raw'] = attrs['198']['raw']
-
-        # Pending Sectors
-        if '197' in attrs:
-            values['pending_sectors'] = attrs['197']['raw']
-        elif 'Number of Realloc. Candidate Logical Sectors' in stats:
-            value = stats['Number of Realloc. Candidate Logical Sectors']
-            values['pending_sectors'] = value
-
-        # Temperature
-        if '194' in attrs:
-            values['temperature_celsius'] = attrs['194']['raw']
-        elif '190' in attrs:
-            values['temperature_celsius'] = attrs['190']['raw']
-        elif hard_disk and '231' in attrs:
-            # Some hard drives may use 231 for Temperature
-            values['temperature_celsius'] = attrs['231']['raw']
-        elif 'Temperature' in attrs.get('189', {}).get('name', ''):
-            values['temperature_celsius'] = attrs['189']['raw']
-        elif temp_event:
-            values['temperature_celsius'] = current
-
-        # I/O Activity
-        # Blocks Read
-        if 'Logical Sectors Read' in stats:
-            values['blocks_read'] = stats['Logical Sectors Read']
-        elif 'DataUnitsRead' in info:
-            values['blocks_read'] = info['DataUnitsRead']
-        elif 'BlocksSentToInitiator' in info:
-            values['blocks_read'] = info['BlocksSentToInitiator']
-        # Blocks Written
-        if 'Logical Sectors Written' in stats:
-            values['blocks_written'] = stats['Logical Sectors Written']
-        elif 'DataUnitsWritten' in info:
-            values['blocks_written'] = info['DataUnitsWritten']
-        elif 'BlocksReceivedFromInitiator' in info:
-            values['blocks_written'] = info['BlocksReceivedFromInitiator']
-        # R/W Commands
-        if ('Number of Read Commands' in stats
-                and 'Number of Write Commands' in stats):
-            reads = stats['Number of Read Commands']
-            writes = stats['Number of Write Commands']
-            values['commands'] = reads + writes
-        elif 'HostReadCommands' in info and 'HostWriteCommands' in info:
-            reads = info['HostReadCommands']
-            writes = info['HostWriteCommands']
-            values['commands'] = reads + writes
-        elif ('NumberOfReadAndWriteCommandsWhoseSize<=SegmentSize' in info
-                and 'NumberOfReadAndWriteCommandsWhoseSize>SegmentSize' in info):  # noqa
-            small = info['NumberOfReadAndWriteCommandsWhoseSize<=SegmentSize']
-            large = info['NumberOfReadAndWriteCommandsWhoseSize>SegmentSize']
-            values['commands'] = small + large
-
-        # Errors
-        values['errors'] = 0
-        stats_keys = [
-            'Number of Reported Uncorrectable Errors',
-            'Number of Interface CRC Errors',
-            ]
-        for key in stats_keys:
-            values['errors'] += stats.get(key, 0)
-        info_keys = [
-            'MediaAndDataIntegrityErrors',
-            'NonMediumErrorCount',
-            ]
-        for key in info_keys:
-            values['errors'] += info.get(key, 0)
-
-        # Normalized values
-        health_attrs = {
-            '1': 'read_error_health',   # Raw Read Error Rate normalized
-            '5': 'reallocated_health',  # Reallocated Sector Ct normalized
+        # Not kept by smartd
+        del values['errors']
+        del values['phy_events']
+        return values, list()
+    info, attr_rows, stats, phy_events = sections(output, protocol)
+    values = log_values(info, attributes(attr_rows), stats, phy_events)
+    component = component or prepId(info.get('SerialNumber', ''))
+    return values, log_events(device, component, output, info)
+
+
+def add_values(cmd, result, values):
+    """ Adds values to the result for the command's datapoints """
+    for point in cmd.points:
+        if point.id in values:
+            result.values.append((point, values[point.id]))
+
+
+class smartctl(CommandParser):
+    """ Parses slowly changing attributes, device statistics and
+    PHY events from smartctl
+    """
+
+    def dataForParser(self, context, datapoint):
+        """ Returns the device path, its protocol, whether the disk
+        rotates and whether it has attribute components
+        """
+        return {
+            'attributes': bool(context.smartAttributes()),
+            'hard_disk': 'rpm' in str(getattr(context, 'RotationRate', '')),
+            'path': getattr(context, 'DevicePath', ''),
+            'protocol': getattr(context, 'Protocol', ''),
             }
 
-        for attr in health_attrs:
-            if attr in attrs:
-                values[health_attrs[attr]] = attrs[attr]['value']
-
-        lifetime_health_attrs = [
-            '9',    # Power On Hours
-            '193',  # Load Cycle Count
-            '225',  # Load/Unload Cycle Count
-            '12',   # Power Cycle Count
-            ]
-
-        for attr in lifetime_health_attrs:
-            if attr in attrs:
-                values['lifetime_health'] = attrs[attr]['value']
-                break
-
-        if 'lifetime_health' not in values:
-            # Load/Unload Cycle Count
-            if ('SpecifiedLoadUnloadCountOverDeviceLifetime' in info
-                    and 'AccumulatedLoadUnloadCycles' in info):
-                total = info['SpecifiedLoadUnloadCountOverDeviceLifetime']  # noqa
-                used = info['AccumulatedLoadUnloadCycles']
-                values['lifetime_health'] = used / float(total)
-            # Power Cycle Count
-            elif ('SpecifiedCycleCountOverDeviceLifetime' in info
-                    and 'AccumulatedStartStopCycles' in info):
-                total = info['SpecifiedCycleCountOverDeviceLifetime']
-                used = info['AccumulatedStartStopCycles']
-                values['lifetime_health'] = used / float(total)
-
-        # https://www.hdsentinel.com/ssd_case_health_decrease_wearout.php
-        ssd_health_attrs = [
-            '169',  # Remaining Life Percentage
-            '202',  # Percent Lifetime Remain / Data Address Mark Errors
-            '173',  # SSD Wear Leveling Count / Media Wearout Indicator
-            '177',  # Wear Leveling Count
-            '231',  # SSD Life Left
-            ]
-
-        for attr in ssd_health_attrs:
-            if attr in attrs and not (hard_disk and '231' == attr):
-                values['ssd_health'] = attrs[attr]['value']
-                break
-
-        if 'ssd_health' not in values:
-            if 'Percentage Used Endurance Indicator' in stats:
-                used = stats['Percentage Used Endurance Indicator']
-                values['ssd_health'] = 100 - used
-            elif 'PercentageUsed' in info:
-                values['ssd_health'] = 100 - info['PercentageUsed']
-
-        lowest = 100
-        for attr in attrs:
-            if ('Temperature' not in attrs[attr]['name']
-                    and not (0 == attrs[attr]['value']
-                             and 0 == attrs[attr]['threshold'])
-                    and attr not in lifetime_health_attrs
-                    and attr not in ssd_health_attrs
-                    and attrs[attr]['value'] < lowest):
-                lowest = attrs[attr]['value']
-
-        values['overall_health'] = lowest
-
-        for point in cmd.points:
-            if point.id in values:
-                result.values.append((point, values[point.id]))
+    def processResults(self, cmd, result):
+        """ Returns metrics, their trends, error and self-test log events
+        and the cost of collection from command output
+        """
+        started = time.time()
+        output = component_output(cmd)
+        if not output:
+            return
+
+        hard_disk = False
+        protocol = ''
+        if cmd.points:
+            hard_disk = cmd.points[0].data.get('hard_disk', False)
+            protocol = cmd.points[0].data.get('protocol', '')
+            if cmd.points[0].data.get('attributes', False):
+                attribute_cache.get(
+                    cmd.deviceConfig.device,
+                    cmd.component,
+                    )['output'] = output
+        values, events = parse(
+            output,
+            cmd.deviceConfig.device,
+            cmd.component,
+            hard_disk,
+            protocol,
+            )
+        if values:
+            values.update(log_trends(
+                cmd.deviceConfig.device,
+                cmd.component,
+                values,
+                ))
+        result.events.extend(events)
+        values.update(disk_costs(output, started, len(events)))
+        record(cmd.deviceConfig.device, 'smartctl', cmd.component, values)
+        add_values(cmd, result, values)
@@ -0,0 +1,143 @@
+#pylint: disable=line-too-long,no-init,invalid-name,too-few-public-methods
+""" Parses health, temperature and threshold events from smartctl """
+
+import time
+
+from Products.ZenRRD.CommandParser import CommandParser
+from Products.ZenUtils.Utils import prepId
+
+from ZenPacks.daviswr.SMART.lib.cache import ComponentCache
+from ZenPacks.daviswr.SMART.lib.cost import disk_costs
+from ZenPacks.daviswr.SMART.lib.rollup import record
+from ZenPacks.daviswr.SMART.lib.trend import temperature_trends
+from ZenPacks.daviswr.SMART.lib.util import HEALTH_UNKNOWN, SMART_UNKNOWN
+from ZenPacks.daviswr.SMART.parsers.smartctl import (
+    add_values,
+    attributes,
+    changed_events,
+    component_output,
+    power_state,
+    sections,
+    status_events,
+    status_values,
+    temperature,
+    )
+
+# Last known health and SMART enabled values per disk,
+# reported while it's in standby
+last_cache = ComponentCache()
+
+# Info keys of NVMe's warning and critical temperatures
+NVME_LIMIT_KEYS = ('WarningComp.Temp.Threshold', 'CriticalComp.Temp.Threshold')
+
+# Datapoints carried forward and their unknown values
+CARRIED = {
+    'health_check': HEALTH_UNKNOWN,
+    'smart_enabled': SMART_UNKNOWN,
+    }
+
+
+def parse(output, device, component='', reassert=0, protocol='',
+          temp_limits=None):
+    """ Returns health, temperature, SMART enabled, power state and
+    temperature excursion values from a disk's smartctl output, and the
+    threshold events which changed since they were last sent
+
+    A disk in standby only reports its power state, along with its last
+    known health and SMART enabled values, rather than unknown.
+
+    temp_limits are an NVMe disk's modeled warning and critical
+    temperatures, used if its output doesn't have them, as nvme-cli's
+    doesn't.
+    """
+    info, attr_rows, stats, _ = sections(output, protocol)
+    if temp_limits and 'Temperature' in info:
+        for key, limit in zip(NVME_LIMIT_KEYS, temp_limits):
+            if limit:
+                info.setdefault(key, limit)
+    component = component or prepId(info.get('SerialNumber', ''))
+    state, standby = power_state(output, info)
+    last = last_cache.get(device, component)
+
+    if standby:
+        values = dict(last)
+        values['power_state'] = state
+        return values, list()
+
+    attrs = attributes(attr_rows)
+    temp = temperature(info, stats)
+    values = status_values(output, info, attrs, temp)
+    for point, unknown in CARRIED.items():
+        if values.get(point, unknown) != unknown:
+            last[point] = values[point]
+    if state is not None:
+        values['power_state'] = state
+    if 'temperature_celsius' in values:
+        values.update(temperature_trends(
+            device,
+            component,
+            values['temperature_celsius'],
+            min(temp[2:]) if temp else None,
+            ))
+
+    events = changed_events(
+        device,
+        component,
+        status_events(device, component, info, attrs, temp),
+        reassert,
+        )
+    return values, events
+
+
+def temp_limits(disk):
+    """ Returns a disk's modeled NVMe warning and critical temperatures,
+    0 if unknown
+    """
+    return [int(getattr(disk, 'WarningTemperature', 0) or 0),
+            int(getattr(disk, 'CriticalTemperature', 0) or 0)]
+
+
+class status(CommandParser):
+    """ Parses health, temperature and threshold events from smartctl """
+
+    def dataForParser(self, context, datapoint):
+        """ Returns zProperties, the device path, protocol and NVMe
+        temperature limits needed by the parser
+        """
+        return {
+            'path': getattr(context, 'DevicePath', ''),
+            'protocol': getattr(context, 'Protocol', ''),
+            'reassert': int(
+                getattr(context, 'zSmartEventReassertInterval', 0) or 0
+                ),
+            'temp_limits': temp_limits(context),
+            }
+
+    def processResults(self, cmd, result):
+        """ Returns metrics, events and the cost of collection from command
+        output
+        """
+        started = time.time()
+        output = component_output(cmd)
+        if not output:
+            return
+
+        reassert = 0
+        protocol = ''
+        limits = None
+        if cmd.points:
+            reassert = cmd.points[0].data.get('reassert', 0)
+            protocol = cmd.points[0].data.get('protocol', '')
+            limits = cmd.points[0].data.get('temp_limits')
+        values, events = parse(
+            output,
+            cmd.deviceConfig.device,
+            cmd.component,
+            reassert,
+            protocol,
+            limits,
+            )
+        result.events.extend(events)
+        values.update(disk_costs(output, started, len(events)))
+        record(cmd.deviceConfig.device, 'status', cmd.component, values)
+        add_values(cmd, result, values)
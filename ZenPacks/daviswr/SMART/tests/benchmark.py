@@ -0,0 +1,143 @@
+#pylint: disable=invalid-name,wrong-import-position
+""" Measures the cost of the parser and modeler on the fixture corpus
+
+Usage: python ZenPacks/daviswr/SMART/tests/benchmark.py [options]
+
+Reports the best mean time per run, the peak memory traced while running
+once, and the number and size of memory blocks allocated during that run
+which were still live at its end. Besides each fixture, synthetic outputs of
+--disks disks are measured: one batched collection cycle, parsing every
+disk's component from the same output, and one modeling run.
+
+Memory figures need tracemalloc, so are only available on Python 3.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import timeit
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(
+    os.path.join(TESTS_DIR, '..', '..', '..', '..')
+    ))
+
+import stubs  # noqa
+stubs.install()
+
+from ZenPacks.daviswr.SMART.tests import harness  # noqa
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def measure(func, iterations):
+    """ Returns time per run in ms, and memory figures for one run """
+    harness.reset()
+    func()
+    timer = timeit.Timer(func)
+    elapsed = min(timer.repeat(repeat=3, number=iterations)) / iterations
+    result = {
+        'ms': round(elapsed * 1000.0, 4),
+        'peak_kib': None,
+        'blocks': None,
+        'kib': None,
+        }
+
+    if tracemalloc:
+        harness.reset()
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        func()
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        stats = [stat for stat in after.compare_to(before, 'lineno')
+                 if stat.count_diff > 0]
+        result['peak_kib'] = round(peak / 1024.0, 1)
+        result['blocks'] = sum(stat.count_diff for stat in stats)
+        result['kib'] = round(
+            sum(stat.size_diff for stat in stats) / 1024.0,
+            1
+            )
+    return result
+
+
+def cases(disks):
+    """ Yields (name, callable) for each benchmark case """
+    batch, components = harness.synthetic_batch(disks)
+    for datasource in sorted(harness.PARSERS):
+        for name in harness.fixture_names('smartctl'):
+            output = harness.fixture('smartctl', name)
+            yield ('{0} {1}'.format(datasource, name),
+                   lambda output=output, datasource=datasource:
+                   harness.parse(output, datasource=datasource))
+
+        def batch_cycle(datasource=datasource):
+            """ One collection cycle of a batched device """
+            harness.smartctl.batch_cache['output'] = None
+            for component in components:
+                harness.parse(batch, component, datasource=datasource)
+        yield '{0} batch of {1} disks'.format(datasource, disks), batch_cycle
+
+    for name in harness.fixture_names('modeler'):
+        output = harness.fixture('modeler', name)
+        yield ('modeler {0}'.format(name),
+               lambda output=output: harness.model(output))
+
+    output = harness.synthetic_model(disks)
+    yield ('modeler {0} disks'.format(disks),
+           lambda: harness.model(output))
+
+
+def main():
+    """ Runs the benchmark """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '-n', '--iterations',
+        type=int,
+        default=200,
+        help='runs per timing repeat, divided by the disk count for '
+             'synthetic cases (default: %(default)s)',
+        )
+    parser.add_argument(
+        '-d', '--disks',
+        type=int,
+        default=100,
+        help='disks in synthetic cases (default: %(default)s)',
+        )
+    parser.add_argument(
+        '-j', '--json',
+        action='store_true',
+        help='output results as JSON',
+        )
+    args = parser.parse_args()
+
+    results = dict()
+    for name, func in cases(args.disks):
+        iterations = args.iterations
+        if 'disks' in name:
+            iterations = max(1, iterations // args.disks)
+        results[name] = measure(func, iterations)
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+
+    line = '{0:<40} {1:>10} {2:>10} {3:>10} {4:>10}'
+    print(line.format('case', 'ms', 'peak KiB', 'blocks', 'KiB'))
+    for name in sorted(results):
+        result = results[name]
+        print(line.format(*[name] + [
+            '-' if result[key] is None else result[key]
+            for key in ('ms', 'peak_kib', 'blocks', 'kib')
+            ]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+#pylint: disable=invalid-name,too-few-public-methods
+""" Runs the parser and modeler against fixture output
+
+Shared by the tests, benchmark and replay. Without Zenoss, stubs.install()
+must be called before importing this module.
+
+Golden files hold the expected results for each fixture. To update them
+after an intended change in output, run the tests with SMART_UPDATE_GOLDEN
+set in the environment and review the differences.
+"""
+
+import importlib
+import json
+import logging
+import os
+import re
+
+import yaml
+
+from ZenPacks.daviswr.SMART.lib import cost, rollup, trend
+from ZenPacks.daviswr.SMART.lib.command import DELIMITER, PATH_PREFIX
+from ZenPacks.daviswr.SMART.modeler.plugins.daviswr.cmd.SMART import SMART
+from ZenPacks.daviswr.SMART.parsers import attribute, smartctl, status
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(TESTS_DIR, 'fixtures')
+GOLDEN_DIR = os.path.join(TESTS_DIR, 'golden')
+YAML_PATH = os.path.join(os.path.dirname(TESTS_DIR), 'zenpack.yaml')
+
+# Fixtures with a serial number, used to build synthetic batches
+BATCH_FIXTURES = (
+    'sata_hdd_wd_red.txt',
+    'sata_hdd_wd_red.json',
+    'sata_ssd_samsung.txt',
+    'sata_ssd_kingston.txt',
+    'sas_hdd_seagate.txt',
+    'nvme_samsung.txt',
+    )
+MODEL_FIXTURES = (
+    'linux_wd_red.txt',
+    'linux_wd_red_json.txt',
+    )
+
+serial_re = re.compile(
+    r'^Serial [Nn]umber:\s+(\S+)|"serial_number":\s*"([^"]+)"',
+    re.MULTILINE
+    )
+
+# Vendor-specific ID of an (S)ATA disk's WWN
+wwn_re = re.compile(
+    r'^(LU WWN Device Id:\s+\w+ \w+ )(\w+)|("wwn":\{[^}]*"id":)(\d+)',
+    re.MULTILINE
+    )
+
+# Values which vary() replaces in fixture output, and patterns of the lines
+# holding them, each group of which is followed by the value. JSON output
+# holds the raw value of an attribute as both a number and a string.
+VARIANTS = (
+    ('temperature', re.compile(
+        r'^((?:190 Airflow_Temperature_Cel|194 Temperature_Celsius)'
+        r'\s.*\s-\s+)\d+',
+        re.MULTILINE
+        )),
+    ('temperature', re.compile(
+        r'^((?:Current |Current Drive )?Temperature:\s+)\d+',
+        re.MULTILINE
+        )),
+    ('temperature', re.compile(r'("temperature":\{"current":)\d+')),
+    ('temperature', re.compile(
+        r'("name":"(?:Airflow_Temperature_Cel|Temperature_Celsius)"'
+        r'.*?"raw":\{"value":)\d+(,"string":")\d+'
+        )),
+    ('reallocated', re.compile(
+        r'^(\s*5 Reallocated_Sector_Ct\s.*\s-\s+)\d+',
+        re.MULTILINE
+        )),
+    ('reallocated', re.compile(
+        r'^(Elements in grown defect list:\s+)\d+',
+        re.MULTILINE
+        )),
+    ('reallocated', re.compile(
+        r'("name":"Reallocated_Sector_Ct".*?"raw":\{"value":)\d+'
+        r'(,"string":")\d+'
+        )),
+    )
+
+log = logging.getLogger('zen.SMART.tests')
+
+
+class Obj(object):
+    """ Plain object with attributes from keyword arguments """
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def fixture_names(kind):
+    """ Returns the names of fixtures of a kind, smartctl or modeler """
+    return sorted(os.listdir(os.path.join(FIXTURES_DIR, kind)))
+
+
+def fixture(kind, name):
+    """ Returns a fixture's content """
+    with open(os.path.join(FIXTURES_DIR, kind, name)) as fixture_file:
+        return fixture_file.read()
+
+
+def datapoints(template='SMART', datasource='smartctl'):
+    """ Returns the datapoint IDs of a datasource in zenpack.yaml """
+    with open(YAML_PATH) as yaml_file:
+        cfg = yaml.safe_load(yaml_file)
+    for device_class in cfg.get('device_classes', dict()).values():
+        templates = device_class.get('templates', dict())
+        if template in templates:
+            source = templates[template]['datasources'][datasource]
+            return sorted(source.get('datapoints', dict()))
+    return list()
+
+
+def property_defaults(class_name='SmartStorage'):
+    """ Returns the default of each of a class's properties in
+    zenpack.yaml, None for those without one
+    """
+    with open(YAML_PATH) as yaml_file:
+        cfg = yaml.safe_load(yaml_file)
+    properties = cfg['classes'][class_name]['properties']
+    return dict(
+        (name, (spec or dict()).get('default'))
+        for name, spec in properties.items()
+        if name != 'DEFAULTS'
+        )
+
+
+def stored(om, class_name='SmartStorage'):
+    """ Returns a component as stored from an ObjectMap, with the
+    zenpack.yaml default of each property the map doesn't set
+    """
+    component = Obj(**property_defaults(class_name))
+    component.__dict__.update(dict(om.items()))
+    return component
+
+
+# Parser of each datasource
+PARSERS = {
+    'smartctl': smartctl.smartctl,
+    'status': status.status,
+    }
+
+DATAPOINTS = dict(
+    (datasource, datapoints(datasource=datasource))
+    for datasource in PARSERS
+    )
+
+
+def reset():
+    """ Clears the parser's module-level caches """
+    smartctl.batch_cache['output'] = None
+    smartctl.batch_cache['disks'] = dict()
+    smartctl.event_cache.entries.clear()
+    smartctl.log_cache.entries.clear()
+    smartctl.attribute_cache.entries.clear()
+    attribute.values_cache['output'] = None
+    rollup.rollup_cache.entries.clear()
+    trend.trend_cache.entries.clear()
+    status.last_cache.entries.clear()
+    importlib.import_module(SMART.__module__).last_resync.clear()
+
+
+def make_cmd(output, component='', device='localhost', data=None,
+             datasource='smartctl'):
+    """ Returns a zencommand Cmd-like object for a datasource's parser """
+    points = [Obj(id=point, data=data or dict())
+              for point in DATAPOINTS[datasource]]
+    return Obj(
+        result=Obj(output=output, exitCode=0, stderr=''),
+        component=component,
+        deviceConfig=Obj(device=device),
+        points=points,
+        )
+
+
+def parse(output, component='', device='localhost', data=None,
+          datasource='smartctl', costs=False):
+    """ Returns values by datapoint ID and events from a datasource's
+    parser
+
+    The cost of collection, which varies between runs, is left out
+    unless costs is set.
+    """
+    cmd = make_cmd(output, component, device, data, datasource)
+    result = Obj(values=list(), events=list())
+    PARSERS[datasource]().processResults(cmd, result)
+    return dict((point.id, value) for point, value in result.values
+                if costs or point.id not in cost.COST_DATAPOINTS), \
+        result.events
+
+
+def model(output, **properties):
+    """ Returns the modeler's RelationshipMap, or changed ObjectMaps """
+    device = Obj(
+        id='localhost',
+        zSmartConcurrency=1,
+        zSmartDiskMapMatch='',
+        zSmartIgnoreModels='',
+        zSmartIgnoreUnsupported=True,
+        zSmartLowPriority=False,
+        )
+    device.__dict__.update(properties)
+    plugin = SMART()
+    plugin.condition(device, log)
+    return plugin.process(device, output, log)
+
+
+def parser_summary(values, events):
+    """ Returns parser results in the form stored in golden files """
+    return {
+        'values': dict(
+            (key, round(value, 6) if isinstance(value, float) else value)
+            for key, value in values.items()
+            ),
+        'events': [
+            [event['component'],
+             event['eventKey'],
+             event['severity'],
+             event['summary']]
+            for event in events
+            ],
+        }
+
+
+def modeler_summary(relmap):
+    """ Returns modeler results in the form stored in golden files """
+    summary = list()
+    for om in relmap:
+        props = dict(om.items())
+        if 'setProductKey' in props:
+            props['setProductKey'] = list(props['setProductKey'].args)
+        summary.append(props)
+    return summary
+
+
+def golden(kind, name, actual):
+    """ Returns the expected results for a fixture,
+    writing actual results first if SMART_UPDATE_GOLDEN is set
+    """
+    path = os.path.join(GOLDEN_DIR, kind, '{0}.json'.format(name))
+    if os.environ.get('SMART_UPDATE_GOLDEN'):
+        with open(path, 'w') as golden_file:
+            json.dump(actual, golden_file, indent=2, sort_keys=True)
+            golden_file.write('\n')
+    with open(path) as golden_file:
+        return json.load(golden_file)
+
+
+def vary(output, **values):
+    """ Returns fixture output with the VARIANTS given replaced,
+    such as vary(output, temperature=40, reallocated=8)
+    """
+    for name, pattern in VARIANTS:
+        if name in values:
+            value = str(values[name])
+            output = pattern.sub(
+                lambda match, value=value:
+                value.join(match.groups()) + value,
+                output
+                )
+    return output
+
+
+def synthetic_batch(count=100, variant=None):
+    """ Returns batched command output of count disks made from the
+    fixtures, each with a unique serial number, and their component IDs
+
+    If given, variant is called with each disk's index and returns the
+    values to vary() in its output.
+    """
+    outputs = [fixture('smartctl', name) for name in BATCH_FIXTURES]
+    chunks = list()
+    components = list()
+    for index in range(count):
+        output = outputs[index % len(outputs)]
+        serial = [group for group in serial_re.search(output).groups()
+                  if group][0]
+        new_serial = '{0}-{1:03d}'.format(serial, index)
+        if variant:
+            output = vary(output, **variant(index))
+        chunks.append('{0}/dev/sd{1} -d auto\n{2}\n{3}'.format(
+            PATH_PREFIX,
+            index,
+            output.replace(serial, new_serial),
+            DELIMITER,
+            ))
+        components.append(smartctl.prepId(new_serial))
+    return '\n'.join(chunks), components
+
+
+def synthetic_model(count=100):
+    """ Returns modeler output of count disks made from the fixtures,
+    each with a unique serial number
+    """
+    chunks = list()
+    for index in range(count):
+        output = fixture(
+            'modeler',
+            MODEL_FIXTURES[index % len(MODEL_FIXTURES)]
+            )
+        serial = [group for group in serial_re.search(output).groups()
+                  if group][0]
+        chunks.append(unique_wwn(output, index).replace(
+            serial,
+            '{0}-{1:03d}'.format(serial, index)
+            ))
+    return ''.join(chunks)
+
+
+def unique_wwn(output, index):
+    """ Returns output with its WWN's vendor-specific ID offset by index,
+    so the modeler doesn't deduplicate disks made from the same fixture
+    """
+    def offset(match):
+        """ Returns the WWN's text or JSON with its ID offset """
+        if match.group(1):
+            return '{0}{1:09x}'.format(
+                match.group(1),
+                int(match.group(2), 16) + index
+                )
+        return '{0}{1}'.format(match.group(3), int(match.group(4)) + index)
+    return wwn_re.sub(offset, output)
@@ -0,0 +1,291 @@
+#pylint: disable=invalid-name,wrong-import-position
+""" Replays synthetic fleets through the modeler and parsers
+
+Usage: python ZenPacks/daviswr/SMART/tests/replay.py [options]
+
+Sizes a collector by modeling --hosts devices of --disks disks each once,
+then collecting them for --cycles cycles of the status and smartctl tiers,
+as zencommand would. A local target stands in for SSH, answering with the
+fixtures' output, whose serial numbers are unique to each disk and whose
+temperature and reallocated sectors change every cycle. --hot percent of
+disks run over their temperature limits on every other cycle, so send
+threshold events, and --failing percent reallocate a sector each cycle.
+
+Reports the disks handled per second of wall time and the CPU time per
+disk of each phase, leaving out building the synthetic output, as well as
+the events sent and the collector's maximum resident set size after each.
+The resident set size includes one device's synthetic output, and the
+fixtures. --trace also reports the peak memory traced while running each
+phase, which needs tracemalloc, so Python 3, and slows it down.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import timeit
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(
+    os.path.join(TESTS_DIR, '..', '..', '..', '..')
+    ))
+
+import stubs  # noqa
+stubs.install()
+
+from ZenPacks.daviswr.SMART.lib.command import DELIMITER  # noqa
+from ZenPacks.daviswr.SMART.tests import harness  # noqa
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Temperature of disks running hot, over the limits of every fixture
+HOT_TEMPERATURE = 90
+# Tiers collected each cycle, in order
+TIERS = ('status', 'smartctl')
+
+
+def cpu_time():
+    """ Returns the CPU seconds used by the process """
+    if hasattr(time, 'process_time'):
+        return time.process_time()
+    # Python 2
+    return sum(os.times()[:2])
+
+
+def max_rss():
+    """ Returns the maximum resident set size of the process in MiB,
+    or None if unavailable
+    """
+    if not resource:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    scale = 1024.0 * 1024.0 if 'darwin' == sys.platform else 1024.0
+    return round(rss / scale, 1)
+
+
+class ReplayTarget(object):
+    """ Stands in for SSH to a device, answering commands with synthetic
+    fixture output
+    """
+
+    def __init__(self, host, disks, hot=0, failing=0):
+        self.host = host
+        self.disks = disks
+        self.hot = hot
+        self.failing = failing
+        self.cycle = 0
+
+    def variant(self, index):
+        """ Returns the values of a disk's output for the current cycle """
+        values = {'temperature': 30 + (index + self.cycle) % 10}
+        if index % 100 < self.hot and self.cycle % 2:
+            values['temperature'] = HOT_TEMPERATURE
+        if index % 100 < self.failing:
+            values['reallocated'] = self.cycle
+        return values
+
+    def model(self):
+        """ Returns the output of the modeler's command """
+        return harness.synthetic_model(self.disks)
+
+    def collect(self, single=False):
+        """ Returns the output of a tier's commands for the current cycle
+        and the component ID of each disk, the same batch for every disk,
+        or each disk's own if single
+        """
+        batch, components = harness.synthetic_batch(self.disks, self.variant)
+        if not single:
+            return [(batch, component) for component in components]
+        # Without the line of each disk's path
+        return list(zip(
+            [chunk.strip().split('\n', 1)[-1]
+             for chunk in batch.split(DELIMITER)],
+            components,
+            ))
+
+
+class Phase(object):
+    """ Totals of a phase of the replay """
+
+    def __init__(self, name):
+        self.name = name
+        self.disks = 0
+        self.seconds = 0.0
+        self.cpu = 0.0
+        self.events = 0
+        self.peak_mib = None
+
+    def run(self, disks, func):
+        """ Runs func, which returns the events it sent, for disks """
+        started = timeit.default_timer()
+        cpu_started = cpu_time()
+        events = func()
+        self.cpu += cpu_time() - cpu_started
+        self.seconds += timeit.default_timer() - started
+        self.disks += disks
+        self.events += len(events)
+
+    def summary(self):
+        """ Returns the phase's figures """
+        return {
+            'disks': self.disks,
+            'disks_per_sec': (round(self.disks / self.seconds, 1)
+                              if self.seconds else None),
+            'cpu_ms_per_disk': (round(self.cpu * 1000.0 / self.disks, 4)
+                                if self.disks else None),
+            'events': self.events,
+            'max_rss_mib': max_rss(),
+            'peak_mib': self.peak_mib,
+            }
+
+
+def traced(phase, func, trace=False):
+    """ Runs func, recording the peak memory traced if trace is set """
+    if not (trace and tracemalloc):
+        func()
+        return
+    gc.collect()
+    tracemalloc.start()
+    func()
+    phase.peak_mib = round(
+        tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0),
+        1
+        )
+    tracemalloc.stop()
+
+
+def collect(host, work, datasource):
+    """ Returns the events of parsing each disk's output for a tier """
+    events = list()
+    for output, component in work:
+        events.extend(harness.parse(
+            output,
+            component,
+            host,
+            datasource=datasource,
+            costs=True,
+            )[1])
+    return events
+
+
+def replay(args):
+    """ Returns the figures of each phase of a replay """
+    harness.reset()
+    targets = [
+        ReplayTarget('host{0:04d}'.format(index), args.disks, args.hot,
+                     args.failing)
+        for index in range(args.hosts)
+        ]
+    phases = [Phase('model')]
+    phases.extend(Phase('{0} cycle {1}'.format(tier, cycle + 1))
+                  for cycle in range(args.cycles) for tier in TIERS)
+
+    def model_all():
+        """ Models every device """
+        for target in targets:
+            output = target.model()
+
+            def model_one(output=output, target=target):
+                """ Models a device, which sends no events """
+                harness.model(output, id=target.host)
+                return list()
+            phases[0].run(args.disks, model_one)
+    traced(phases[0], model_all, args.trace)
+
+    for cycle in range(args.cycles):
+        for offset, tier in enumerate(TIERS):
+            phase = phases[1 + cycle * len(TIERS) + offset]
+
+            def collect_all(phase=phase, tier=tier, cycle=cycle):
+                """ Collects a tier of every device """
+                for target in targets:
+                    target.cycle = cycle
+                    work = target.collect(args.single)
+                    phase.run(args.disks, lambda target=target, work=work:
+                              collect(target.host, work, tier))
+            traced(phase, collect_all, args.trace)
+    return phases
+
+
+def main():
+    """ Runs the replay """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '-H', '--hosts',
+        type=int,
+        default=500,
+        help='devices in the fleet (default: %(default)s)',
+        )
+    parser.add_argument(
+        '-d', '--disks',
+        type=int,
+        default=60,
+        help='disks per device (default: %(default)s)',
+        )
+    parser.add_argument(
+        '-c', '--cycles',
+        type=int,
+        default=3,
+        help='collection cycles of each tier (default: %(default)s)',
+        )
+    parser.add_argument(
+        '--hot',
+        type=int,
+        default=5,
+        help='percent of disks over their temperature limits every '
+             'other cycle (default: %(default)s)',
+        )
+    parser.add_argument(
+        '--failing',
+        type=int,
+        default=5,
+        help='percent of disks reallocating sectors (default: %(default)s)',
+        )
+    parser.add_argument(
+        '-s', '--single',
+        action='store_true',
+        help='collect each disk with its own command rather than batched',
+        )
+    parser.add_argument(
+        '-t', '--trace',
+        action='store_true',
+        help='trace the peak memory of each phase',
+        )
+    parser.add_argument(
+        '-j', '--json',
+        action='store_true',
+        help='output results as JSON',
+        )
+    args = parser.parse_args()
+
+    phases = replay(args)
+    results = [dict(phase.summary(), phase=phase.name) for phase in phases]
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+
+    line = '{0:<20} {1:>8} {2:>10} {3:>12} {4:>8} {5:>12} {6:>10}'
+    print(line.format('phase', 'disks', 'disks/s', 'CPU ms/disk', 'events',
+                      'max RSS MiB', 'peak MiB'))
+    for result in results:
+        print(line.format(*[
+            '-' if result[key] is None else result[key]
+            for key in ('phase', 'disks', 'disks_per_sec', 'cpu_ms_per_disk',
+                        'events', 'max_rss_mib', 'peak_mib')
+            ]))
+
+
+if __name__ == '__main__':
+    main()
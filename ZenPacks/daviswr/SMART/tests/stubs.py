@@ -0,0 +1,269 @@
+#pylint: disable=invalid-name,too-few-public-methods,redefined-builtin
+""" Minimal stand-ins for the Zenoss modules used by the parser and modeler
+
+These let the tests and benchmark run on a system without Zenoss.
+install() only adds a stub where the real module can't be imported, so on
+a Zenoss system the real modules are always used.
+
+This module must not import anything from ZenPacks.daviswr.SMART, as the
+package itself needs ZenPackLib, and is loaded by path for that reason.
+"""
+
+import collections
+import re
+import sys
+import types
+
+
+class Event(object):
+    """ Products.ZenEvents.Event severities """
+    Clear = 0
+    Debug = 1
+    Info = 2
+    Warning = 3
+    Error = 4
+    Critical = 5
+
+
+class CommandParser(object):
+    """ Products.ZenRRD.CommandParser.CommandParser """
+
+    createDefaultEventUsingExitCode = True
+
+    def dataForParser(self, context, datapoint):
+        """ Returns data for the parser from the datapoint's context """
+        return dict()
+
+    def processResults(self, cmd, result):
+        """ Adds values and events from command output to result """
+        raise NotImplementedError
+
+
+def prepId(id, subchar='_'):
+    """ Products.ZenUtils.Utils.prepId """
+    _prepId = re.compile(r'[^a-zA-Z0-9-_,.$\(\) ]').sub
+    _cleanend = re.compile(r'%s+$' % subchar).sub
+    id = _prepId(subchar, str(id))
+    while id.startswith(subchar):
+        id = id[1:]
+    return str(_cleanend('', id))
+
+
+def monkeypatch(target):
+    """ Products.ZenUtils.Utils.monkeypatch, leaving the function as is """
+    return lambda func: func
+
+
+class ObjectMap(object):
+    """ Products.DataCollector.plugins.DataMaps.ObjectMap """
+
+    def __init__(self, data=None, compname='', modname='', classname=''):
+        self.compname = compname
+        self.modname = modname
+        self.classname = classname
+        if data:
+            self.updateFromDict(data)
+
+    def updateFromDict(self, data):
+        """ Sets attributes from a dict """
+        for key, value in data.items():
+            setattr(self, key, value)
+
+    def items(self):
+        """ Returns the mapped attributes """
+        return [(key, value) for key, value in self.__dict__.items()
+                if key not in ('compname', 'modname', 'classname')]
+
+
+class RelationshipMap(object):
+    """ Products.DataCollector.plugins.DataMaps.RelationshipMap """
+
+    def __init__(self, relname='', compname='', modname='', objmaps=None):
+        self.relname = relname
+        self.compname = compname
+        self.modname = modname
+        self.maps = list(objmaps or list())
+
+    def __iter__(self):
+        return iter(self.maps)
+
+    def __len__(self):
+        return len(self.maps)
+
+    def append(self, obj):
+        """ Adds an ObjectMap """
+        self.maps.append(obj)
+
+
+class MultiArgs(object):
+    """ Products.DataCollector.plugins.DataMaps.MultiArgs """
+
+    def __init__(self, *args):
+        self.args = args
+
+
+class CommandPlugin(object):
+    """ Products.DataCollector.plugins.CollectorPlugin.CommandPlugin """
+
+    deviceProperties = ('id', 'manageIp')
+    compname = ''
+    relname = ''
+    modname = ''
+    command = ''
+
+    def name(self):
+        """ Returns the plugin's name """
+        return self.__class__.__name__
+
+    def condition(self, device, log):
+        """ Returns whether the plugin should be run """
+        return True
+
+    def relMap(self):
+        """ Returns an empty RelationshipMap for the plugin """
+        return RelationshipMap(
+            relname=self.relname,
+            compname=self.compname,
+            modname=self.modname,
+            )
+
+    def objectMap(self, data=None):
+        """ Returns an ObjectMap for the plugin """
+        return ObjectMap(data, compname=self.compname, modname=self.modname)
+
+    def prepId(self, id, subchar='_'):
+        """ Returns an ID safe for use in Zenoss """
+        return prepId(id, subchar)
+
+
+class PythonDataSource(object):
+    """ ZenPacks.zenoss.PythonCollector...PythonDataSource """
+
+    _properties = tuple()
+
+
+class PythonDataSourcePlugin(object):
+    """ ZenPacks.zenoss.PythonCollector...PythonDataSourcePlugin """
+
+    proxy_attributes = tuple()
+
+    def __init__(self, config=None):
+        self.config = config
+
+    @classmethod
+    def params(cls, datasource, context):
+        """ Returns parameters for the datasource's config """
+        return dict()
+
+    def new_data(self):
+        """ Returns an empty result for onSuccess """
+        return {
+            'values': collections.defaultdict(dict),
+            'events': list(),
+            'maps': list(),
+            }
+
+    def collect(self, config):
+        """ Returns a Deferred firing with collected data """
+        raise NotImplementedError
+
+    def onSuccess(self, result, config):
+        """ Returns data from the result of collect """
+        return result
+
+    def cleanup(self, config):
+        """ Called when the datasource is removed or reconfigured """
+
+
+class Version(object):
+    """ Products.ZenModel.migrate.Migrate.Version """
+
+    def __init__(self, major=0, minor=0, micro=0):
+        self.major = major
+        self.minor = minor
+        self.micro = micro
+
+
+class ZenPackMigration(object):
+    """ Products.ZenModel.ZenPack.ZenPackMigration """
+
+    version = Version()
+
+    def migrate(self, pack):
+        """ Migrates the ZenPack's objects """
+        pass
+
+
+class Schema(object):
+    """ Stands in for zenpacklib's generated schema module,
+    providing a plain base class for any name requested
+    """
+
+    def __getattr__(self, name):
+        cls = type(name, (object,), dict())
+        setattr(self, name, cls)
+        return cls
+
+
+def load_yaml(*args, **kwargs):
+    """ ZenPacks.zenoss.ZenPackLib.zenpacklib.load_yaml """
+    cfg = types.ModuleType('zenpacklib_cfg')
+    cfg.zenpack_module = types.ModuleType('zenpack_module')
+    cfg.zenpack_module.schema = Schema()
+    return cfg
+
+
+STUBS = {
+    'Products.ZenEvents': {'Event': Event},
+    'Products.ZenModel.migrate.Migrate': {'Version': Version},
+    'Products.ZenModel.ZenPack': {'ZenPackMigration': ZenPackMigration},
+    'Products.ZenRRD.CommandParser': {'CommandParser': CommandParser},
+    'Products.ZenUtils.Utils': {
+        'monkeypatch': monkeypatch,
+        'prepId': prepId,
+        },
+    'Products.DataCollector.plugins.CollectorPlugin': {
+        'CommandPlugin': CommandPlugin,
+        },
+    'Products.DataCollector.plugins.DataMaps': {
+        'MultiArgs': MultiArgs,
+        'ObjectMap': ObjectMap,
+        'RelationshipMap': RelationshipMap,
+        },
+    'ZenPacks.zenoss.PythonCollector.datasources.PythonDataSource': {
+        'PythonDataSource': PythonDataSource,
+        'PythonDataSourcePlugin': PythonDataSourcePlugin,
+        },
+    'ZenPacks.zenoss.ZenPackLib.zenpacklib': {'load_yaml': load_yaml},
+    }
+
+
+def stub_module(name, attrs):
+    """ Adds a module and any missing parents to sys.modules """
+    parts = name.split('.')
+    for index in range(1, len(parts) + 1):
+        mod_name = '.'.join(parts[:index])
+        if mod_name not in sys.modules:
+            module = types.ModuleType(mod_name)
+            module.__path__ = list()
+            sys.modules[mod_name] = module
+            if index > 1:
+                setattr(sys.modules['.'.join(parts[:index - 1])],
+                        parts[index - 1],
+                        module)
+    sys.modules[name].__dict__.update(attrs)
+
+
+def install():
+    """ Stubs each Zenoss module which can't be imported """
+    stubbed = list()
+    for name in sorted(STUBS):
+        try:
+            __import__(name)
+        except ImportError:
+            stub_module(name, STUBS[name])
+            stubbed.append(name)
+    # The real Event is a module of constants
+    if 'Products.ZenEvents' in stubbed:
+        sys.modules['Products.ZenEvents.Event'] = Event
+    return stubbed
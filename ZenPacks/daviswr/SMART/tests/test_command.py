@@ -0,0 +1,333 @@
+#pylint: disable=invalid-name,missing-docstring
+""" Tests for the collection commands, run with bash against stand-in
+smartctl, hdparm and smartd files
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+from ZenPacks.daviswr.SMART.SmartStorage import SmartStorage
+from ZenPacks.daviswr.SMART.lib.command import (
+    COMPRESSED_HEADER,
+    DELIMITER,
+    REDUCE_TABLES,
+    SMARTD_PREFIX,
+    TIME_PREFIX,
+    batch_command,
+    single_command,
+    stagger_offset,
+    )
+from ZenPacks.daviswr.SMART.lib.cost import command_time
+from ZenPacks.daviswr.SMART.parsers import smartctl
+from ZenPacks.daviswr.SMART.tests import harness
+
+BASH = shutil.which('bash') if hasattr(shutil, 'which') else '/bin/bash'
+
+SMARTCTL = '#!/bin/sh\necho "smartctl $*"\n'
+FIXTURE = '#!/bin/sh\ncat "{0}"\nexit 4\n'
+COMPRESS_SMARTCTL = """#!/bin/sh
+case "$*" in
+*/dev/sd[ab]) cat "{0}/smartctl/sata_hdd_errors.txt";;
+*) cat "{0}/smartctl/nvme_samsung.txt";;
+esac
+"""
+NVME = '#!/bin/sh\necho "nvme $*" >> "$HOME/nvme"\ncat "{0}"\n'
+HDPARM = '#!/bin/sh\necho\necho "$2:"\necho " drive state is:  {0}"\n'
+STATE = 'smartd.WDC_WD40EFRX_68N32N0-WD_WCC7K3KCRH5F.ata.state'
+ATTRLOG = 'attrlog.WDC_WD40EFRX_68N32N0-WD_WCC7K3KCRH5F.ata.csv'
+SERIAL = 'WD-WCC7K3KCRH5F'
+NVME_SERIAL = 'S4EWNX0R123456A'
+
+
+def without_time(output):
+    """ Returns output without its timing line, whose length varies """
+    return '\n'.join(line for line in output.splitlines()
+                     if not line.startswith(TIME_PREFIX))
+
+
+@unittest.skipUnless(BASH and os.path.exists(BASH), 'bash is required')
+class TestCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.bin = os.path.join(self.tmp, 'bin')
+        self.state = os.path.join(self.tmp, 'state')
+        os.mkdir(self.bin)
+        os.mkdir(self.state)
+        self.tool('smartctl', SMARTCTL)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def tool(self, name, content):
+        path = os.path.join(self.bin, name)
+        with open(path, 'w') as tool_file:
+            tool_file.write(content)
+        os.chmod(path, 0o755)
+
+    def write(self, name, content, age=0):
+        path = os.path.join(self.state, name)
+        with open(path, 'w') as state_file:
+            state_file.write(content)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+
+    def run_command(self, command):
+        env = dict(os.environ)
+        env['HOME'] = self.tmp
+        env['PATH'] = '{0}:{1}'.format(self.bin, env.get('PATH', ''))
+        return subprocess.check_output(
+            [BASH, '-c', command.replace('$ZENOTHING', '')],
+            env=env,
+            ).decode('utf-8')
+
+    def test_single(self):
+        output = self.run_command(single_command('/dev/sda'))
+        self.assertIn('smartctl --info --attributes', output)
+        self.assertIn('/dev/sda\n{0}'.format(TIME_PREFIX), output)
+
+    def test_timing(self):
+        self.tool('smartctl', '#!/bin/sh\nsleep 0.2\nexit 4\n')
+        try:
+            self.run_command(single_command('/dev/sda'))
+        except subprocess.CalledProcessError as err:
+            # smartctl's exit status is kept
+            self.assertEqual(err.returncode, 4)
+            self.assertTrue(command_time(err.output.decode('utf-8')) >= 100)
+        else:
+            self.fail('exit status not kept')
+
+    def test_batch(self):
+        output = self.run_command(batch_command(
+            [('/dev/sda', 'smartctl', '', '', 'A'),
+             ('/dev/sdb', 'smartctl', '', '', 'B'),
+             ('/dev/sdc', 'smartctl', '', '', 'C')],
+            concurrency=2,
+            ))
+        chunks = output.split(DELIMITER)[:-1]
+        self.assertEqual(len(chunks), 3)
+        for chunk, path in zip(chunks, ('/dev/sda', '/dev/sdb', '/dev/sdc')):
+            self.assertIn('Device Path: {0}'.format(path), chunk)
+            self.assertIsNotNone(command_time(chunk))
+
+    def test_logs(self):
+        # Only the logs a profiled disk supports
+        output = self.run_command(single_command('/dev/sda', logs=['devstat']))
+        self.assertIn('--log=devstat ', output)
+        self.assertNotIn('--log=ssd', output)
+        output = self.run_command(single_command('/dev/sda', logs=list()))
+        self.assertNotIn('--log', output)
+        output = self.run_command(batch_command(
+            [('/dev/sda', 'smartctl', '', '', 'A', ['sasphy']),
+             ('/dev/sdb', 'smartctl', '', '', 'B')],
+            ))
+        first, second = output.split(DELIMITER)[:2]
+        self.assertIn('--log=sasphy', first)
+        self.assertNotIn('--log=devstat', first)
+        self.assertIn('--log=devstat', second)
+
+    def test_stagger(self):
+        offsets = [stagger_offset('SERIAL{0:03d}'.format(index), 60)
+                   for index in range(600)]
+        # The same for a disk each time, spread across the interval
+        self.assertEqual(offsets[0], stagger_offset('SERIAL000', 60))
+        self.assertTrue(all(0 <= offset < 60 for offset in offsets))
+        for tenth in range(6):
+            count = len([offset for offset in offsets
+                         if tenth * 10 <= offset < (tenth + 1) * 10])
+            self.assertTrue(60 < count < 140, count)
+        self.assertEqual(stagger_offset('SERIAL000', 0), 0)
+
+    def test_stagger_command(self):
+        disk = SmartStorage()
+        disk.__dict__.update(
+            id='SERIAL000',
+            SerialNumber='SERIAL000',
+            DevicePath='/dev/sda',
+            BlockDevice='sda',
+            SmartctlPath='smartctl',
+            PrivEscCmd='',
+            SmartctlOptions='',
+            zSmartStaggerInterval=60,
+            )
+        # Only zenpython waits out the offset, before opening a channel,
+        # as a sleep in zencommand's command would hold its session open
+        self.assertEqual(disk.stagger_offset(),
+                         stagger_offset('SERIAL000', 60))
+        self.assertNotIn('sleep', disk.smartctl_command('status'))
+
+    def test_reduce(self):
+        for name in harness.fixture_names('smartctl'):
+            self.tool('smartctl', FIXTURE.format(os.path.join(
+                harness.FIXTURES_DIR,
+                'smartctl',
+                name,
+                )))
+            outputs = list()
+            for reduce_output in (False, True):
+                try:
+                    self.run_command(single_command(
+                        '/dev/sda',
+                        reduce_output=reduce_output,
+                        ))
+                except subprocess.CalledProcessError as err:
+                    # smartctl's exit status is kept
+                    self.assertEqual(err.returncode, 4)
+                    outputs.append(err.output.decode('utf-8'))
+            self.assertEqual(len(outputs), 2)
+            self.assertTrue(
+                len(without_time(outputs[1])) <= len(without_time(outputs[0])),
+                name
+                )
+            self.assertIsNotNone(command_time(outputs[1]))
+            # The parsers read the same from what's left
+            for datasource in sorted(harness.PARSERS):
+                expected = list()
+                for output in outputs:
+                    harness.reset()
+                    expected.append(harness.parse(
+                        output,
+                        datasource=datasource,
+                        ))
+                self.assertEqual(expected[0], expected[1], (datasource, name))
+
+    def test_reduce_tables(self):
+        # Every table the parsers read is kept
+        kept = [header.replace('\\', '') for header in REDUCE_TABLES]
+        for header, table in smartctl.table_headers:
+            if smartctl.SCT_HISTORY != table:
+                self.assertIn(header, kept)
+
+    def test_compress(self):
+        self.tool('smartctl', COMPRESS_SMARTCTL.format(harness.FIXTURES_DIR))
+        disks = [('/dev/sd{0}'.format(index), 'smartctl', '', '', '')
+                 for index in 'abcd']
+        plain = self.run_command(batch_command(disks))
+        output = self.run_command(batch_command(
+            disks,
+            concurrency=2,
+            reduce_output=True,
+            compress=True,
+            ))
+        self.assertTrue(output.startswith(COMPRESSED_HEADER))
+        self.assertTrue(len(output) * 4 < len(plain))
+        for datasource in sorted(harness.PARSERS):
+            for component in (SERIAL, NVME_SERIAL):
+                harness.reset()
+                expected = harness.parse(plain, component,
+                                         datasource=datasource)
+                self.assertTrue(expected[0])
+                harness.reset()
+                self.assertEqual(
+                    harness.parse(output, component, datasource=datasource),
+                    expected,
+                    )
+        # Cut short, it's decoded as far as it goes
+        decoded = smartctl.decompress(output)
+        partial = smartctl.decompress(output[:len(output) // 2])
+        self.assertTrue(partial)
+        self.assertTrue(decoded.startswith(partial))
+
+    def test_nvme_cli(self):
+        self.tool('nvme', NVME.format(os.path.join(
+            harness.FIXTURES_DIR,
+            'smartctl',
+            'nvme_samsung_cli.json',
+            )))
+        paths = ('/dev/nvme0 --device auto', '/dev/nvme1 --device auto')
+        disks = [(path, 'smartctl', '', '', '') for path in paths]
+        output = self.run_command(batch_command(
+            disks,
+            tier='status',
+            nvme_cli=True,
+            ))
+        self.assertNotIn('smartctl --info', output)
+        with open(os.path.join(self.tmp, 'nvme')) as calls:
+            self.assertEqual(calls.read().splitlines(), [
+                'nvme smart-log /dev/nvme0 -o json',
+                'nvme smart-log /dev/nvme1 -o json',
+                ])
+        for path in paths:
+            harness.reset()
+            values, _ = harness.parse(
+                output,
+                'missing',
+                data={'path': path},
+                datasource='status',
+                )
+            self.assertEqual(values['temperature_celsius'], 41)
+
+        # smartctl is run if nvme-cli can't read the log
+        self.tool('nvme', '#!/bin/sh\nexit 1\n')
+        output = self.run_command(batch_command(disks, nvme_cli=True))
+        self.assertEqual(output.count('smartctl --info'), 2)
+
+    def test_standby_check(self):
+        self.tool('hdparm', HDPARM.format('standby'))
+        output = self.run_command(single_command(
+            '/dev/sda',
+            standby_check=True,
+            ))
+        self.assertIn('Device is in STANDBY mode', output)
+        self.assertNotIn('smartctl --info', output)
+        self.tool('hdparm', HDPARM.format('active/idle'))
+        output = self.run_command(single_command(
+            '/dev/sda',
+            standby_check=True,
+            ))
+        self.assertIn('smartctl --info', output)
+
+    def test_smartd_state(self):
+        self.write(STATE, 'ata-smart-attribute.0.id = 1\n', age=600)
+        output = self.run_command(single_command(
+            '/dev/sda',
+            serial=SERIAL,
+            smartd_dir=self.state,
+            ))
+        self.assertIn(SMARTD_PREFIX + os.path.join(self.state, STATE), output)
+        self.assertIn('ata-smart-attribute.0.id = 1', output)
+        self.assertNotIn('smartctl --info', output)
+
+    def test_smartd_attrlog(self):
+        self.write(STATE, 'ata-smart-attribute.0.id = 1\n', age=600)
+        self.write(ATTRLOG, 'old;\t1;100;0;\nnew;\t1;200;0;\n', age=60)
+        output = self.run_command(single_command(
+            '/dev/sda',
+            serial=SERIAL,
+            smartd_dir=self.state,
+            ))
+        # The newest file, and only the log's last line
+        self.assertIn(ATTRLOG, output)
+        self.assertIn('new;', output)
+        self.assertNotIn('old;', output)
+
+    def test_smartd_stale(self):
+        self.write(STATE, 'ata-smart-attribute.0.id = 1\n', age=7200)
+        output = self.run_command(single_command(
+            '/dev/sda',
+            serial=SERIAL,
+            smartd_dir=self.state,
+            smartd_age=3600,
+            ))
+        self.assertNotIn(SMARTD_PREFIX, output)
+        self.assertIn('smartctl --info', output)
+
+    def test_smartd_batch(self):
+        self.write(STATE, 'ata-smart-attribute.0.id = 1\n')
+        output = self.run_command(batch_command(
+            [('/dev/sda', 'smartctl', '', '', SERIAL),
+             ('/dev/sdb', 'smartctl', '', '', 'OTHER')],
+            smartd_dir=self.state,
+            ))
+        chunks = output.split(DELIMITER)[:-1]
+        self.assertIn(SMARTD_PREFIX, chunks[0])
+        self.assertNotIn(SMARTD_PREFIX, chunks[1])
+        self.assertIn('smartctl --info', chunks[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
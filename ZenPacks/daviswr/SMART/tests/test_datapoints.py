@@ -0,0 +1,107 @@
+#pylint: disable=invalid-name,missing-docstring
+""" Tests for the datapoint source tables, apart from the parser """
+
+import unittest
+
+from ZenPacks.daviswr.SMART.lib.datapoints import (
+    ATTR_RAW,
+    INFO,
+    LOG_PLAN,
+    STAT,
+    STATUS_PLAN,
+    SUM,
+    Attribute,
+    Sources,
+    compile_plan,
+    compile_source,
+    evaluate,
+    )
+
+
+def attr(value=100, raw=0, name='Attribute', threshold=0):
+    return Attribute(name, value, threshold, 'old age', raw)
+
+
+def sources(info=None, attrs=None, stats=None, hard_disk=False, temp=None):
+    return Sources(info or dict(), attrs or dict(), stats or dict(),
+                   hard_disk, temp)
+
+
+class TestDatapoints(unittest.TestCase):
+
+    def test_precedence(self):
+        values = evaluate(LOG_PLAN, sources(
+            info={'ElementsInGrownDefectList': 3},
+            stats={'Number of Reallocated Logical Sectors': 2},
+            attrs={'5': attr(raw=1)},
+            ))
+        self.assertEqual(values['reallocated_sectors'], 1)
+        self.assertEqual(values['reallocated_raw'], 1)
+        values = evaluate(LOG_PLAN, sources(
+            info={'ElementsInGrownDefectList': 3},
+            ))
+        self.assertEqual(values['reallocated_sectors'], 3)
+
+    def test_missing(self):
+        # Only the totals are always present
+        values = evaluate(LOG_PLAN, sources())
+        self.assertEqual(values, {'errors': 0})
+        self.assertEqual(evaluate(STATUS_PLAN, sources()), dict())
+
+    def test_sum(self):
+        lookup = compile_source((SUM, ((INFO, 'a'), (INFO, 'b'))))
+        self.assertEqual(lookup(sources(info={'a': 1, 'b': 2})), 3)
+        values = evaluate(LOG_PLAN, sources(info={'HostReadCommands': 5}))
+        self.assertNotIn('commands', values)
+        values = evaluate(LOG_PLAN, sources(
+            info={'MediaAndDataIntegrityErrors': 1},
+            stats={'Number of Interface CRC Errors': 2},
+            ))
+        self.assertEqual(values['errors'], 3)
+
+    def test_ratio_and_remaining(self):
+        values = evaluate(LOG_PLAN, sources(
+            info={'AccumulatedStartStopCycles': 50,
+                  'SpecifiedCycleCountOverDeviceLifetime': 200,
+                  'PercentageUsed': 3},
+            ))
+        self.assertEqual(values['lifetime_health'], 0.25)
+        self.assertEqual(values['ssd_health'], 97)
+
+    def test_conditions(self):
+        attrs = {'231': attr(value=90, raw=40)}
+        ssd = evaluate(LOG_PLAN, sources(attrs=attrs))
+        hdd = evaluate(LOG_PLAN, sources(attrs=attrs, hard_disk=True))
+        self.assertEqual(ssd['ssd_health'], 90)
+        self.assertNotIn('ssd_health', hdd)
+        ssd = evaluate(STATUS_PLAN, sources(attrs=attrs))
+        hdd = evaluate(STATUS_PLAN, sources(attrs=attrs, hard_disk=True))
+        self.assertNotIn('temperature_celsius', ssd)
+        self.assertEqual(hdd['temperature_celsius'], 40)
+
+        values = evaluate(STATUS_PLAN, sources(
+            attrs={'189': attr(raw=30, name='High Fly Writes')},
+            temp=('CurrentTemperature', 35, 70, 60),
+            ))
+        self.assertEqual(values['temperature_celsius'], 35)
+        values = evaluate(STATUS_PLAN, sources(
+            attrs={'189': attr(raw=30, name='Airflow Temperature Cel')},
+            temp=('CurrentTemperature', 35, 70, 60),
+            ))
+        self.assertEqual(values['temperature_celsius'], 30)
+
+    def test_new_row(self):
+        plan = compile_plan((
+            (('example',), ((ATTR_RAW, '250'), (STAT, 'Example'))),
+            ))
+        self.assertEqual(
+            evaluate(plan, sources(stats={'Example': 7})),
+            {'example': 7},
+            )
+
+    def test_unknown_kind(self):
+        self.assertRaises(ValueError, compile_source, ('bogus', 'key'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#pylint: disable=invalid-name,missing-docstring
+""" Tests for the ZenPack's migration steps """
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ZenPacks.daviswr.SMART.migrate import MoveStatusHistory
+from ZenPacks.daviswr.SMART.tests import harness
+
+
+class TestMoveStatusHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.perf = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.perf)
+
+    def disk(self, name, files):
+        path = os.path.join(self.perf, name)
+        os.mkdir(path)
+        for rrd in files:
+            with open(os.path.join(path, rrd), 'w') as rrd_file:
+                rrd_file.write(rrd)
+        return harness.Obj(fullRRDPath=lambda: path)
+
+    def files(self, name):
+        path = os.path.join(self.perf, name)
+        files = dict()
+        for rrd in os.listdir(path):
+            with open(os.path.join(path, rrd)) as rrd_file:
+                files[rrd] = rrd_file.read()
+        return files
+
+    def test_migrate(self):
+        disks = [
+            self.disk('upgraded', [
+                'smartctl_health_check.rrd',
+                'smartctl_smart_enabled.rrd',
+                'smartctl_temperature_celsius.rrd',
+                'smartctl_errors.rrd',
+                ]),
+            # Already collected by status, its history is kept
+            self.disk('collected', [
+                'smartctl_temperature_celsius.rrd',
+                'status_temperature_celsius.rrd',
+                ]),
+            ]
+        device = harness.Obj(smartStorage=lambda: disks)
+        pack = harness.Obj(dmd=harness.Obj(Devices=harness.Obj(
+            getSubDevicesGen=lambda: iter([device])
+            )))
+        MoveStatusHistory.MoveStatusHistory().migrate(pack)
+
+        self.assertEqual(self.files('upgraded'), {
+            'status_health_check.rrd': 'smartctl_health_check.rrd',
+            'status_smart_enabled.rrd': 'smartctl_smart_enabled.rrd',
+            'status_temperature_celsius.rrd':
+                'smartctl_temperature_celsius.rrd',
+            'smartctl_errors.rrd': 'smartctl_errors.rrd',
+            })
+        self.assertEqual(self.files('collected'), {
+            'smartctl_temperature_celsius.rrd':
+                'smartctl_temperature_celsius.rrd',
+            'status_temperature_celsius.rrd':
+                'status_temperature_celsius.rrd',
+            })
+        # Running again changes nothing
+        self.assertEqual(
+            MoveStatusHistory.rename_rrds(os.path.join(self.perf, 'upgraded')),
+            0
+            )
@@ -0,0 +1,329 @@
+#pylint: disable=invalid-name,missing-docstring
+""" Tests for the daviswr.cmd.SMART modeler plugin """
+
+import importlib
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from ZenPacks.daviswr.SMART.lib.util import fingerprint
+from ZenPacks.daviswr.SMART.tests import harness
+
+BASH = shutil.which('bash') if hasattr(shutil, 'which') else '/bin/bash'
+
+# Stand-in smartctl with disks in slots 0-2, 5 and 12 of a controller
+CONTROLLER = '''#!/bin/sh
+for arg; do slot=$arg; done
+case "$*" in
+*megaraid*)
+    echo "$slot" >> "$HOME/probed"
+    case "${slot#*,}" in
+    0|1|2|5|12)
+        echo "Device Model:     WDC WD40EFRX-68N32N0"
+        echo "Serial Number:    DISK${slot#*,}"
+        ;;
+    *)
+        echo "Smartctl open device: /dev/bus/0 failed: INQUIRY failed"
+        ;;
+    esac
+    ;;
+esac
+'''
+
+
+class TestModeler(unittest.TestCase):
+    """ Models each modeler fixture and compares to its golden file """
+
+    def setUp(self):
+        harness.reset()
+
+    def test_golden(self):
+        for name in harness.fixture_names('modeler'):
+            actual = harness.modeler_summary(
+                harness.model(harness.fixture('modeler', name))
+                )
+            expected = harness.golden('modeler', name, actual)
+            self.assertEqual(actual, expected, name)
+
+    def test_json_matches_text(self):
+        text = harness.modeler_summary(harness.model(
+            harness.fixture('modeler', 'linux_wd_red.txt')
+            ))
+        json_maps = harness.modeler_summary(harness.model(
+            harness.fixture('modeler', 'linux_wd_red_json.txt')
+            ))
+        self.assertEqual(len(json_maps), 1)
+        for key in ('id', 'title', 'DeviceModel', 'SerialNumber',
+                    'UserCapacity', 'LogicalSector', 'PhysicalSector',
+                    'RotationRate', 'FormFactor', 'TransportType',
+                    'Wwn', 'setProductKey'):
+            self.assertEqual(text[0].get(key), json_maps[0].get(key), key)
+        self.assertEqual(json_maps[0]['SmartctlOptions'], '--json=c')
+
+    def test_sas_text_output(self):
+        # SAS disks' block and command counters are only in text output
+        maps = harness.model(harness.fixture(
+            'modeler',
+            'linux_mixed.txt'
+            ).replace('smartctl Options: ', 'smartctl Options: --json=c'))
+        self.assertEqual(
+            sorted((om.Protocol, om.SmartctlOptions) for om in maps),
+            [('ATA', '--json=c'), ('NVMe', '--json=c'), ('SCSI', '')]
+            )
+
+    def test_indexed_deduplicated(self):
+        maps = harness.model(harness.fixture('modeler', 'linux_mixed.txt'))
+        seagate = [om for om in maps
+                   if om.SerialNumber == 'Z1Z2ABCD0000C4281234']
+        self.assertEqual(len(seagate), 1)
+        self.assertEqual(seagate[0].DevicePath, '/dev/sdb --device cciss,1')
+        self.assertEqual(seagate[0].BlockDevice, 'sdb')
+
+    def test_multipath(self):
+        output = harness.fixture('modeler', 'linux_mixed.txt')
+        # The SAS disk's second port, as another block device
+        sas = output.split('--------\n')[1]
+        output += sas.replace('/dev/sdb', '/dev/sdz') + '--------\n'
+        maps = harness.model(output)
+        seagate = [om for om in maps if om.Wwn == '5000c50057a1b2c3']
+        self.assertEqual(len(seagate), 1)
+        self.assertEqual(seagate[0].DevicePath, '/dev/sdb --device cciss,1')
+        self.assertEqual(seagate[0].BlockDevice, 'sdb')
+        self.assertEqual(seagate[0].AlternatePaths,
+                         '/dev/sdb --device auto, /dev/sdz --device auto')
+
+        # Each head polls the shared disk only if it's the disk's own,
+        # and every disk only it can reach
+        heads = [
+            [om.id for om in harness.model(
+                output,
+                zSmartMultipathHeads=2,
+                zSmartMultipathHead=head,
+                )]
+            for head in (0, 1)
+            ]
+        for ids in heads:
+            self.assertIn('S3Z1NB0K812345X', ids)
+            self.assertIn('S4EWNX0R123456A', ids)
+        self.assertEqual(
+            sum('Z1Z2ABCD0000C4281234' in ids for ids in heads),
+            1
+            )
+
+    def test_ignore_unsupported(self):
+        output = harness.fixture('modeler', 'linux_mixed.txt')
+        ids = [om.id for om in harness.model(output)]
+        self.assertNotIn('0000000000000611', ids)
+        ids = [om.id for om in harness.model(
+            output,
+            zSmartIgnoreUnsupported=False
+            )]
+        self.assertIn('0000000000000611', ids)
+
+    def test_disk_map_match(self):
+        ids = [om.id for om in harness.model(
+            harness.fixture('modeler', 'linux_mixed.txt'),
+            zSmartDiskMapMatch='nvme',
+            )]
+        self.assertEqual(ids, ['S4EWNX0R123456A'])
+
+    def test_ignore_models(self):
+        ids = [om.id for om in harness.model(
+            harness.fixture('modeler', 'macos_diskutil.txt'),
+            zSmartIgnoreModels='^APPLE',
+            )]
+        self.assertEqual(ids, ['WD-WCC6Y3LJ1ZA3'])
+
+    def test_synthetic(self):
+        maps = harness.model(harness.synthetic_model(10))
+        self.assertEqual(len(set(om.id for om in maps)), 10)
+
+    def test_fingerprint_defaults(self):
+        # Disks are stored with zenpack.yaml defaults for properties their
+        # maps don't set, which mustn't change their fingerprints
+        for name in harness.fixture_names('modeler'):
+            output = harness.fixture('modeler', name)
+            stored = dict(
+                (om.id, fingerprint(harness.stored(om)))
+                for om in harness.model(output)
+                )
+            self.assertEqual(
+                harness.model(output, getDaviswrSmartFingerprints=stored),
+                list(),
+                name
+                )
+
+    def test_incremental(self):
+        output = harness.fixture('modeler', 'linux_mixed.txt')
+        full = harness.model(output)
+        # Fingerprints of the stored components
+        stored = dict(
+            (om.id, fingerprint(harness.stored(om)))
+            for om in full
+            )
+        self.assertEqual(
+            harness.model(output, getDaviswrSmartFingerprints=stored),
+            list()
+            )
+
+        changed = dict(stored)
+        changed['S4EWNX0R123456A'] = 'old firmware'
+        maps = harness.model(output, getDaviswrSmartFingerprints=changed)
+        self.assertEqual([om.id for om in maps], ['S4EWNX0R123456A'])
+        self.assertEqual(maps[0].compname, 'smartStorage/S4EWNX0R123456A')
+        self.assertEqual(
+            harness.modeler_summary(maps),
+            [props for props in harness.modeler_summary(full)
+             if props['id'] == 'S4EWNX0R123456A']
+            )
+
+        # A removed disk needs the full RelationshipMap
+        removed = dict(stored)
+        removed['gone'] = 'gone'
+        self.assertEqual(
+            len(harness.model(output, getDaviswrSmartFingerprints=removed)),
+            len(full)
+            )
+
+    def test_resync(self):
+        output = harness.fixture('modeler', 'linux_mixed.txt')
+        full = harness.model(output)
+        stored = dict(
+            (om.id, fingerprint(harness.stored(om)))
+            for om in full
+            )
+        self.assertEqual(
+            len(harness.model(
+                output,
+                getDaviswrSmartFingerprints=stored,
+                zSmartModelResyncInterval=0,
+                )),
+            len(full)
+            )
+        modeler = importlib.import_module(harness.SMART.__module__)
+        modeler.last_resync['localhost'] -= 25 * 3600
+        self.assertEqual(
+            len(harness.model(output, getDaviswrSmartFingerprints=stored)),
+            len(full)
+            )
+        self.assertEqual(
+            harness.model(output, getDaviswrSmartFingerprints=stored),
+            list()
+            )
+
+    def test_attributes(self):
+        output = harness.fixture('modeler', 'linux_wd_red_attributes.txt')
+        plugin = harness.SMART()
+        command = plugin.device_command(
+            harness.Obj(zSmartAttributeIds=['5', '197, 198', '254']),
+            harness.log,
+            )
+        self.assertIn('smart_attrs=1;', command)
+        self.assertEqual(plugin.command, harness.SMART.command)
+
+        maps = harness.model(
+            output,
+            zSmartAttributeIds=['5', '197, 198', '254'],
+            )
+        disks, attrs = maps
+        self.assertEqual([om.id for om in disks], ['WD-WCC7K3KCRH5F'])
+        self.assertEqual(attrs.relname, 'smartAttributes')
+        self.assertEqual(attrs.compname, 'smartStorage/WD-WCC7K3KCRH5F')
+        # Attributes the disk doesn't report are skipped
+        self.assertEqual(
+            [(om.id, om.AttributeId, om.title, om.AttributeType)
+             for om in attrs],
+            [('WD-WCC7K3KCRH5F_5', '5', 'Reallocated Sector Ct', 'pre-fail'),
+             ('WD-WCC7K3KCRH5F_197', '197', 'Current Pending Sector',
+              'old age'),
+             ('WD-WCC7K3KCRH5F_198', '198', 'Offline Uncorrectable',
+              'old age')]
+            )
+
+        # Disabled, only the disks are modeled
+        self.assertEqual(
+            harness.modeler_summary(harness.model(output)),
+            harness.modeler_summary(disks)
+            )
+
+    @unittest.skipUnless(BASH and os.path.exists(BASH), 'bash is required')
+    def test_controller_probe(self):
+        command = harness.SMART().device_command(harness.Obj(
+            id='localhost',
+            zSmartConcurrency=1,
+            zSmartControllers=['/dev/bus/0 -d megaraid', '/dev/sda; reboot'],
+            ), harness.log)
+        self.assertIn("smart_controllers=$'/dev/bus/0 -d megaraid';",
+                      command)
+
+        home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, home)
+        os.mkdir(os.path.join(home, 'bin'))
+        smartctl = os.path.join(home, 'bin', 'smartctl')
+        with open(smartctl, 'w') as tool_file:
+            tool_file.write(CONTROLLER)
+        os.chmod(smartctl, 0o755)
+        env = dict(os.environ)
+        env['HOME'] = home
+        env['PATH'] = '{0}:{1}'.format(os.path.dirname(smartctl),
+                                       env.get('PATH', ''))
+        output = subprocess.check_output(
+            [BASH, '-c', command],
+            env=env,
+            ).decode('utf-8')
+
+        disks = harness.model(output)
+        self.assertEqual(
+            sorted((om.id, om.title) for om in disks),
+            [('DISK{0}'.format(slot), '/dev/bus/0 -d megaraid')
+             for slot in (0, 1, 12, 2, 5)]
+            )
+        # Stopped after the first batch of 8 slots without a disk
+        with open(os.path.join(home, 'probed')) as probed:
+            self.assertEqual(len(probed.read().split()), 24)
+
+    def test_attributes_incremental(self):
+        output = harness.fixture('modeler', 'linux_wd_red_attributes.txt')
+        disks, attrs = harness.model(output, zSmartAttributeIds=['5'])
+        stored = dict(
+            (om.id, fingerprint(harness.stored(om)))
+            for om in disks
+            )
+        ids = {'WD-WCC7K3KCRH5F': [om.id for om in attrs]}
+        self.assertEqual(harness.model(
+            output,
+            zSmartAttributeIds=['5'],
+            getDaviswrSmartFingerprints=stored,
+            getDaviswrSmartAttributeIds=ids,
+            ), list())
+
+        # Added attributes are sent without the unchanged disk
+        maps = harness.model(
+            output,
+            zSmartAttributeIds=['5', '9'],
+            getDaviswrSmartFingerprints=stored,
+            getDaviswrSmartAttributeIds=ids,
+            )
+        self.assertEqual(len(maps), 1)
+        self.assertEqual(len(maps[0]), 2)
+
+        # Removed once the allowlist is cleared
+        maps = harness.model(
+            output,
+            getDaviswrSmartFingerprints=stored,
+            getDaviswrSmartAttributeIds=ids,
+            )
+        self.assertEqual(len(maps), 1)
+        self.assertEqual(maps[0].relname, 'smartAttributes')
+        self.assertEqual(len(maps[0]), 0)
+        self.assertEqual(harness.model(
+            output,
+            getDaviswrSmartFingerprints=stored,
+            getDaviswrSmartAttributeIds={'WD-WCC7K3KCRH5F': list()},
+            ), list())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,492 @@
+#pylint: disable=invalid-name,missing-docstring
+""" Tests for the smartctl and status command parsers """
+
+import time
+import unittest
+
+from ZenPacks.daviswr.SMART.lib.util import (
+    HEALTH_FAILED,
+    HEALTH_UNKNOWN,
+    POWER_ACTIVE,
+    POWER_STANDBY,
+    SMART_UNKNOWN,
+    )
+from ZenPacks.daviswr.SMART.lib import rollup
+from ZenPacks.daviswr.SMART.lib.command import TIME_PREFIX
+from ZenPacks.daviswr.SMART.parsers import attribute, device
+from ZenPacks.daviswr.SMART.tests import harness
+
+
+class TestSmartctl(unittest.TestCase):
+    """ Parses each smartctl fixture with each datasource's parser
+    and compares to its golden file
+    """
+
+    def setUp(self):
+        harness.reset()
+
+    def test_golden(self):
+        for datasource in sorted(harness.PARSERS):
+            for name in harness.fixture_names('smartctl'):
+                harness.reset()
+                actual = harness.parser_summary(*harness.parse(
+                    harness.fixture('smartctl', name),
+                    datasource=datasource,
+                    ))
+                expected = harness.golden(datasource, name, actual)
+                self.assertEqual(actual, expected, (datasource, name))
+
+    def test_json_matches_text(self):
+        for datasource in sorted(harness.PARSERS):
+            text, _ = harness.parse(
+                harness.fixture('smartctl', 'sata_hdd_wd_red.txt'),
+                datasource=datasource,
+                )
+            # Trends start over for each
+            harness.reset()
+            json_values, _ = harness.parse(
+                harness.fixture('smartctl', 'sata_hdd_wd_red.json'),
+                datasource=datasource,
+                )
+            self.assertEqual(text, json_values, datasource)
+
+    def test_protocol_matches_unprofiled(self):
+        protocols = {
+            'nvme': 'NVMe',
+            'sas': 'SCSI',
+            'sata': 'ATA',
+            }
+        for datasource in sorted(harness.PARSERS):
+            for name in harness.fixture_names('smartctl'):
+                protocol = protocols.get(name.split('_', 1)[0])
+                if not protocol:
+                    continue
+                harness.reset()
+                expected = harness.parse(
+                    harness.fixture('smartctl', name),
+                    datasource=datasource,
+                    )
+                harness.reset()
+                actual = harness.parse(
+                    harness.fixture('smartctl', name),
+                    data={'protocol': protocol},
+                    datasource=datasource,
+                    )
+                self.assertEqual(actual, expected, (datasource, name))
+
+    def test_datapoints(self):
+        # Each datapoint comes from one datasource's parser only
+        found = dict()
+        for datasource in sorted(harness.PARSERS):
+            for name in harness.fixture_names('smartctl'):
+                harness.reset()
+                values, _ = harness.parse(
+                    harness.fixture('smartctl', name),
+                    datasource=datasource,
+                    )
+                for point in values:
+                    found.setdefault(point, set()).add(datasource)
+        for point, datasources in found.items():
+            self.assertEqual(len(datasources), 1, point)
+            self.assertIn(point, harness.DATAPOINTS[datasources.pop()])
+
+    def test_permission_denied(self):
+        values, events = harness.parse(
+            harness.fixture('smartctl', 'permission_denied.txt'),
+            datasource='status',
+            )
+        self.assertEqual(values['health_check'], HEALTH_UNKNOWN)
+        self.assertEqual(values['smart_enabled'], SMART_UNKNOWN)
+        self.assertEqual(events, list())
+
+    def test_smartctl_events(self):
+        _, events = harness.parse(
+            harness.fixture('smartctl', 'sata_hdd_wd_red.txt')
+            )
+        self.assertEqual(events, list())
+
+    def test_sata_temperature_threshold(self):
+        output = harness.fixture('smartctl', 'sata_hdd_wd_red.txt')
+        _, events = harness.parse(output.replace(
+            'Min/Max Temperature Limit:           -41/85 Celsius',
+            'Min/Max Temperature Limit:           -41/30 Celsius',
+            ), datasource='status')
+        temp = [event for event in events
+                if event['eventKey'] == 'CurrentTemperature']
+        self.assertEqual(len(temp), 1)
+        self.assertEqual(temp[0]['severity'], 4)
+
+    def test_nvme_cli_matches_smartctl(self):
+        for datasource in sorted(harness.PARSERS):
+            harness.reset()
+            text = harness.parse(
+                harness.fixture('smartctl', 'nvme_samsung.txt'),
+                'S4EWNX0R123456A',
+                datasource=datasource,
+                )
+            harness.reset()
+            nvme_cli = harness.parse(
+                harness.fixture('smartctl', 'nvme_samsung_cli.json'),
+                'S4EWNX0R123456A',
+                data={'temp_limits': [85, 85]},
+                datasource=datasource,
+                )
+            self.assertEqual(text, nvme_cli, datasource)
+
+    def test_nvme_cli_temperature_limits(self):
+        # Modeled, as nvme-cli's SMART log doesn't have them
+        _, events = harness.parse(
+            harness.fixture('smartctl', 'nvme_samsung_cli.json'),
+            data={'temp_limits': [40, 85]},
+            datasource='status',
+            )
+        temp = [event for event in events
+                if event['eventKey'] == 'Temperature']
+        self.assertEqual(len(temp), 1)
+        self.assertEqual(temp[0]['severity'], 3)
+
+    def test_batch_matches_single(self):
+        output, components = harness.synthetic_batch(12)
+        chunks = output.split(harness.DELIMITER)[:-1]
+        for datasource in sorted(harness.PARSERS):
+            for index, chunk in enumerate(chunks):
+                # Without the device path line
+                harness.reset()
+                single = harness.parse(
+                    chunk.strip().split('\n', 1)[1],
+                    datasource=datasource,
+                    )
+                harness.reset()
+                batch = harness.parse(
+                    output,
+                    components[index],
+                    datasource=datasource,
+                    )
+                self.assertEqual(single, batch, components[index])
+                self.assertTrue(batch[0], components[index])
+
+    def test_batch_missing_component(self):
+        output, _ = harness.synthetic_batch(3)
+        self.assertEqual(harness.parse(output, 'missing'), (dict(), list()))
+
+    def test_batch_variants(self):
+        output, components = harness.synthetic_batch(
+            len(harness.BATCH_FIXTURES),
+            lambda index: {'temperature': 40 + index, 'reallocated': index},
+            )
+        for index, component in enumerate(components):
+            status, _ = harness.parse(output, component, datasource='status')
+            self.assertEqual(status['temperature_celsius'], 40 + index)
+            # Not reported by the Kingston SSD or NVMe
+            values, _ = harness.parse(output, component)
+            self.assertEqual(values.get('reallocated_raw', index), index)
+
+    def test_events_on_change(self):
+        output = harness.fixture('smartctl', 'sata_hdd_wd_red.txt')
+        _, events = harness.parse(output, datasource='status')
+        self.assertTrue(events)
+        _, events = harness.parse(output, datasource='status')
+        self.assertEqual(events, list())
+        # Another device's disk is tracked separately
+        _, events = harness.parse(
+            output,
+            device='other',
+            datasource='status',
+            )
+        self.assertTrue(events)
+        # Severity changes are sent
+        _, events = harness.parse(output.replace(
+            '  1 Raw_Read_Error_Rate     0x002f   200   200   051',
+            '  1 Raw_Read_Error_Rate     0x002f   040   200   051',
+            ), datasource='status')
+        self.assertEqual(
+            [(event['eventKey'], event['severity']) for event in events],
+            [('RawReadErrorRate', 4)]
+            )
+
+    def test_events_reassert(self):
+        output = harness.fixture('smartctl', 'sata_hdd_wd_red.txt')
+        data = {'reassert': 3600}
+        first = harness.parse(output, data=data, datasource='status')[1]
+        self.assertEqual(
+            harness.parse(output, data=data, datasource='status')[1],
+            list()
+            )
+        for state in harness.smartctl.event_cache.entries.values():
+            for key, sent in state[1].items():
+                state[1][key] = (sent[0], sent[1] - 3600)
+        self.assertEqual(
+            len(harness.parse(output, data=data, datasource='status')[1]),
+            len(first)
+            )
+
+    def test_standby_carried_forward(self):
+        component = 'WD-WCC7K3KCRH5F'
+        standby = harness.fixture('smartctl', 'sata_hdd_standby.txt')
+        # Nothing known yet
+        values, _ = harness.parse(standby, component, datasource='status')
+        self.assertEqual(values, {'power_state': POWER_STANDBY})
+        active, _ = harness.parse(
+            harness.fixture('smartctl', 'sata_hdd_wd_red.txt'),
+            component,
+            datasource='status',
+            )
+        self.assertEqual(active['power_state'], POWER_ACTIVE)
+        values, events = harness.parse(
+            standby,
+            component,
+            datasource='status',
+            )
+        self.assertEqual(values, {
+            'health_check': active['health_check'],
+            'power_state': POWER_STANDBY,
+            'smart_enabled': active['smart_enabled'],
+            })
+        self.assertEqual(events, list())
+        self.assertEqual(harness.parse(standby, component)[0], dict())
+
+    def test_standby_batch(self):
+        path = '/dev/sdb -d sat'
+        component = 'WD-WCC7K3KCRH5F'
+        output = '{0}{1}\n{2}\n{3}\n'.format(
+            harness.PATH_PREFIX,
+            path,
+            harness.fixture('smartctl', 'sata_hdd_standby.json'),
+            harness.DELIMITER,
+            )
+        harness.parse(
+            harness.fixture('smartctl', 'sata_hdd_wd_red.txt'),
+            component,
+            datasource='status',
+            )
+        values, _ = harness.parse(
+            output,
+            component,
+            data={'path': path},
+            datasource='status',
+            )
+        self.assertEqual(values['power_state'], POWER_STANDBY)
+        self.assertEqual(values['health_check'], 0)
+        self.assertEqual(harness.parse(output, 'other')[0], dict())
+
+    def test_smartd_matches_smartctl(self):
+        text, _ = harness.parse(
+            harness.fixture('smartctl', 'sata_hdd_wd_red.txt')
+            )
+        for name in ('smartd_state.txt', 'smartd_attrlog.txt'):
+            harness.reset()
+            values, _ = harness.parse(
+                harness.fixture('smartctl', name),
+                data={'hard_disk': True},
+                )
+            self.assertTrue(values, name)
+            for point in values:
+                self.assertEqual(values[point], text[point], (name, point))
+            # Only kept in smartctl's logs
+            self.assertNotIn('errors', values)
+            self.assertNotIn('phy_events', values)
+
+    def test_attributes(self):
+        attribute.values_cache['output'] = None
+        text = harness.fixture('smartctl', 'sata_hdd_wd_red.txt')
+        # Not scaled to 100
+        self.assertEqual(
+            attribute.attribute_values(text, 'WD-WCC7K3KCRH5F', '5'),
+            {'value': 200, 'worst': 200, 'threshold': 140, 'raw': 0}
+            )
+        self.assertEqual(
+            attribute.attribute_values(text, 'WD-WCC7K3KCRH5F', '9'),
+            {'value': 71, 'worst': 71, 'threshold': 0, 'raw': 21493}
+            )
+        self.assertEqual(
+            attribute.attribute_values(text, 'WD-WCC7K3KCRH5F', '254'),
+            dict()
+            )
+        self.assertEqual(
+            attribute.parse(text),
+            attribute.parse(
+                harness.fixture('smartctl', 'sata_hdd_wd_red.json')
+                )
+            )
+        # smartd keeps neither worst values nor thresholds
+        smartd = attribute.parse(
+            harness.fixture('smartctl', 'smartd_state.txt')
+            )
+        self.assertEqual(smartd['9'], {'value': 71, 'raw': 21493})
+        standby = harness.fixture('smartctl', 'sata_hdd_standby.txt')
+        self.assertEqual(attribute.parse(standby), dict())
+
+    def test_attributes_batch(self):
+        batch, components = harness.synthetic_batch(6)
+        for index, component in enumerate(components):
+            attribute.values_cache['output'] = None
+            expected = attribute.parse(harness.fixture(
+                'smartctl',
+                harness.BATCH_FIXTURES[index],
+                ))
+            for attr_id in ('5', '9', '231'):
+                self.assertEqual(
+                    attribute.attribute_values(batch, component, attr_id),
+                    expected.get(attr_id, dict()),
+                    (component, attr_id)
+                    )
+
+    def test_attribute_parser(self):
+        text = harness.fixture('smartctl', 'sata_hdd_wd_red.txt')
+        data = {'disk': 'WD-WCC7K3KCRH5F', 'attribute': '197', 'path': ''}
+        cmd = harness.make_cmd('', 'WD-WCC7K3KCRH5F_197')
+        cmd.points = [harness.Obj(id=point, data=data)
+                      for point in ('value', 'worst', 'threshold', 'raw')]
+
+        def collect():
+            result = harness.Obj(values=list(), events=list())
+            attribute.attribute().processResults(cmd, result)
+            return dict((point.id, value) for point, value in result.values)
+
+        # Nothing until the disk's parser records its output
+        self.assertEqual(collect(), dict())
+        harness.parse(text, 'WD-WCC7K3KCRH5F', data={'hard_disk': True})
+        self.assertEqual(collect(), dict())
+        harness.parse(
+            text,
+            'WD-WCC7K3KCRH5F',
+            data={'attributes': True, 'hard_disk': True},
+            )
+        self.assertEqual(
+            collect(),
+            {'value': 200, 'worst': 200, 'threshold': 0, 'raw': 0}
+            )
+        # Only the disk's own output is read
+        data['disk'] = 'WD-WCC7K3KCRH5G'
+        self.assertEqual(collect(), dict())
+
+    def test_log_events(self):
+        output = harness.fixture('smartctl', 'sata_hdd_errors.txt')
+        # Before the second error and the failed self-test
+        before = output.replace('ATA Error Count: 2', 'ATA Error Count: 1')
+        before = before.replace(
+            '# 1  Extended offline    Completed: read failure       90%     21440         268435455\n',  # noqa
+            '',
+            )
+        values, events = harness.parse(before)
+        self.assertEqual(values['error_log_entries'], 1)
+        self.assertEqual(values['last_selftest_status'], 0)
+        # Only noted the first time
+        self.assertEqual(events, list())
+
+        values, events = harness.parse(output)
+        self.assertEqual(values['error_log_entries'], 2)
+        self.assertEqual(values['last_selftest_status'], 7)
+        self.assertEqual(
+            [(event['eventKey'], event['severity'], event['summary'])
+             for event in events],
+            [('SmartErrorLog', 3,
+              '1 new error log entry, 2 in total, most recent at 21437 '
+              'hours: UNC at LBA = 0x0fffffff = 268435455'),
+             ('SmartSelfTest', 4,
+              'Extended offline self-test: Completed: read failure at '
+              '21440 hours')]
+            )
+        # Nothing more while the logs are unchanged
+        self.assertEqual(harness.parse(output)[1], list())
+
+        # No errors logged
+        values, _ = harness.parse(harness.fixture(
+            'smartctl',
+            'sata_hdd_wd_red.txt'
+            ).replace(
+                'SCT Status Version:',
+                'SMART Error Log Version: 1\nNo Errors Logged\n\n'
+                'SCT Status Version:',
+                ), component='other')
+        self.assertEqual(values['error_log_entries'], 0)
+
+    def test_costs(self):
+        text = harness.fixture('smartctl', 'sata_hdd_wd_red.txt')
+        timed = '{0}\n{1}1234 ms\n'.format(text, TIME_PREFIX)
+        values, events = harness.parse(
+            timed,
+            component='WD-WCC7K3KCRH5F',
+            datasource='status',
+            costs=True,
+            )
+        self.assertEqual(values['command_time'], 1234)
+        self.assertEqual(values['output_bytes'], len(timed))
+        self.assertEqual(values['events'], len(events))
+        self.assertTrue(values['parse_time'] >= 0)
+        # Untimed output, such as from before the command was timed
+        values, _ = harness.parse(text, costs=True)
+        self.assertNotIn('command_time', values)
+        self.assertEqual(values['events'], 0)
+        self.assertEqual(values['output_bytes'], len(text))
+
+    def test_costs_batch(self):
+        batch, components = harness.synthetic_batch(3)
+        for component in components:
+            values, _ = harness.parse(batch, component=component, costs=True)
+            self.assertTrue(0 < values['output_bytes'] < len(batch))
+
+    def test_rollup(self):
+        now = time.time()
+        rollup.record('localhost', 'smartctl', 'A',
+                      {'command_time': 100, 'overall_health': 90,
+                       'reallocated_raw': 2}, now - 600)
+        rollup.record('localhost', 'smartctl', 'B',
+                      {'command_time': 300, 'overall_health': 100,
+                       'reallocated_raw': 0}, now - 100)
+        rollup.record('other', 'smartctl', 'C', {'command_time': 900}, now)
+        totals = rollup.rollup('localhost', 'smartctl', now=now)
+        self.assertEqual(totals['disks'], 2)
+        self.assertEqual(totals['command_time'], 400)
+        self.assertEqual(totals['slowest_command_time'], 300)
+        self.assertEqual(totals['worst_overall_health'], 90)
+        self.assertEqual(totals['total_reallocated_sectors'], 2)
+        self.assertEqual(totals['total_pending_sectors'], 0)
+        self.assertEqual(totals['failed_health_checks'], 0)
+        self.assertNotIn('max_temperature_celsius', totals)
+        # Values not reported again are kept
+        rollup.record('localhost', 'smartctl', 'A',
+                      {'command_time': 50}, now)
+        totals = rollup.rollup('localhost', 'smartctl', now=now)
+        self.assertEqual(totals['worst_overall_health'], 90)
+        # B has not been collected for longer than max_age
+        totals = rollup.rollup('localhost', 'smartctl', max_age=60, now=now)
+        self.assertEqual(totals['disks'], 1)
+        self.assertEqual(totals['command_time'], 50)
+        self.assertEqual(rollup.rollup('localhost', 'status')['disks'], 0)
+
+    def test_device_parser(self):
+        batch, components = harness.synthetic_batch(6)
+        expected = list()
+        for component in components:
+            values, _ = harness.parse(batch, component=component,
+                                      datasource='status')
+            expected.append(values)
+        points = [harness.Obj(id=point, data={'tier': 'status'})
+                  for point, _, _ in rollup.ROLLUP_DATAPOINTS]
+        cmd = harness.Obj(
+            result=harness.Obj(output=batch),
+            component='',
+            deviceConfig=harness.Obj(device='localhost'),
+            cycleTime=60,
+            points=points,
+            )
+        result = harness.Obj(values=list(), events=list())
+        device.device().processResults(cmd, result)
+        values = dict((point.id, value) for point, value in result.values)
+        self.assertEqual(values['disks'], 6)
+        self.assertTrue(0 < values['output_bytes'] < len(batch))
+        self.assertEqual(
+            values['max_temperature_celsius'],
+            max(disk['temperature_celsius'] for disk in expected
+                if 'temperature_celsius' in disk)
+            )
+        self.assertEqual(
+            values['failed_health_checks'],
+            [disk.get('health_check') for disk in expected].count(
+                HEALTH_FAILED)
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,451 @@
+#pylint: disable=invalid-name,missing-docstring,wrong-import-position
+""" Tests for the pooled SSH connections and the Python datasource,
+against a local SSH server
+"""
+
+import struct
+import time
+
+try:
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from twisted.conch import avatar
+    from twisted.conch.interfaces import ISession
+    from twisted.conch.ssh import connection, factory, keys, session
+    from twisted.conch.ssh import userauth
+    from twisted.cred import checkers, portal
+    from twisted.internet import defer, protocol, reactor
+    from twisted.python import components
+    from twisted.trial import unittest
+    from zope.interface import implementer
+except ImportError:
+    import unittest
+    reactor = None
+
+    def implementer(*args):
+        """ Stands in for zope.interface.implementer """
+        return lambda cls: cls
+
+    avatar = components = None
+    avatar_base = object
+else:
+    avatar_base = avatar.ConchUser
+
+from ZenPacks.daviswr.SMART.lib import ssh
+from ZenPacks.daviswr.SMART.tests import harness
+
+USERNAME = 'zenoss'
+PASSWORD = 'secret'
+FIXTURE = 'sata_hdd_wd_red.txt'
+
+
+class FakeServer(object):
+    """ Runs commands for the SSH server, counting connections and
+    concurrent commands
+    """
+
+    def __init__(self, output, delay=0.0):
+        self.output = output
+        self.delay = delay
+        self.connections = 0
+        self.commands = list()
+        self.active = 0
+        self.max_active = 0
+        self.calls = list()
+        self.transports = list()
+
+    def run(self, command, proto):
+        self.commands.append(command)
+        self.active += 1
+        self.max_active = max(self.active, self.max_active)
+
+        def finish():
+            self.active -= 1
+            channel = proto.session
+            if channel not in channel.conn.channelsToRemoteChannel:
+                # Closed by the client
+                return
+            channel.write(self.output.encode('utf-8'))
+            channel.conn.sendRequest(
+                channel,
+                b'exit-status',
+                struct.pack('>L', 0),
+                )
+            channel.conn.sendClose(channel)
+
+        self.calls.append(reactor.callLater(self.delay, finish))
+
+
+class Avatar(avatar_base):
+
+    def __init__(self, server):
+        avatar_base.__init__(self)
+        self.server = server
+        self.channelLookup[b'session'] = session.SSHSession
+
+
+class CommandTransport(object):
+    """ Stands in for the process transport of a command """
+
+    def write(self, data):
+        pass
+
+    def loseConnection(self):
+        pass
+
+
+@implementer(ISession if reactor else None)
+class Session(object):
+
+    def __init__(self, user):
+        self.user = user
+
+    def execCommand(self, proto, command):
+        proto.makeConnection(CommandTransport())
+        self.user.server.run(command, proto)
+
+    def getPty(self, term, windowSize, modes):
+        pass
+
+    def openShell(self, proto):
+        raise NotImplementedError
+
+    def windowChanged(self, newWindowSize):
+        pass
+
+    def eofReceived(self):
+        pass
+
+    def closed(self):
+        pass
+
+
+if components:
+    components.registerAdapter(Session, Avatar, ISession)
+
+
+class Realm(object):
+
+    def __init__(self, server):
+        self.server = server
+
+    def requestAvatar(self, avatarId, mind, *interfaces):
+        return interfaces[0], Avatar(self.server), lambda: None
+
+
+if reactor:
+    Realm = implementer(portal.IRealm)(Realm)
+    host_key = keys.Key(rsa.generate_private_key(65537, 2048))
+
+
+class ServerFactory(factory.SSHFactory if reactor else object):
+
+    services = {
+        b'ssh-userauth': userauth.SSHUserAuthServer,
+        b'ssh-connection': connection.SSHConnection,
+        }
+
+    def __init__(self, server):
+        self.server = server
+        self.portal = portal.Portal(Realm(server), [
+            checkers.InMemoryUsernamePasswordDatabaseDontUse(
+                **{USERNAME: PASSWORD.encode('utf-8')}
+                ),
+            ])
+        self.publicKeys = {b'ssh-rsa': host_key.public()}
+        self.privateKeys = {b'ssh-rsa': host_key}
+
+    def buildProtocol(self, addr):
+        self.server.connections += 1
+        proto = factory.SSHFactory.buildProtocol(self, addr)
+        lost = defer.Deferred()
+        self.server.transports.append((proto, lost))
+        connection_lost = proto.connectionLost
+
+        def on_lost(reason):
+            connection_lost(reason)
+            lost.callback(None)
+
+        proto.connectionLost = on_lost
+        return proto
+
+
+class SilentServer(protocol.Protocol):
+    """ Accepts connections without ever speaking SSH """
+
+
+class Obj(harness.Obj):
+    pass
+
+
+class TestSSH(unittest.TestCase):
+
+    skip = None if reactor else 'Twisted conch is not installed'
+
+    def setUp(self):
+        harness.reset()
+        self.server = FakeServer(harness.fixture('smartctl', FIXTURE))
+        self.port = reactor.listenTCP(
+            0,
+            ServerFactory(self.server),
+            interface='127.0.0.1',
+            )
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        for pool_id in list(ssh.pools):
+            ssh.close_pool(pool_id)
+        for call in self.server.calls:
+            if call.active():
+                call.cancel()
+        for proto, lost in self.server.transports:
+            proto.transport.loseConnection()
+            yield lost
+        yield self.port.stopListening()
+
+    def options(self, **kwargs):
+        settings = dict(
+            port=self.port.getHost().port,
+            username=USERNAME,
+            password=PASSWORD,
+            )
+        settings.update(kwargs)
+        return ssh.SSHOptions('127.0.0.1', **settings)
+
+    @defer.inlineCallbacks
+    def test_connection_reused(self):
+        pool = ssh.device_pool('localhost', self.options())
+        for _ in range(3):
+            output, code = yield pool.run('smartctl --info /dev/sda')
+            self.assertEqual(output.decode('utf-8'), self.server.output)
+            self.assertEqual(code, 0)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.commands), 3)
+
+    @defer.inlineCallbacks
+    def test_concurrency(self):
+        self.server.delay = 0.05
+        pool = ssh.device_pool('localhost', self.options(
+            concurrency=2,
+            connections=1,
+            ))
+        yield defer.gatherResults([pool.run('smartctl') for _ in range(6)])
+        self.assertEqual(self.server.max_active, 2)
+        self.assertEqual(self.server.connections, 1)
+
+    @defer.inlineCallbacks
+    def test_pool_bound(self):
+        self.server.delay = 0.05
+        pool = ssh.device_pool('localhost', self.options(
+            concurrency=4,
+            connections=2,
+            ))
+        yield defer.gatherResults([pool.run('smartctl') for _ in range(8)])
+        self.assertEqual(self.server.max_active, 4)
+        self.assertEqual(self.server.connections, 2)
+        # Connections stay open for the next cycle
+        yield defer.gatherResults([pool.run('smartctl') for _ in range(8)])
+        self.assertEqual(self.server.connections, 2)
+
+    @defer.inlineCallbacks
+    def test_command_timeout(self):
+        self.server.delay = 5
+        pool = ssh.device_pool('localhost', self.options(command_timeout=0.1))
+        yield self.assertFailure(pool.run('smartctl'), defer.TimeoutError)
+        # The connection is still usable
+        self.server.delay = 0
+        output, _ = yield pool.run('smartctl')
+        self.assertTrue(output)
+        self.assertEqual(self.server.connections, 1)
+
+    @defer.inlineCallbacks
+    def test_login_timeout(self):
+        silent = protocol.ServerFactory()
+        silent.protocol = SilentServer
+        port = reactor.listenTCP(0, silent, interface='127.0.0.1')
+        try:
+            pool = ssh.DevicePool(ssh.SSHOptions(
+                '127.0.0.1',
+                port=port.getHost().port,
+                username=USERNAME,
+                password=PASSWORD,
+                login_timeout=0.1,
+                ))
+            yield self.assertFailure(pool.run('smartctl'), Exception)
+            pool.close()
+        finally:
+            yield port.stopListening()
+
+    @defer.inlineCallbacks
+    def test_auth_failure(self):
+        pool = ssh.device_pool('localhost', self.options(password='wrong'))
+        yield self.assertFailure(pool.run('smartctl'), Exception)
+        self.assertEqual(self.server.commands, list())
+
+    @defer.inlineCallbacks
+    def test_plugin(self):
+        from ZenPacks.daviswr.SMART.datasources.SmartctlDataSource import (
+            SmartctlDataSourcePlugin,
+            )
+        results = dict()
+        configs = dict()
+        plugins = dict()
+        for tier in ('status', 'smartctl'):
+            harness.reset()
+            expected = harness.parse(self.server.output, datasource=tier)
+            harness.reset()
+            config = Obj(id='localhost', manageIp='127.0.0.1', datasources=[
+                Obj(component='WD-WCC7K3KCRH5F',
+                    config_key=('localhost', 60, 'SmartctlDataSource', tier),
+                    points=[Obj(id=point)
+                            for point in harness.DATAPOINTS[tier]],
+                    params={'tier': tier, 'command': 'smartctl'},
+                    zCommandPort=self.port.getHost().port,
+                    zCommandUsername=USERNAME,
+                    zCommandPassword=PASSWORD,
+                    zSmartConcurrency=2,
+                    zSmartSshConnections=1,
+                    zSmartEventReassertInterval=0,
+                    ),
+                # The device's rollup, sharing the disk's command
+                Obj(component='',
+                    points=[Obj(id='disks')],
+                    params={'tier': tier, 'command': 'smartctl'},
+                    cycletime=60,
+                    ),
+                ])
+            plugin = SmartctlDataSourcePlugin()
+            result = yield plugin.collect(config)
+            data = plugin.onSuccess(result, config)
+            results[tier] = data
+            values = data['values']['WD-WCC7K3KCRH5F']
+            self.assertEqual(values.pop('output_bytes'),
+                             len(self.server.output))
+            self.assertTrue(values.pop('parse_time') >= 0)
+            self.assertEqual(values.pop('events'), len(expected[1]))
+            self.assertEqual(values, expected[0], tier)
+            self.assertEqual(data['values'][None], {'disks': 1})
+            self.assertEqual(data['events'][:-1], expected[1], tier)
+            self.assertEqual(data['events'][-1]['severity'], 0)
+            configs[tier] = config
+            plugins[tier] = plugin
+        # Both tiers ran over the same connection
+        self.assertEqual(self.server.connections, 1)
+
+        # Which stays open until neither tier's task uses it
+        pool = ssh.pools['localhost']
+        plugins['status'].cleanup(configs['status'])
+        self.assertIs(ssh.pools['localhost'], pool)
+        self.assertTrue(pool.clients)
+        plugins['smartctl'].cleanup(configs['smartctl'])
+        self.assertNotIn('localhost', ssh.pools)
+        self.assertEqual(pool.clients, list())
+
+    @defer.inlineCallbacks
+    def test_plugin_failure(self):
+        from ZenPacks.daviswr.SMART.datasources.SmartctlDataSource import (
+            SmartctlDataSourcePlugin,
+            )
+        config = Obj(id='localhost', manageIp='127.0.0.1', datasources=[
+            Obj(component='WD-WCC7K3KCRH5F',
+                config_key=('localhost', 60, 'SmartctlDataSource', 'status'),
+                points=list(),
+                params={'tier': 'status', 'command': 'smartctl'},
+                zCommandPort=self.port.getHost().port,
+                zCommandUsername=USERNAME,
+                zCommandPassword='wrong',
+                ),
+            ])
+        plugin = SmartctlDataSourcePlugin()
+        data = plugin.onSuccess((yield plugin.collect(config)), config)
+        self.assertEqual(len(data['events']), 1)
+        self.assertEqual(data['events'][0]['severity'], 4)
+        self.assertEqual(data['events'][0]['eventClass'], '/Cmd/Fail')
+
+    @defer.inlineCallbacks
+    def test_plugin_attributes(self):
+        from ZenPacks.daviswr.SMART.datasources.SmartctlDataSource import (
+            SmartctlDataSourcePlugin,
+            )
+        disk = Obj(
+            id='WD-WCC7K3KCRH5F',
+            DevicePath='/dev/sda',
+            RotationRate='5400 rpm',
+            smartctl_command=lambda tier: 'smartctl {0}'.format(
+                tier
+                ),
+            stagger_offset=lambda: 0.2,
+            )
+        disk.device = lambda: Obj(id='localhost')
+        attr = Obj(
+            id='WD-WCC7K3KCRH5F_5',
+            AttributeId='5',
+            smartStorage=lambda: disk,
+            device=disk.device,
+            )
+        sources = dict()
+        for tier, context in (('smartctl', disk), ('attributes', attr)):
+            source = Obj(
+                tier=tier,
+                plugin_classname='SmartctlDataSourcePlugin',
+                getCycleTime=lambda context: 900,
+                )
+            sources[tier] = (
+                SmartctlDataSourcePlugin.config_key(source, context),
+                SmartctlDataSourcePlugin.params(source, context),
+                )
+        # Polled together, with the disk's command
+        self.assertEqual(sources['smartctl'][0], sources['attributes'][0])
+        self.assertEqual(
+            sources['attributes'][1],
+            {'tier': 'attributes', 'command': 'smartctl smartctl',
+             'attribute': '5', 'disk': 'WD-WCC7K3KCRH5F',
+             'hard_disk': True, 'path': '/dev/sda', 'protocol': '',
+             'temp_limits': [0, 0], 'offset': 0.2}
+            )
+        # The device's own datasources share its first disk's command
+        source = Obj(tier='status')
+        device = Obj(id='localhost', smartStorage=lambda: [disk])
+        self.assertEqual(
+            SmartctlDataSourcePlugin.params(source, device)['command'],
+            'smartctl status'
+            )
+        device.smartStorage = list
+        self.assertEqual(
+            SmartctlDataSourcePlugin.params(source, device)['command'],
+            ''
+            )
+
+        settings = dict(
+            zCommandPort=self.port.getHost().port,
+            zCommandUsername=USERNAME,
+            zCommandPassword=PASSWORD,
+            )
+        datasources = [Obj(component=disk.id,
+                           config_key=sources['smartctl'][0],
+                           points=[Obj(id='reallocated_raw')],
+                           params=sources['smartctl'][1],
+                           **settings)]
+        for attr_id in ('5', '9', '254'):
+            params = dict(sources['attributes'][1], attribute=attr_id)
+            datasources.append(Obj(
+                component='{0}_{1}'.format(disk.id, attr_id),
+                points=[Obj(id=point)
+                        for point in ('value', 'worst', 'threshold', 'raw')],
+                params=params,
+                **settings
+                ))
+        config = Obj(id='localhost', manageIp='127.0.0.1',
+                     datasources=datasources)
+        plugin = SmartctlDataSourcePlugin()
+        started = time.time()
+        data = plugin.onSuccess((yield plugin.collect(config)), config)
+        # Started after the disk's stagger offset
+        self.assertTrue(time.time() - started >= 0.2)
+        self.assertEqual(len(self.server.commands), 1)
+        self.assertEqual(data['values'][disk.id], {'reallocated_raw': 0})
+        self.assertEqual(
+            data['values']['WD-WCC7K3KCRH5F_9'],
+            {'value': 71, 'worst': 71, 'threshold': 0, 'raw': 21493}
+            )
+        self.assertNotIn('WD-WCC7K3KCRH5F_254', data['values'])
+        self.assertEqual(data['events'][-1]['eventKey'], 'SMART smartctl')
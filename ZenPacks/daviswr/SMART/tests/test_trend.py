@@ -0,0 +1,97 @@
+#pylint: disable=invalid-name,missing-docstring
+""" Tests for the streaming trends of each disk's datapoints """
+
+import unittest
+
+from ZenPacks.daviswr.SMART.lib.trend import (
+    DAY,
+    log_trends,
+    temperature_trends,
+    )
+from ZenPacks.daviswr.SMART.tests import harness
+
+START = 1000000000.0
+
+
+def collect(samples, interval=900, component='disk'):
+    """ Returns the trends of each of a disk's values in turn """
+    return [log_trends('localhost', component, values,
+                       START + index * interval)
+            for index, values in enumerate(samples)]
+
+
+class TestTrend(unittest.TestCase):
+
+    def setUp(self):
+        harness.reset()
+
+    def test_first_collection(self):
+        trends = collect([{'reallocated_raw': 0, 'errors': 0}])[0]
+        self.assertEqual(trends, {'failure_risk_score': 0})
+
+    def test_rates(self):
+        samples = [{'reallocated_raw': count} for count in (0, 0, 1, 1)]
+        trends = collect(samples)
+        self.assertEqual(trends[1]['reallocation_rate'], 0)
+        # A sector a cycle on a 7 day average adds about 1/7 a day
+        self.assertAlmostEqual(trends[2]['reallocation_rate'], 1 / 7.0, 3)
+        self.assertTrue(
+            0 < trends[3]['reallocation_rate']
+            < trends[2]['reallocation_rate']
+            )
+
+    def test_rate_independent_of_interval(self):
+        samples = [{'pending_sectors': count} for count in (0, 5)]
+        fast = collect(samples, 60, 'fast')[1]['pending_rate']
+        slow = collect(samples, 3600, 'slow')[1]['pending_rate']
+        self.assertAlmostEqual(fast, slow, 2)
+
+    def test_decrease_ignored(self):
+        trends = collect([{'pending_sectors': 5}, {'pending_sectors': 0}])
+        self.assertEqual(trends[1]['pending_rate'], 0)
+
+    def test_wearout(self):
+        trends = collect([{'ssd_health': 91}, {'ssd_health': 90}],
+                         interval=DAY)
+        wear = trends[1]['wear_rate']
+        self.assertTrue(wear > 0)
+        self.assertAlmostEqual(trends[1]['days_to_wearout'], 90 / wear, 0)
+        # Not wearing
+        trends = collect([{'ssd_health': 90}] * 2, component='idle')
+        self.assertNotIn('days_to_wearout', trends[1])
+
+    def test_risk_score(self):
+        trends = collect([
+            {'reallocated_raw': 0, 'pending_sectors': 1},
+            {'reallocated_raw': 8, 'pending_sectors': 1,
+             'reallocated_offline_raw': 2},
+            ])
+        self.assertEqual(trends[0]['failure_risk_score'], 15)
+        self.assertEqual(trends[1]['failure_risk_score'], 80)
+
+    def test_temperature_excursions(self):
+        readings = (40, 60, 61, 40, 58)
+        excursions = [
+            temperature_trends('localhost', 'disk', current,
+                               now=START + index * 60)
+            for index, current in enumerate(readings)
+            ]
+        # Counted on rising above the default limit
+        self.assertEqual(
+            [round(values['temperature_excursions']) for values in excursions],
+            [0, 1, 1, 1, 2],
+            )
+        # A disk's own limit, and decay over time
+        self.assertEqual(temperature_trends(
+            'localhost', 'other', 45, 44, START
+            )['temperature_excursions'], 1)
+        later = temperature_trends('localhost', 'other', 30, 44, START + DAY)
+        self.assertTrue(0.8 < later['temperature_excursions'] < 1)
+        score = log_trends('localhost', 'other', dict(), START + DAY)
+        self.assertEqual(score['failure_risk_score'], 0)
+        score = log_trends('localhost', 'disk', dict(), START + 300)
+        self.assertEqual(score['failure_risk_score'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
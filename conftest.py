@@ -0,0 +1,33 @@
+""" Lets the tests run without Zenoss installed
+
+See ZenPacks/daviswr/SMART/tests/stubs.py
+"""
+
+import os
+
+STUBS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'ZenPacks',
+    'daviswr',
+    'SMART',
+    'tests',
+    'stubs.py',
+    )
+
+
+def load_stubs():
+    """ Loads the stubs module by path, as importing it from its package
+    would need ZenPackLib
+    """
+    try:
+        from importlib.util import module_from_spec, spec_from_file_location
+    except ImportError:
+        import imp
+        return imp.load_source('smart_test_stubs', STUBS_PATH)
+    spec = spec_from_file_location('smart_test_stubs', STUBS_PATH)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+load_stubs().install()